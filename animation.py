@@ -0,0 +1,69 @@
+TICK_MS = 500  # Scroll speed of long titles
+MIN_SCROLL_LENGTH = 30  # Titles up to this length are shown as is
+
+class TitleTicker:
+    # One app-wide timer scrolling every long title label, instead of a perpetual
+    # after() loop per row. Only labels that are on screen or hovered move.
+    def __init__(self, root, interval=TICK_MS, enabled=True):
+        self.root = root
+        self.interval = interval
+        self.enabled = enabled
+        self.labels = {}  # label -> {'text', 'offset', 'hovered'}
+        self.after_id = None
+
+    def register(self, label):
+        self.labels[label] = {'text': "", 'offset': 0, 'hovered': False}
+        label.bind("<Enter>", lambda e: self.set_hovered(label, True), add="+")
+        label.bind("<Leave>", lambda e: self.set_hovered(label, False), add="+")
+        label.bind("<Destroy>", lambda e: self.unregister(label), add="+")
+
+    def unregister(self, label):
+        self.labels.pop(label, None)
+        if not self.labels:
+            self.stop()
+
+    def set_text(self, label, text):
+        state = self.labels[label]
+        if state['text'] != text:
+            state['text'] = text
+            state['offset'] = 0
+            label.configure(text=text)
+        if len(text) > MIN_SCROLL_LENGTH:
+            self.start()
+
+    def set_hovered(self, label, hovered):
+        if label in self.labels:
+            self.labels[label]['hovered'] = hovered
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if enabled:
+            self.start()
+            return
+        self.stop()
+        for label, state in self.labels.items():
+            state['offset'] = 0
+            label.configure(text=state['text'])
+
+    def start(self):
+        if self.enabled and self.after_id is None:
+            self.after_id = self.root.after(self.interval, self.tick)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def tick(self):
+        self.after_id = None
+        scrolling = False
+        for label, state in list(self.labels.items()):
+            text = state['text']
+            if len(text) <= MIN_SCROLL_LENGTH:
+                continue
+            scrolling = True
+            if state['hovered'] or label.winfo_viewable():
+                state['offset'] = (state['offset'] + 1) % len(text)
+                label.configure(text=text[state['offset']:] + text[:state['offset']])
+        if scrolling:
+            self.start()
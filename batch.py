@@ -0,0 +1,80 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from engine import make_row, create_playlist_dir
+
+MAX_EXTRACT_WORKERS = 4  # Urls of a batch extracted in parallel
+
+# Batches of many video and playlist urls. Every video is downloaded once, however many of the
+# playlists list it, into the folder of the first one; the others get a hardlink or copy.
+
+def parse_urls(text):
+    # Urls separated by whitespace or newlines, lines starting with '#' skipped, repeats dropped
+    urls = []
+    for line in text.splitlines():
+        if not line.strip().startswith('#'):
+            urls += line.split()
+    return list(dict.fromkeys(urls))
+
+def read_url_file(path):
+    with open(path, encoding='utf-8') as f:
+        return parse_urls(f.read())
+
+def extract_sources(engine, urls, force=False, retry_policy=None, on_retry=None, workers=MAX_EXTRACT_WORKERS):
+    # (url, info dict or None, error) per url, in order. Transient failures are retried under
+    # retry_policy; on_retry(url, attempt, delay, error) runs on the extracting thread.
+    def extract(url):
+        attempt = 0
+        while True:
+            try:
+                return url, engine.extract(url, force), None
+            except Exception as e:
+                delay = retry_policy.delay(attempt, str(e)) if retry_policy else None
+                if delay is None:
+                    return url, None, str(e)
+                attempt += 1
+                if on_retry:
+                    on_retry(url, attempt, delay, str(e))
+                time.sleep(delay)
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as executor:
+        return list(executor.map(extract, urls))
+
+def video_key(entry):
+    # Same identity as yt-dlp's download archive, so a video is one video across playlists
+    ie_key = entry.get('ie_key') or entry.get('extractor_key') or ''
+    return f"{ie_key.lower()} {entry['id']}" if entry.get('id') else entry.get('webpage_url') or entry.get('url')
+
+def merge_sources(sources, skip=None):
+    # (records, skipped): one VideoRecord per unique video over all extracted sources, in first
+    # seen order, with record.playlists naming every playlist it is in; skipped lists
+    # (url, title) of entries skip(entry) turned down, e.g. ones already in the archive
+    records, skipped = {}, []
+    for url, info, error in sources:
+        if info is None:
+            continue
+        if 'entries' in info:
+            playlist = info.get('title', 'Playlist')
+            entries = [(entry, entry.get('title') or f'Video {index + 1}') for index, entry in enumerate(info['entries'])]
+        else:
+            playlist = None
+            entries = [(info, info.get('title', 'Video'))]
+        for entry, title in entries:
+            if skip and skip(entry):
+                skipped.append((url, title))
+                continue
+            key = video_key(entry)
+            record = records.get(key)
+            if record is None:
+                record = records[key] = make_row(entry, title)
+            elif not record.formats and entry.get('formats'):  # Also given as a video url, already resolved
+                record.set_formats(entry['formats'], entry.get('duration'))
+            if playlist not in record.playlists:
+                record.playlists += (playlist,)
+    return list(records.values()), skipped
+
+def record_folders(record, save_path):
+    # (folder the video is downloaded to, folders it is then linked into): each playlist gets
+    # its own folder, a url of the video itself the save path
+    folders = [save_path if playlist is None else create_playlist_dir(save_path, playlist) for playlist in record.playlists or (None,)]
+    return folders[0], list(dict.fromkeys(folder for folder in folders[1:] if folder != folders[0]))
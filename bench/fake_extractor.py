@@ -0,0 +1,111 @@
+import os
+import random
+import sys
+from urllib.parse import urlparse
+from xml.sax.saxutils import quoteattr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metadata_cache import MetadataCache, CACHE_PATH
+
+# Stand-in for yt-dlp's extraction: playlists of any size whose videos carry a YouTube-like
+# formats table (storyboards, several audio bitrates, avc1/vp9/av01 ladders, one muxed 360p),
+# pointing at bench/media_server.py.
+#   <base>/playlist/<count>     playlist of count videos
+#   <base>/watch/<id>.mpd       one video; also served by the media server, so yt-dlp can download it
+
+DEFAULT_DURATION = 20  # Seconds per video; sizes follow from bitrate times duration
+
+# (format_id, ext, vcodec, acodec, height, kbps), worst to best as yt-dlp sorts them
+LADDER = (
+    ('sb2', 'mhtml', 'none', 'none', 45, None), ('sb1', 'mhtml', 'none', 'none', 90, None), ('sb0', 'mhtml', 'none', 'none', 180, None),
+    ('139', 'm4a', 'none', 'mp4a.40.5', None, 49), ('249', 'webm', 'none', 'opus', None, 53), ('250', 'webm', 'none', 'opus', None, 70),
+    ('140', 'm4a', 'none', 'mp4a.40.2', None, 130), ('251', 'webm', 'none', 'opus', None, 135),
+    ('160', 'mp4', 'avc1.4d400c', 'none', 144, 80), ('278', 'webm', 'vp9', 'none', 144, 70), ('394', 'mp4', 'av01.0.00M.08', 'none', 144, 65),
+    ('133', 'mp4', 'avc1.4d4015', 'none', 240, 170), ('242', 'webm', 'vp9', 'none', 240, 150), ('395', 'mp4', 'av01.0.00M.08', 'none', 240, 140),
+    ('134', 'mp4', 'avc1.4d401e', 'none', 360, 360), ('243', 'webm', 'vp9', 'none', 360, 280), ('396', 'mp4', 'av01.0.01M.08', 'none', 360, 260),
+    ('18', 'mp4', 'avc1.42001E', 'mp4a.40.2', 360, 500),
+    ('135', 'mp4', 'avc1.4d401f', 'none', 480, 700), ('244', 'webm', 'vp9', 'none', 480, 520), ('397', 'mp4', 'av01.0.04M.08', 'none', 480, 480),
+    ('136', 'mp4', 'avc1.64001f', 'none', 720, 1400), ('247', 'webm', 'vp9', 'none', 720, 1100), ('398', 'mp4', 'av01.0.05M.08', 'none', 720, 1000),
+    ('137', 'mp4', 'avc1.640028', 'none', 1080, 4400), ('248', 'webm', 'vp9', 'none', 1080, 2600), ('399', 'mp4', 'av01.0.08M.08', 'none', 1080, 2000),
+    ('271', 'webm', 'vp9', 'none', 1440, 9000), ('400', 'mp4', 'av01.0.12M.08', 'none', 1440, 6000),
+    ('313', 'webm', 'vp9', 'none', 2160, 18000), ('401', 'mp4', 'av01.0.12M.08', 'none', 2160, 12000),
+)
+MAX_HEIGHTS = (720, 1080, 1080, 1080, 1440, 2160)  # Not every upload goes up to 4K
+MIME_TYPES = {'mp4': 'video/mp4', 'webm': 'video/webm', 'm4a': 'audio/mp4'}
+
+def video_id(index):
+    return f"bench{index:05d}"
+
+def video_formats(base_url, vid, duration=DEFAULT_DURATION):
+    rng = random.Random(vid)
+    max_height = rng.choice(MAX_HEIGHTS)
+    formats = []
+    for format_id, ext, vcodec, acodec, height, kbps in LADDER:
+        if height and vcodec != 'none' and height > max_height:
+            continue
+        f = {'format_id': format_id, 'ext': ext, 'vcodec': vcodec, 'acodec': acodec, 'protocol': 'https', 'http_headers': {'User-Agent': 'Mozilla/5.0', 'Accept': '*/*'}}
+        if height:
+            f.update(height=height, width=height * 16 // 9, fps=25 if ext == 'mhtml' else 30, format_note=f"{height}p")
+        if ext == 'mhtml':
+            f['url'] = f"{base_url}/thumbs/{vid}-{format_id}.jpg"
+            formats.append(f)
+            continue
+        tbr = kbps * rng.uniform(0.8, 1.2)
+        size = int(tbr * 1000 / 8 * duration)
+        kind = 'video' if acodec == 'none' else 'audio' if vcodec == 'none' else 'muxed'
+        f.update(tbr=round(tbr, 3), url=f"{base_url}/media/{vid}-{format_id}.{ext}?size={size}&kind={kind}")
+        f['filesize' if rng.random() < 0.8 else 'filesize_approx'] = size
+        if acodec != 'none':
+            f['asr'] = 48000 if acodec == 'opus' else 44100
+        formats.append(f)
+    return formats
+
+def video_info(base_url, index, duration=DEFAULT_DURATION):
+    vid = video_id(index)
+    return {'id': vid, 'title': f"Benchmark video {index + 1}", 'webpage_url': f"{base_url}/watch/{vid}.mpd", 'duration': duration, 'extractor_key': 'Generic', 'thumbnail': f"{base_url}/thumbs/{vid}.jpg", 'thumbnails': [{'url': f"{base_url}/thumbs/{vid}.jpg?size={size}", 'width': size} for size in (120, 320, 480)], 'formats': video_formats(base_url, vid, duration), 'description': "Synthetic video for benchmarks. " * 20, 'tags': ['bench'] * 10}
+
+def flat_entry(base_url, index):
+    # What yt-dlp's extract_flat gives for a playlist entry: ids, titles and thumbnails, no formats
+    vid = video_id(index)
+    return {'_type': 'url', 'id': vid, 'title': f"Benchmark video {index + 1}", 'url': f"{base_url}/watch/{vid}.mpd", 'ie_key': 'Generic', 'duration': DEFAULT_DURATION, 'thumbnails': [{'url': f"{base_url}/thumbs/{vid}.jpg?size={size}", 'width': size} for size in (120, 320, 480)]}
+
+def playlist_info(base_url, count, flat=True, duration=DEFAULT_DURATION):
+    entries = [flat_entry(base_url, i) if flat else video_info(base_url, i, duration) for i in range(count)]
+    return {'_type': 'playlist', 'id': f"bench-{count}", 'title': f"Benchmark playlist ({count})", 'webpage_url': f"{base_url}/playlist/{count}", 'extractor_key': 'Generic', 'entries': entries}
+
+def stub_extract(url, flat=True, duration=DEFAULT_DURATION):
+    parsed = urlparse(url)
+    base_url = f"{parsed.scheme}://{parsed.netloc}"
+    parts = parsed.path.strip('/').split('/')
+    if len(parts) == 2 and parts[0] == 'playlist':
+        return playlist_info(base_url, int(parts[1]), flat, duration)
+    if len(parts) == 2 and parts[0] == 'watch':
+        return video_info(base_url, int(parts[1].split('.')[0][len('bench'):]), duration)
+    raise ValueError(f"Not a benchmark url: {url}")
+
+def render_mpd(base_url, vid, duration=DEFAULT_DURATION):
+    # The same formats as a DASH manifest, which yt-dlp's generic extractor downloads from
+    sets = []
+    for f in video_formats(base_url, vid, duration):
+        if f['ext'] not in MIME_TYPES or f['vcodec'] != 'none' and f['acodec'] != 'none':
+            continue  # DASH carries no storyboards or muxed formats
+        audio = f['vcodec'] == 'none'
+        mime = MIME_TYPES[f['ext']].replace('video/', 'audio/') if audio else MIME_TYPES[f['ext']]
+        size = f" width=\"{f['width']}\" height=\"{f['height']}\"" if not audio else f" audioSamplingRate=\"{f['asr']}\""
+        codecs = f['acodec'] if audio else f['vcodec']
+        sets.append(f"    <AdaptationSet mimeType=\"{mime}\" contentType=\"{'audio' if audio else 'video'}\">\n      <Representation id=\"{f['format_id']}\" bandwidth=\"{int(f['tbr'] * 1000)}\" codecs=\"{codecs}\"{size}><BaseURL>{quoteattr(f['url'])[1:-1]}</BaseURL></Representation>\n    </AdaptationSet>")
+    return "<?xml version=\"1.0\" encoding=\"utf-8\"?>\n<MPD xmlns=\"urn:mpeg:dash:schema:mpd:2011\" type=\"static\" mediaPresentationDuration=\"PT%dS\" minBufferTime=\"PT2S\" profiles=\"urn:mpeg:dash:profile:isoff-on-demand:2011\">\n  <Period>\n%s\n  </Period>\n</MPD>\n" % (duration, "\n".join(sets))
+
+class StubMetadataCache(MetadataCache):
+    # The app's real metadata cache (trimming, compression, sqlite) with the stub extractor
+    # behind it instead of yt-dlp
+    def __init__(self, duration=DEFAULT_DURATION, path=CACHE_PATH):
+        super().__init__(path)
+        self.duration = duration
+
+    def extract(self, url, ydl_opts, force=False):
+        if not force:
+            info = self.get(url)
+            if info is not None:
+                return info
+        return self.put(url, stub_extract(url, bool(ydl_opts.get('extract_flat')), self.duration))
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from throttle import BandwidthLimiter, parse_rate
+from fake_extractor import render_mpd, DEFAULT_DURATION
+
+# Local stand-in for a media CDN. Serves synthetic files of any size with Range support and can
+# misbehave on purpose: throttle each connection or all of them together, answer with 429/403/5xx,
+# cut connections mid-body, or let throughput collapse after a while.
+#
+#   python bench/media_server.py --port 8900 --error-rate 0.2 --throttle 2M --collapse-after 30
+#   GET /media/<name>.<ext>?size=<bytes>&kind=<video|audio|muxed>   synthetic media, or the --sample for kind
+#   GET /watch/<id>.mpd                    DASH manifest of a bench/fake_extractor.py video
+#   GET /thumbs/<name>.jpg?size=<width>    JPEG thumbnail
+#   GET /stats                             counters as JSON
+
+CHUNK = 64 * 1024
+CONTENT_TYPES = {'mp4': 'video/mp4', 'webm': 'video/webm', 'm4a': 'audio/mp4', 'mp3': 'audio/mpeg', 'jpg': 'image/jpeg'}
+
+def synthetic_bytes(start, length, seed=0):
+    # Deterministic content, so resumed and ranged downloads can be checked byte for byte
+    pattern = bytes((i * 31 + seed) % 251 for i in range(251))
+    offset = start % len(pattern)
+    data = (pattern * ((offset + length) // len(pattern) + 1))[offset:offset + length]
+    return data
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, MediaHandler)
+        self.options = options
+        self.started = time.monotonic()
+        self.global_limiter = BandwidthLimiter(options.global_rate)
+        self.lock = threading.Lock()
+        self.samples = dict(options.sample)  # kind -> path of real media served instead of synthetic bytes
+        self.thumbnails = {}  # width -> JPEG bytes
+        self.stats = {'requests': 0, 'active': 0, 'peak_active': 0, 'errors': 0, 'drops': 0, 'bytes': 0}
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
+            if key == 'active':
+                self.stats['peak_active'] = max(self.stats['peak_active'], self.stats['active'])
+
+    def thumbnail(self, width):
+        with self.lock:
+            if width not in self.thumbnails:
+                from io import BytesIO
+                from PIL import Image
+                size = (width, width * 3 // 4)
+                gradient = Image.linear_gradient('L').resize(size)
+                image = Image.merge('RGB', (gradient, Image.effect_noise(size, 40), gradient.transpose(Image.Transpose.FLIP_TOP_BOTTOM)))
+                data = BytesIO()
+                image.save(data, 'JPEG', quality=85)
+                self.thumbnails[width] = data.getvalue()
+            return self.thumbnails[width]
+
+    def connection_rate(self):
+        options = self.options
+        if options.collapse_after is not None and time.monotonic() - self.started >= options.collapse_after:
+            return options.collapse_rate
+        return options.throttle
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def handle_request(self, head):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        options = self.server.options
+        if url.path == '/stats':
+            with self.server.lock:
+                return self.send_json(dict(self.server.stats))
+        if options.latency:
+            time.sleep(options.latency / 1000)
+        match = re.fullmatch(r'/watch/([\w-]+)\.mpd', url.path)
+        if match:
+            return self.send_bytes(render_mpd(f"http://{self.headers.get('Host')}", match.group(1), options.duration).encode('utf-8'), 'application/dash+xml', head)
+        match = re.fullmatch(r'/thumbs/([\w.-]+)\.jpg', url.path)
+        if match:
+            return self.send_bytes(self.server.thumbnail(int(query.get('size', [480])[0])), 'image/jpeg', head)
+        match = re.fullmatch(r'/media/([\w.-]+)\.(\w+)', url.path)
+        if not match:
+            return self.send_error(404)
+        self.server.count('requests')
+        if random.random() < options.error_rate:
+            self.server.count('errors')
+            self.send_response(options.error_status)
+            self.send_header('Retry-After', '1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        sample = self.server.samples.get(query.get('kind', [None])[0])
+        size = os.path.getsize(sample) if sample else int(query.get('size', [options.size])[0])
+        start, end = 0, size - 1
+        range_match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if range_match:
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or end), size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        self.send_response(206 if range_match else 200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(match.group(2), 'application/octet-stream'))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if range_match:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if head:
+            return
+        self.send_body(start, end + 1, seed=sum(map(ord, match.group(1))), sample=sample)
+
+    def send_body(self, start, stop, seed, sample=None):
+        server = self.server
+        limiter = BandwidthLimiter(server.connection_rate())
+        drop_at = start + random.randrange(max(1, stop - start)) if random.random() < server.options.drop_rate else None
+        server.count('active')
+        source = open(sample, 'rb') if sample else None
+        try:
+            if source:
+                source.seek(start)
+            position = start
+            while position < stop:
+                length = min(CHUNK, stop - position)
+                if drop_at is not None and position + length > drop_at:
+                    server.count('drops')
+                    self.wfile.write(source.read(drop_at - position) if source else synthetic_bytes(position, drop_at - position, seed))
+                    self.close_connection = True
+                    return
+                rate = server.connection_rate()
+                if rate != limiter.rate:
+                    limiter.set_rate(rate)
+                limiter.consume(length)
+                server.global_limiter.consume(length)
+                self.wfile.write(source.read(length) if source else synthetic_bytes(position, length, seed))
+                server.count('bytes', length)
+                position += length
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            server.count('active', -1)
+            if source:
+                source.close()
+
+    def send_json(self, data):
+        self.send_bytes(json.dumps(data).encode('utf-8'), 'application/json')
+
+    def send_bytes(self, body, content_type, head=False):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local media server that injects throttling and errors.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--size', type=parse_rate, default=8 * 1024 * 1024, help="default file size, e.g. 8M")
+    parser.add_argument('--throttle', type=parse_rate, default=None, help="per-connection rate, e.g. 2M")
+    parser.add_argument('--global-rate', type=parse_rate, default=None, help="rate shared by all connections")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with --error-status")
+    parser.add_argument('--error-status', type=int, default=429)
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="share of responses cut off mid-body")
+    parser.add_argument('--collapse-after', type=float, default=None, help="seconds until per-connection speed drops to --collapse-rate")
+    parser.add_argument('--collapse-rate', type=parse_rate, default=64 * 1024)
+    parser.add_argument('--latency', type=float, default=0, help="milliseconds added before every response")
+    parser.add_argument('--duration', type=int, default=DEFAULT_DURATION, help="seconds per video in manifests")
+    parser.add_argument('--sample', action='append', default=[], type=lambda text: tuple(text.split('=', 1)), metavar='KIND=PATH', help="serve a real file for media of this kind (video, audio or muxed)")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    return parser.parse_args(argv)
+
+def serve(options):
+    server = MediaServer((options.host, options.port), options)
+    print(f"Serving on http://{options.host}:{server.server_address[1]}/media/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    serve(parse_args())
@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+
+# Benchmarks for the playlist hot paths against local stand-ins, without touching YouTube:
+#   list        fetch_formats -> update_dropdowns_ui: flat listing, row models, entry resolution, size totals
+#   thumbnails  ThumbnailService over the network, again from memory, again from the disk cache
+#   download    download_playlist: jobs through both pipeline stages, throughput and memory
+#
+#   python bench/run.py                                    everything at the default sizes
+#   python bench/run.py --sizes 10,5000 -b list -o after.json --baseline before.json
+#
+# Every case runs in a fresh process with its own HOME, so caches start cold and peak RSS
+# belongs to that case alone. Output is one JSON document, {"meta": {...}, "results": [...]};
+# with --baseline, cases more than --threshold slower (or bigger) than before are listed on
+# stderr and the exit status is 1.
+
+BENCHMARKS = ('list', 'thumbnails', 'download')
+DEFAULT_SIZES = '10,100,1000,5000'
+DEFAULT_DOWNLOADS = 20
+RESOLVE_WORKERS = 4  # As the GUI's MAX_RESOLVE_WORKERS
+MIN_DIFFERENCE = 0.05  # Seconds; smaller changes are noise whatever the ratio
+YDL_OPTS = {'quiet': True, 'noprogress': True}
+
+def peak_rss():
+    # Peak resident set size of this process in bytes
+    try:
+        import resource
+    except ImportError:  # Windows
+        import ctypes
+        from ctypes import wintypes
+        class Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [(name, ctypes.c_size_t) for name in ('PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+        counters = Counters(cb=ctypes.sizeof(Counters))
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def megabytes(size):
+    return round(size / (1024 * 1024), 2)
+
+def elapsed(started):
+    return round(time.perf_counter() - started, 4)
+
+def bench_list(args):
+    from engine import DownloadEngine, make_row
+    from fake_extractor import StubMetadataCache
+    engine = DownloadEngine(metadata_cache=StubMetadataCache(args.duration))
+    url = f"{args.base_url}/playlist/{args.size}"
+    seconds = {}
+    for run in ('cold', 'warm'):  # The warm run is answered by the metadata cache
+        times = {}
+        started = time.perf_counter()
+        info = engine.extract(url)
+        times['extract'] = elapsed(started)
+        step = time.perf_counter()
+        rows = [make_row(entry, entry.get('title') or f"Video {index + 1}") for index, entry in enumerate(info['entries'])]
+        times['rows'] = elapsed(step)
+        step = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=RESOLVE_WORKERS) as executor:
+            for row, entry in zip(rows, executor.map(lambda row: engine.resolve_entry(row.url), rows)):
+                row.set_formats(entry.get('formats', []), entry.get('duration'))
+        times['resolve'] = elapsed(step)
+        step = time.perf_counter()
+        total = sum(row.format_index.estimate(row.quality, row.extension)[0] or 0 for row in rows)
+        times['estimate'] = elapsed(step)
+        times['total'] = elapsed(started)
+        seconds[run] = times
+    del info, rows, entry
+    # Memory the resolved rows keep once the listing and info dicts are gone, measured apart
+    # from the timed runs since tracing slows everything down
+    tracemalloc.start()
+    rows = [make_row(entry, entry.get('title') or f"Video {index + 1}") for index, entry in enumerate(engine.extract(url)['entries'])]
+    for row in rows:
+        entry = engine.resolve_entry(row.url)
+        row.set_formats(entry.get('formats', []), entry.get('duration'))
+    del entry
+    rows_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {'seconds': seconds, 'rows': len(rows), 'selection_bytes': total, 'rows_mb': megabytes(rows_bytes)}
+
+def bench_thumbnails(args):
+    from thumbnails import ThumbnailService
+    from fake_extractor import video_id
+    cache_dir = os.path.join(os.path.expanduser("~"), "thumbnails")
+    thumbnails = [(video_id(i), f"{args.base_url}/thumbs/{video_id(i)}.jpg?size=480") for i in range(args.size)]
+
+    def load_all(service):
+        remaining = [len(thumbnails)]
+        failed = []
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def loaded(image):
+            with lock:
+                if image is None:
+                    failed.append(image)
+                remaining[0] -= 1
+                if not remaining[0]:
+                    done.set()
+        started = time.perf_counter()
+        for vid, url in thumbnails:
+            service.get(vid, url, loaded)
+        done.wait()
+        return elapsed(started), len(failed)
+
+    service = ThumbnailService(cache_dir)
+    seconds, errors = {}, 0
+    seconds['network'], failed = load_all(service)
+    errors += failed
+    seconds['repeat'], failed = load_all(service)  # Memory hits, disk reads past the memory cache size
+    errors += failed
+    service.shutdown()
+    service = ThumbnailService(cache_dir)
+    seconds['disk'], failed = load_all(service)  # A later run of the app
+    errors += failed
+    service.shutdown()
+    return {'seconds': seconds, 'errors': errors}
+
+def bench_download(args):
+    from engine import DownloadEngine, make_row, create_playlist_dir
+    from scheduler import DONE, FAILED
+    from fake_extractor import StubMetadataCache
+    engine = DownloadEngine(args.workers, metadata_cache=StubMetadataCache(args.duration))
+    engine.scheduler.connections = args.connections
+    info = engine.extract(f"{args.base_url}/playlist/{args.size}")
+    rows = [make_row(entry, entry.get('title') or f"Video {index + 1}") for index, entry in enumerate(info['entries'])]
+    for row in rows:
+        entry = engine.resolve_entry(row.url)
+        row.set_formats(entry.get('formats', []), entry.get('duration'))
+    save_path = os.path.join(os.path.expanduser("~"), "downloads")
+    started = time.perf_counter()
+    playlist_path = create_playlist_dir(save_path, info.get('title'))
+    jobs = [engine.create_job(row.url, row.title, playlist_path, args.quality or row.quality, args.ext, args.audio_only, YDL_OPTS) for row in rows]
+    for job in jobs:
+        engine.submit(job)
+    engine.scheduler.wait(jobs)
+    seconds = elapsed(started)
+    size = sum(os.path.getsize(job.output) for job in jobs if job.state == DONE)
+    errors = sorted(set(job.error for job in jobs if job.state == FAILED))
+    return {'seconds': {'total': seconds}, 'bytes': size, 'mb_per_s': megabytes(size / seconds) if seconds else None, 'jobs_per_s': round(len(jobs) / seconds, 2) if seconds else None, 'done': sum(1 for job in jobs if job.state == DONE), 'failed': sum(1 for job in jobs if job.state == FAILED), 'errors': errors[:3], 'stages': engine.scheduler.stage_stats()}
+
+CASES = {'list': bench_list, 'thumbnails': bench_thumbnails, 'download': bench_download}
+
+def run_case(args):
+    # Child process: one benchmark at one size, result as a JSON line on stdout
+    start_rss = peak_rss()
+    result = CASES[args.case](args)
+    print(json.dumps({'benchmark': args.case, 'size': args.size, **result, 'start_rss_mb': megabytes(start_rss), 'peak_rss_mb': megabytes(peak_rss())}), flush=True)
+
+def make_samples(directory, duration):
+    # Real media for the download benchmark, so merges see streams ffmpeg can copy; None without ffmpeg
+    from engine import ffmpeg_location
+    ffmpeg = ffmpeg_location()
+    if not ffmpeg:
+        return None
+    samples = {'video': os.path.join(directory, 'video.mp4'), 'audio': os.path.join(directory, 'audio.m4a'), 'muxed': os.path.join(directory, 'muxed.mp4')}
+    commands = (
+        ['-f', 'lavfi', '-i', f'testsrc2=size=640x360:rate=30:duration={duration}', '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', samples['video']],
+        ['-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}', '-c:a', 'aac', samples['audio']],
+        ['-i', samples['video'], '-i', samples['audio'], '-c', 'copy', samples['muxed']],
+    )
+    try:
+        for command in commands:
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', *command], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return samples
+
+def start_server(args, samples):
+    import media_server
+    options = media_server.parse_args(['--port', '0', '--latency', str(args.latency), '--duration', str(args.duration)] + (['--throttle', args.throttle] if args.throttle else []) + [f'--sample={kind}={path}' for kind, path in (samples or {}).items()])
+    server = media_server.MediaServer(('127.0.0.1', 0), options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        from importlib.metadata import version
+        yt_dlp_version = version('yt-dlp')
+    except Exception:
+        yt_dlp_version = None
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(), 'yt_dlp': yt_dlp_version}
+
+def flatten(result):
+    # {"list/5000/cold.total": seconds, ..., "list/5000/peak_rss_mb": ...} for baseline comparison
+    prefix = f"{result['benchmark']}/{result['size']}"
+    values = {f"{prefix}/peak_rss_mb": result['peak_rss_mb']}
+    if 'rows_mb' in result:
+        values[f"{prefix}/rows_mb"] = result['rows_mb']
+    for key, value in result['seconds'].items():
+        if isinstance(value, dict):
+            values.update({f"{prefix}/{key}.{step}": seconds for step, seconds in value.items()})
+        else:
+            values[f"{prefix}/{key}"] = value
+    return values
+
+def compare(results, baseline, threshold):
+    # Lines for every value that got worse by more than threshold (a ratio, e.g. 0.2 for 20%)
+    before = {}
+    for result in baseline['results']:
+        before.update(flatten(result))
+    regressions = []
+    for result in results:
+        for key, value in flatten(result).items():
+            old = before.get(key)
+            if old is None or value is None:
+                continue
+            noise = 1 if key.endswith('_mb') else MIN_DIFFERENCE
+            if value > old * (1 + threshold) and value - old > noise:
+                regressions.append(f"{key}: {old} -> {value} (+{(value / old - 1) if old else 1:.0%})")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark playlist handling against a local media server and stub extractor.")
+    parser.add_argument('-b', '--benchmarks', default=','.join(BENCHMARKS), help=f"comma separated, from {', '.join(BENCHMARKS)}")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"playlist sizes for list and thumbnails (default: {DEFAULT_SIZES})")
+    parser.add_argument('--downloads', type=int, default=DEFAULT_DOWNLOADS, help=f"videos in the download benchmark (default: {DEFAULT_DOWNLOADS})")
+    parser.add_argument('-j', '--workers', type=int, default=3, help="parallel downloads")
+    parser.add_argument('-q', '--quality', default=None, help="maximum height to download (default: each row's default)")
+    parser.add_argument('-e', '--ext', default='mp4')
+    parser.add_argument('-a', '--audio-only', action='store_true')
+    parser.add_argument('--duration', type=int, default=10, help="seconds per synthetic video")
+    parser.add_argument('--latency', type=float, default=0, help="milliseconds the server adds to every response")
+    parser.add_argument('--throttle', help="per-connection rate the server allows, e.g. 2M")
+    parser.add_argument('--connections', type=int, default=4, help="byte ranges fetched at once per progressive stream (default: 4)")
+    parser.add_argument('-o', '--output', help="write the results here as well as to stdout")
+    parser.add_argument('--baseline', help="earlier results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="slowdown ratio counted as a regression (default: 0.2)")
+    # Internal: run one case in this process
+    parser.add_argument('--case', choices=BENCHMARKS, help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.case:
+        run_case(args)
+        return 0
+
+    benchmarks = [name for name in args.benchmarks.split(',') if name]
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    workdir = tempfile.mkdtemp(prefix="ytd-bench-")
+    try:
+        samples = make_samples(workdir, args.duration) if 'download' in benchmarks else None
+        server, base_url = start_server(args, samples)
+        results = []
+        for name in benchmarks:
+            for size in [args.downloads] if name == 'download' else sizes:
+                home = tempfile.mkdtemp(dir=workdir)
+                env = dict(os.environ, HOME=home, USERPROFILE=home)
+                command = [sys.executable, os.path.abspath(__file__), '--case', name, '--size', str(size), '--base-url', base_url, '--duration', str(args.duration), '--workers', str(args.workers), '--connections', str(args.connections), '--ext', args.ext] + (['--quality', args.quality] if args.quality else []) + (['--audio-only'] if args.audio_only else [])
+                child = subprocess.run(command, env=env, capture_output=True, text=True)
+                if child.returncode:
+                    print(f"{name} {size} failed:\n{child.stderr}", file=sys.stderr)
+                    continue
+                result = json.loads(child.stdout.strip().splitlines()[-1])
+                print(f"{name} {size}: {json.dumps(result['seconds'])} peak {result['peak_rss_mb']} MB", file=sys.stderr)
+                results.append(result)
+        server.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'meta': {**metadata(), 'samples': samples is not None, 'duration': args.duration, 'latency': args.latency, 'throttle': args.throttle, 'workers': args.workers, 'connections': args.connections}, 'results': results}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"Regression: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
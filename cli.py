@@ -0,0 +1,166 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from engine import DownloadEngine
+from batch import parse_urls, extract_sources, merge_sources, record_folders
+from scheduler import DEFAULT_WORKERS, DEFAULT_MERGE_WORKERS, DEFAULT_CONNECTIONS, DONE, SKIPPED, FAILED, CANCELLED, RUNNING, RETRYING, MERGING, FINISHED_STATES
+from throttle import parse_rate
+from metrics import metrics, profile_report
+
+PROGRESS_INTERVAL = 1.0  # Seconds between progress lines per job
+YDL_OPTS = {'quiet': True, 'noprogress': True}  # stdout carries only our JSON lines
+
+# Headless batch downloads; every line on stdout is one JSON event:
+#   {"event": "queued", "job": 1, "title": ..., "url": ..., "copies": [...]}  (copies: other playlist folders that get the file)
+#   {"event": "state", "job": 1, "state": "running"}
+#   {"event": "state", "job": 1, "state": "done", "output": ..., "method": "copy", "bytes": ..., "retries": 0, "download_seconds": ..., "merge_seconds": ...}  (method: rename, copy, transcode ...)
+#   {"event": "state", "job": 1, "state": "retrying", "error": ..., "attempt": 1, "delay": 3.2}
+#   {"event": "state", "job": 1, "state": "skipped", "error": ...}  (yt-dlp found it in the download archive after all)
+#   {"event": "progress", "job": 1, "downloaded": ..., "total": ..., "speed": ..., "eta": ...}
+#   {"event": "stages", "download": {"queued": ..., "active": ..., "done": ..., "avg_seconds": ..., "avg_wait": ...}, "merge": {...}}
+#   {"event": "skipped", "url": ..., "title": ...}  (already in the download archive)
+#   {"event": "concurrency", "workers": ..., "fragments": ..., "reason": ...}  (with --adaptive)
+#   {"event": "retry", "url": ..., "attempt": 1, "delay": ..., "error": ...}  (fetching the url failed transiently)
+#   {"event": "error", "url": ..., "error": ...}
+#   {"event": "summary", "done": ..., "failed": ..., "cancelled": ..., "skipped": ..., "stages": {...}, "timings": {"extract": {"count": ..., "avg": ...}, ...}}
+
+_emit_lock = threading.Lock()  # Urls are extracted on several threads
+
+def emit(event, **fields):
+    line = json.dumps({'event': event, **fields})
+    with _emit_lock:
+        print(line, flush=True)
+
+def read_urls(path):
+    # One url per line, blank lines and '#' comments skipped; '-' reads stdin
+    source = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    with source:
+        return parse_urls(source.read())
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download YouTube videos and playlists without a GUI.")
+    parser.add_argument('urls', nargs='?', help="file with one video or playlist url per line, '-' for stdin")
+    parser.add_argument('-o', '--output', default='.', help="directory to save into (default: current directory)")
+    parser.add_argument('-q', '--quality', default='1080', help="maximum video height (default: 1080)")
+    parser.add_argument('-e', '--ext', default='mp4', help="preferred extension (default: mp4)")
+    parser.add_argument('-a', '--audio-only', action='store_true', help="download audio only")
+    parser.add_argument('-j', '--concurrency', type=int, default=DEFAULT_WORKERS, help=f"parallel downloads (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--merge-workers', type=int, default=DEFAULT_MERGE_WORKERS, help=f"parallel ffmpeg merges (default: {DEFAULT_MERGE_WORKERS}, the CPU count)")
+    parser.add_argument('--adaptive', action='store_true', help="adjust parallel downloads and fragments to throughput and throttling, starting from -j")
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS, help=f"byte ranges of one progressive stream fetched at once (default: {DEFAULT_CONNECTIONS}, 1 for a single connection)")
+    parser.add_argument('--max-rate', type=parse_rate, default=None, help="bandwidth cap over all downloads, e.g. 500K or 5M")
+    parser.add_argument('--retries', type=int, default=None, help="retries after a transient failure such as HTTP 429 (default: 4)")
+    parser.add_argument('--metrics', help="write stage timings and counters here at the end (.prom for Prometheus text, else JSON lines)")
+    parser.add_argument('--profile', help="run every instrumented stage under cProfile and save the stats here; top functions go to stderr")
+    parser.add_argument('--refresh', action='store_true', help="ignore cached metadata")
+    parser.add_argument('--resume', action='store_true', help="also resume downloads an earlier run left unfinished")
+    parser.add_argument('--no-archive', action='store_true', help="download videos again even if already in the download archive")
+    args = parser.parse_args(argv)
+    if not args.urls and not args.resume:
+        parser.error("a url list is required unless --resume is given")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    engine = DownloadEngine(args.concurrency)
+    engine.use_archive = not args.no_archive
+    engine.scheduler.set_merge_workers(args.merge_workers)
+    engine.scheduler.connections = max(1, args.connections)
+    engine.scheduler.limiter.set_rate(args.max_rate)
+    retry_policy = engine.scheduler.retry_policy
+    if args.retries is not None:
+        retry_policy.attempts = args.retries
+    adjustments = queue.Queue()
+    engine.controller.listeners.append(lambda controller: adjustments.put(controller.history[-1]))
+    if args.adaptive:
+        engine.controller.start()
+    if args.profile:
+        metrics.start_profile()
+    changes = queue.Queue()  # Listeners run on worker threads; only the main thread prints
+    errors = 0
+    skipped = 0
+    jobs = []
+
+    if args.resume:
+        for job in engine.unfinished_jobs():
+            job.add_listener(lambda job: changes.put((job, job.state, job.error)))
+            engine.submit(job)
+            jobs.append(job)
+            emit('queued', job=job.id, title=job.title, url=job.url, resumed=True)
+
+    # Every url is extracted before anything is queued, so a video listed by several playlists
+    # is downloaded once and linked into the other playlists' folders
+    sources = extract_sources(engine, read_urls(args.urls) if args.urls else [], args.refresh, retry_policy, lambda url, attempt, delay, error: emit('retry', url=url, attempt=attempt, delay=round(delay, 1), error=error))
+    for url, info, error in sources:
+        if error is not None:
+            errors += 1
+            emit('error', url=url, error=error)
+    records, skipped_entries = merge_sources(sources, engine.is_archived)
+    for url, title in skipped_entries:
+        emit('skipped', url=url, title=title)
+    skipped += len(skipped_entries)
+    for record in records:
+        folder, copies = record_folders(record, args.output)
+        job = engine.create_job(record.url, record.title, folder, args.quality, args.ext, args.audio_only, YDL_OPTS, copies)
+        job.add_listener(lambda job: changes.put((job, job.state, job.error)))
+        engine.submit(job)
+        jobs.append(job)
+        emit('queued', job=job.id, title=job.title, url=job.url, copies=copies)
+
+    pending = set(jobs)
+    versions = {}
+    stages = None
+    last_progress = time.monotonic()
+    try:
+        while pending:
+            try:
+                job, state, error = changes.get(timeout=0.2)
+            except queue.Empty:
+                pass
+            else:
+                details = {'error': error} if error else {}
+                if state == DONE and job.output:
+                    details.update(output=job.output, method=job.method)
+                if state == RETRYING:
+                    details.update(attempt=job.attempts, delay=round(job.retry_delay, 1))
+                if state in FINISHED_STATES:
+                    details.update(bytes=job.progress.downloaded, retries=job.attempts, download_seconds=round(job.download_seconds, 3), merge_seconds=round(job.merge_seconds, 3))
+                emit('state', job=job.id, state=state, **details)
+                if state in FINISHED_STATES:
+                    pending.discard(job)
+
+            # Progress is coalesced: at most one line per changed job per interval
+            now = time.monotonic()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                for job in jobs:
+                    progress = job.progress
+                    if job.state in (RUNNING, MERGING) and versions.get(job.id, 0) != progress.version:
+                        versions[job.id] = progress.version
+                        emit('progress', job=job.id, downloaded=progress.downloaded, total=progress.total, speed=progress.speed, eta=progress.eta, stage=progress.stage)
+                if engine.scheduler.stage_stats() != stages:
+                    stages = engine.scheduler.stage_stats()
+                    emit('stages', **stages)
+                while not adjustments.empty():
+                    _, workers, fragments, reason = adjustments.get()
+                    emit('concurrency', workers=workers, fragments=fragments, reason=reason)
+    except KeyboardInterrupt:
+        engine.scheduler.cancel_all()
+        engine.scheduler.wait(jobs)
+
+    counts = {state: sum(1 for job in jobs if job.state == state) for state in (DONE, FAILED, CANCELLED)}
+    skipped += sum(1 for job in jobs if job.state == SKIPPED)
+    emit('summary', errors=errors, skipped=skipped, stages=engine.scheduler.stage_stats(), timings=metrics.summary(), **counts)
+    if args.metrics:
+        metrics.export(args.metrics)
+    if args.profile:
+        stats = metrics.stop_profile(args.profile)
+        if stats is not None:
+            print(profile_report(stats), file=sys.stderr)
+    return 1 if errors or counts[FAILED] or counts[CANCELLED] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import os
+
+# Codecs each video container takes as a stream copy, as (video, audio); None takes anything
+VIDEO_CONTAINERS = {
+    'mp4': (('h264', 'hevc', 'av1', 'vp9'), ('aac', 'mp3', 'opus', 'ac3', 'eac3', 'flac', 'alac')),
+    'webm': (('vp8', 'vp9', 'av1'), ('opus', 'vorbis')),
+    'mkv': (None, None),
+}
+DEFAULT_CONTAINER = 'mkv'  # Used for extensions that aren't a container we can write, e.g. 3gp
+
+# Container an audio stream is copied into when downloading audio only
+AUDIO_CONTAINERS = {'aac': 'm4a', 'alac': 'm4a', 'mp3': 'mp3', 'opus': 'opus', 'vorbis': 'ogg', 'flac': 'flac', 'ac3': 'ac3', 'eac3': 'eac3'}
+
+# Encoders used when a stream doesn't fit the target, as (video, audio)
+TRANSCODERS = {'mp4': ('libx264', 'aac'), 'webm': ('libvpx-vp9', 'libopus'), 'mkv': ('libx264', 'aac')}
+
+# yt-dlp codec strings (avc1.64001F, mp4a.40.2, ...) by prefix
+CODEC_FAMILIES = (('avc', 'h264'), ('h264', 'h264'), ('hev', 'hevc'), ('hvc', 'hevc'), ('h265', 'hevc'), ('av01', 'av1'), ('av1', 'av1'), ('vp09', 'vp9'), ('vp9', 'vp9'), ('vp8', 'vp8'), ('mp4a', 'aac'), ('aac', 'aac'), ('opus', 'opus'), ('vorbis', 'vorbis'), ('mp3', 'mp3'), ('flac', 'flac'), ('alac', 'alac'), ('ac-3', 'ac3'), ('ac3', 'ac3'), ('ec-3', 'eac3'), ('eac3', 'eac3'))
+
+def codec_family(codec):
+    # None for missing or unrecognised codecs, 'none' for a stream that isn't there
+    if codec is None:
+        return None
+    codec = codec.lower()
+    if codec == 'none':
+        return 'none'
+    return next((family for prefix, family in CODEC_FAMILIES if codec.startswith(prefix)), None)
+
+def container_for(extension):
+    return extension if extension in VIDEO_CONTAINERS else DEFAULT_CONTAINER
+
+def fits(container, kind, codec):
+    # True if a stream of this codec can be copied into container; kind is 0 for video, 1 for audio
+    allowed = VIDEO_CONTAINERS[container][kind]
+    return allowed is None or codec_family(codec) in allowed
+
+def copyable(container, kind, codec, transcode=False):
+    family = codec_family(codec)
+    if family == 'none':
+        return True
+    if family is None:
+        return not transcode or VIDEO_CONTAINERS[container][kind] is None
+    return fits(container, kind, codec)
+
+def remux(streams, base, container, audio_only=False, transcode=False):
+    # Works out how downloaded streams become one output file.
+    # streams: [{'filename', 'vcodec', 'acodec', 'ext'}] in download order.
+    # Returns (output path, ffmpeg arguments or None for a plain rename, method), where method is
+    # 'rename', 'copy', 'transcode video', 'transcode audio' or 'transcode'.
+    # Unrecognised codecs are copied optimistically unless transcode is set.
+    if audio_only:
+        stream = next((s for s in streams if codec_family(s.get('acodec')) != 'none'), streams[0])
+        family = codec_family(stream.get('acodec'))
+        if transcode and family not in AUDIO_CONTAINERS:
+            return f"{base}.m4a", ['-i', stream['filename'], '-map', '0:a:0', '-vn', '-c:a', 'aac'], 'transcode audio'
+        ext = AUDIO_CONTAINERS.get(family, 'm4a')  # Unrecognised codecs are tried in m4a first
+        output = f"{base}.{ext}"
+        if len(streams) == 1 and codec_family(stream.get('vcodec')) == 'none' and os.path.splitext(stream['filename'])[1] == f".{ext}":
+            return output, None, 'rename'
+        return output, ['-i', stream['filename'], '-map', '0:a:0', '-vn', '-c:a', 'copy'], 'copy'
+
+    output = f"{base}.{container}"
+    video_ok = all(copyable(container, 0, s.get('vcodec'), transcode) for s in streams)
+    audio_ok = all(copyable(container, 1, s.get('acodec'), transcode) for s in streams)
+    if len(streams) == 1 and video_ok and audio_ok and os.path.splitext(streams[0]['filename'])[1] == f".{container}":
+        return output, None, 'rename'
+    args = []
+    for stream in streams:
+        args += ['-i', stream['filename']]
+    for i in range(len(streams)):
+        args += ['-map', f'{i}:v?', '-map', f'{i}:a?']
+    video_codec, audio_codec = TRANSCODERS[container]
+    args += ['-c:v', 'copy' if video_ok else video_codec, '-c:a', 'copy' if audio_ok else audio_codec]
+    if video_ok and audio_ok:
+        method = 'copy'
+    elif audio_ok:
+        method = 'transcode video'
+    elif video_ok:
+        method = 'transcode audio'
+    else:
+        method = 'transcode'
+    return output, args, method
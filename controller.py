@@ -0,0 +1,112 @@
+import threading
+import time
+from scheduler import RUNNING, RETRYING
+from throttle import is_throttled
+
+CONTROL_INTERVAL = 2.0  # Seconds between throughput samples
+COLLAPSE_RATIO = 0.25  # A job below this share of its recent peak speed counts as throttled
+PEAK_DECAY = 0.95  # Per sample, so peaks from long ago stop counting
+INCREASE_AFTER = 10.0  # Seconds of healthy downloads before adding a worker
+DECREASE_COOLDOWN = 6.0  # One burst of errors only halves concurrency once
+
+class AdaptiveController:
+    # Additive-increase / multiplicative-decrease over the number of parallel downloads and
+    # yt-dlp's fragment concurrency. Throttling errors (429/403), stalls and speed collapses halve
+    # both; a stretch of healthy downloads with work still queued adds one to each.
+    def __init__(self, scheduler, max_workers=8, max_fragments=8, interval=CONTROL_INTERVAL):
+        self.scheduler = scheduler
+        self.min_workers = 1
+        self.max_workers = max_workers
+        self.max_fragments = max_fragments
+        self.interval = interval
+        self.samples = {}  # job id -> (time, downloaded bytes, decaying peak speed) at the last tick
+        self.throttled = False  # Set by job listeners, consumed by the next tick
+        self.rate = scheduler.limiter.rate  # Bandwidth cap the peaks in samples were measured under
+        self.last_increase = self.last_decrease = time.monotonic()
+        self.history = []  # (time, workers, fragments, reason) per adjustment
+        self.listeners = []  # callback(controller) after every adjustment
+        self.running = False
+        self.lock = threading.Lock()
+        scheduler.job_listeners.append(self.on_job_state)
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self._loop, name="concurrency-controller", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def _loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            if self.running:
+                self.tick()
+
+    def on_job_state(self, job):
+        if job.state == RETRYING and is_throttled(job.error):
+            self.throttled = True
+        if job.state != RUNNING:  # Measure afresh once it runs again
+            self.samples.pop(job.id, None)
+
+    def tick(self, now=None):
+        # Speeds are measured here from bytes per tick; yt-dlp's own speed is an average since
+        # the start of the file and reacts to a collapse far too slowly
+        now = now or time.monotonic()
+        limiter = self.scheduler.limiter
+        if limiter.rate != self.rate:  # A new cap changes every job's speed; peaks from before it don't count
+            self.rate = limiter.rate
+            self.samples.clear()
+        running = [job for job in self.scheduler.active_jobs() if job.state == RUNNING]
+        collapsed = []
+        slow = []
+        total_speed = 0
+        for job in running:
+            downloaded = job.progress.downloaded
+            previous = self.samples.get(job.id)
+            if job.progress.stalled(now):
+                collapsed.append(job)
+            if previous is None or now <= previous[0]:
+                self.samples[job.id] = (now, downloaded, 0)
+                continue
+            speed = max(0, downloaded - previous[1]) / (now - previous[0])
+            peak = max(speed, previous[2] * PEAK_DECAY)
+            self.samples[job.id] = (now, downloaded, peak)
+            total_speed += speed
+            if speed < COLLAPSE_RATIO * peak and job not in collapsed:
+                slow.append(job)
+
+        # Jobs slow down when they share a bandwidth cap, which is no sign of server throttling
+        capped = limiter.rate and total_speed >= 0.9 * limiter.rate
+        if not capped:
+            collapsed += slow
+        if self.throttled or collapsed:
+            self.throttled = False
+            if now - self.last_decrease >= DECREASE_COOLDOWN:
+                self.decrease(now, "throttled" if not collapsed else f"{len(collapsed)} slow")
+            return
+
+        # Only grow while there is queued work and the bandwidth cap isn't what limits us
+        queued = self.scheduler.downloads.stats.snapshot()['queued']
+        if queued and not capped and now - max(self.last_increase, self.last_decrease) >= INCREASE_AFTER:
+            self.increase(now)
+
+    def decrease(self, now, reason):
+        self.last_decrease = now
+        self.apply(max(self.min_workers, self.scheduler.workers // 2), max(1, self.scheduler.fragments // 2), reason, now)
+
+    def increase(self, now):
+        self.last_increase = now
+        self.apply(min(self.max_workers, self.scheduler.workers + 1), min(self.max_fragments, self.scheduler.fragments + 1), "healthy", now)
+
+    def apply(self, workers, fragments, reason, now):
+        if (workers, fragments) == (self.scheduler.workers, self.scheduler.fragments):
+            return
+        self.scheduler.set_workers(workers)
+        self.scheduler.fragments = fragments
+        self.history.append((now, workers, fragments, reason))
+        del self.history[:-100]
+        for callback in self.listeners:
+            callback(self)
@@ -0,0 +1,337 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import re
+import secrets
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from engine import DownloadEngine
+from batch import extract_sources, merge_sources, record_folders
+from scheduler import DEFAULT_WORKERS, DEFAULT_MERGE_WORKERS, DEFAULT_CONNECTIONS, RUNNING, MERGING, FINISHED_STATES
+from throttle import parse_rate
+
+DAEMON_FILE = os.path.join(os.path.expanduser("~"), ".cache", "youtube-downloader", "daemon.json")  # Port and token of the running daemon
+DEFAULT_PORT = 8765
+PROGRESS_INTERVAL = 0.5  # Seconds between progress events
+KEEPALIVE_SECONDS = 15  # An idle event stream gets a comment line this often
+KEEP_FINISHED_SECONDS = 60 * 60  # Finished jobs stay listed this long,
+MAX_FINISHED = 200  # and at most this many of them
+YDL_OPTS = {'quiet': True, 'noprogress': True}
+
+# One download engine per machine, shared over a localhost HTTP/JSON API, so downloads outlive the
+# windows that queued them and other tools can queue work. Every request needs the header
+# "Authorization: Bearer <token>", with the token from DAEMON_FILE.
+#   GET  /jobs                  every job, oldest first; finished ones are forgotten after
+#                               KEEP_FINISHED_SECONDS, or sooner past MAX_FINISHED of them
+#   GET  /jobs/<id>
+#   POST /jobs                  {"url", "save_path", "title", "quality", "extension", "audio_only", "copies", "use_archive"}
+#                               or {"urls": [...], "save_path", ...}: each video of the urls once, like cli.py;
+#                               answered 202 {"batch": id} at once, the urls are extracted in the background
+#   POST /jobs/<id>/cancel      also /pause and /resume
+#   POST /cancel                cancel every unfinished job
+#   GET  /stats                 stage stats and settings
+#   POST /settings              {"workers": 3, "auto": true, "max_rate": "2M"}, any of them
+#   GET  /events                server-sent events: "job" on every state change (every job on
+#                               connect, then "ready" with their ids), "progress" for running jobs
+#                               and "stages" when the stats change; "batch" {"id", "jobs", "skipped",
+#                               "errors"} once the urls of a POST /jobs are extracted and queued, or
+#                               {"id", "error"} if that failed
+
+class DownloadDaemon(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, engine, token, verbose=False):
+        super().__init__(address, DaemonHandler)
+        self.engine = engine
+        self.token = token
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.jobs = {}  # id -> DownloadJob, every job this daemon ran and has not forgotten yet
+        self.finished = {}  # id -> when the job finished, oldest first
+        self.subscribers = []  # Event queue per open event stream
+        self.batch_ids = itertools.count(1)
+        engine.scheduler.job_listeners.append(self.job_changed)
+
+    def stats(self):
+        scheduler = self.engine.scheduler
+        return {'stages': scheduler.stage_stats(), 'workers': scheduler.workers, 'auto': self.engine.controller.running, 'max_rate': scheduler.limiter.rate, 'jobs': len(self.job_list()), 'active': len(scheduler.active_jobs())}
+
+    def start(self, job):
+        with self.lock:
+            self.jobs[job.id] = job
+        self.engine.submit(job)
+        self.broadcast('job', job.to_dict())
+        return job
+
+    def create_job(self, url, title, folder, copies, body):
+        job = self.engine.create_job(url, title, folder, str(body.get('quality', '1080')), body.get('extension', 'mp4'), bool(body.get('audio_only')), YDL_OPTS, copies)
+        if not body.get('use_archive', True):
+            job.ydl_opts.pop('download_archive', None)
+        return job
+
+    def job_list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def job_changed(self, job):
+        if job.state in FINISHED_STATES:
+            with self.lock:
+                self.finished.setdefault(job.id, time.monotonic())
+        self.broadcast('job', job.to_dict())
+
+    def prune(self):
+        # Forgets finished jobs past the retention time or count
+        now = time.monotonic()
+        with self.lock:
+            expired = sum(1 for finished in self.finished.values() if now - finished > KEEP_FINISHED_SECONDS)
+            for job_id in list(self.finished)[:max(expired, len(self.finished) - MAX_FINISHED)]:
+                del self.finished[job_id]
+                self.jobs.pop(job_id, None)
+
+    def submit(self, body):
+        save_path = body.get('save_path')
+        if not isinstance(save_path, str) or not os.path.isabs(save_path):
+            raise ValueError("save_path must be an absolute path")
+        if body.get('urls'):
+            # Extracting a playlist can take minutes, far past a client's request timeout
+            batch = next(self.batch_ids)
+            threading.Thread(target=self.submit_urls, args=(batch, list(body['urls']), save_path, body), name=f"batch-{batch}", daemon=True).start()
+            return {'batch': batch}
+        if not body.get('url'):
+            raise ValueError("url or urls is required")
+        os.makedirs(save_path, exist_ok=True)
+        return self.start(self.create_job(body['url'], body.get('title') or body['url'], save_path, list(body.get('copies', [])), body)).to_dict()
+
+    def submit_urls(self, batch, urls, save_path, body):
+        try:
+            sources = extract_sources(self.engine, urls, bool(body.get('refresh')), self.engine.scheduler.retry_policy)
+            records, skipped = merge_sources(sources, self.engine.is_archived if body.get('use_archive', True) else None)
+            jobs = [self.start(self.create_job(record.url, record.title, *record_folders(record, save_path), body)) for record in records]
+        except Exception as e:
+            self.broadcast('batch', {'id': batch, 'error': str(e)})
+            return
+        self.broadcast('batch', {'id': batch, 'jobs': [job.id for job in jobs], 'skipped': [{'url': url, 'title': title} for url, title in skipped], 'errors': [{'url': url, 'error': error} for url, info, error in sources if error is not None]})
+
+    def apply_settings(self, body):
+        engine = self.engine
+        if 'auto' in body:
+            if body['auto']:
+                engine.controller.start()
+            else:
+                engine.controller.stop()
+        if 'workers' in body:
+            engine.scheduler.set_workers(max(1, int(body['workers'])))
+        if 'max_rate' in body:
+            rate = body['max_rate']
+            engine.scheduler.limiter.set_rate(parse_rate(rate) if isinstance(rate, str) else rate)
+
+    def subscribe(self):
+        events = queue.Queue()
+        with self.lock:
+            self.subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.remove(events)
+
+    def broadcast(self, event, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            events.put((event, data))
+
+    def publish_progress(self):
+        # Progress of running jobs whose progress changed, and the stats when they change
+        versions = {}
+        stats = None
+        while True:
+            time.sleep(PROGRESS_INTERVAL)
+            self.prune()
+            running = [job for job in self.engine.scheduler.active_jobs() if job.state in (RUNNING, MERGING)]
+            changed = [job for job in running if versions.get(job.id) != job.progress.version]
+            versions = {job.id: job.progress.version for job in running}
+            if changed:
+                self.broadcast('progress', [job.to_dict() for job in changed])
+            if self.stats() != stats:
+                stats = self.stats()
+                self.broadcast('stages', stats)
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def handle_request(self, method):
+        server = self.server
+        if not secrets.compare_digest(self.headers.get('Authorization', '').encode('utf-8'), f"Bearer {server.token}".encode('utf-8')):
+            self.close_connection = True  # The body, if any, is left unread
+            return self.send_json({'error': "Missing or wrong token"}, 401)
+        path = urlparse(self.path).path.rstrip('/')
+        try:
+            body = self.read_body() if method == 'POST' else {}
+        except ValueError:
+            self.close_connection = True
+            return self.send_json({'error': "The body must be a JSON object"}, 400)
+        match = re.fullmatch(r'/jobs/(\d+)(?:/(cancel|pause|resume))?', path)
+        try:
+            if method == 'GET' and path == '/events':
+                return self.send_events()
+            if method == 'GET' and path == '/jobs':
+                return self.send_json([job.to_dict() for job in server.job_list()])
+            if method == 'GET' and path == '/stats':
+                return self.send_json(server.stats())
+            if method == 'POST' and path == '/jobs':
+                result = server.submit(body)
+                return self.send_json(result, 202 if 'batch' in result else 201)
+            if method == 'POST' and path == '/settings':
+                server.apply_settings(body)
+                return self.send_json(server.stats())
+            if method == 'POST' and path == '/cancel':
+                jobs = server.engine.scheduler.active_jobs()
+                server.engine.scheduler.cancel_all()
+                return self.send_json({'cancelled': len(jobs)})
+            if match and (method == 'POST') == bool(match.group(2)):
+                job = server.job(int(match.group(1)))
+                if job is None:
+                    return self.send_json({'error': "No such job"}, 404)
+                if match.group(2):
+                    getattr(job, match.group(2))()
+                return self.send_json(job.to_dict())
+        except (ValueError, TypeError) as e:
+            return self.send_json({'error': str(e)}, 400)
+        except ConnectionError:
+            raise  # The client is gone; nothing to answer
+        except OSError as e:  # E.g. save_path can't be created or written
+            return self.send_json({'error': str(e)}, 500)
+        self.send_json({'error': "Not found"}, 404)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(body, dict):
+            raise ValueError("not an object")
+        return body
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_events(self):
+        server = self.server
+        events = server.subscribe()  # Before the snapshot, so no change falls in between
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            jobs = server.job_list()
+            for job in jobs:
+                self.send_event('job', job.to_dict())
+            self.send_event('stages', server.stats())
+            self.send_event('ready', {'jobs': [job.id for job in jobs]})
+            while True:
+                try:
+                    event, data = events.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    continue
+                self.send_event(event, data)
+        except OSError:  # Client went away
+            pass
+        finally:
+            server.unsubscribe(events)
+
+    def send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+
+def read_daemon_file(path=DAEMON_FILE):
+    # {'port', 'token', 'pid'} of the daemon running on this machine, or None
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_daemon_file(port, token, path=DAEMON_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Readable by this user only: the token is all that guards the API
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+        json.dump({'port': port, 'token': token, 'pid': os.getpid()}, f)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the download engine as a local daemon with an HTTP API.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"localhost port (default: {DEFAULT_PORT}, 0 for any free port)")
+    parser.add_argument('-j', '--concurrency', type=int, default=DEFAULT_WORKERS, help=f"parallel downloads (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--merge-workers', type=int, default=DEFAULT_MERGE_WORKERS, help=f"parallel ffmpeg merges (default: {DEFAULT_MERGE_WORKERS}, the CPU count)")
+    parser.add_argument('--adaptive', action='store_true', help="adjust parallel downloads and fragments to throughput and throttling")
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS, help=f"byte ranges of one progressive stream fetched at once (default: {DEFAULT_CONNECTIONS}, 1 for a single connection)")
+    parser.add_argument('--max-rate', type=parse_rate, default=None, help="bandwidth cap over all downloads, e.g. 500K or 5M")
+    parser.add_argument('--resume', action='store_true', help="resume downloads an earlier run left unfinished")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log every request")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    from daemon_client import DaemonClient
+    running = read_daemon_file()
+    if running and DaemonClient.reachable(running):
+        print(f"A daemon is already running on port {running['port']}", file=sys.stderr)
+        return 1
+    engine = DownloadEngine(args.concurrency)
+    engine.scheduler.set_merge_workers(args.merge_workers)
+    engine.scheduler.connections = max(1, args.connections)
+    engine.scheduler.limiter.set_rate(args.max_rate)
+    if args.adaptive:
+        engine.controller.start()
+    token = secrets.token_urlsafe(24)
+    try:
+        server = DownloadDaemon(('127.0.0.1', args.port), engine, token, args.verbose)
+    except OSError as e:
+        print(f"Cannot listen on port {args.port}: {e}", file=sys.stderr)
+        return 1
+    port = server.server_address[1]
+    write_daemon_file(port, token)
+    threading.Thread(target=server.publish_progress, daemon=True).start()
+    if args.resume:
+        for job in engine.unfinished_jobs():
+            server.start(job)
+    print(f"Download daemon on http://127.0.0.1:{port}/, token in {DAEMON_FILE}", flush=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Clean up on a plain kill too
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if (read_daemon_file() or {}).get('pid') == os.getpid():
+            os.remove(DAEMON_FILE)
+    # Unfinished jobs are left as they are in the journal, for the next --resume
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from daemon import DAEMON_FILE, KEEPALIVE_SECONDS, read_daemon_file
+from metadata_cache import MetadataCache
+from metrics import metrics, EXTRACT, RESOLVE
+from progress import JobProgress
+from scheduler import QUEUED, FAILED, CANCELLED, FINISHED_STATES
+
+# Client side of daemon.py. RemoteEngine stands in for DownloadEngine in the GUI: the same
+# attributes and methods, with the jobs created, run and controlled by the daemon and their
+# state kept up to date from its event stream.
+
+class DaemonClient:
+    def __init__(self, port, token):
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.token = token
+
+    @classmethod
+    def reachable(cls, info, timeout=0.5):
+        try:
+            cls(info['port'], info['token']).request('GET', '/stats', timeout=timeout)
+            return True
+        except (OSError, KeyError, TypeError, RuntimeError):
+            return False
+
+    def open(self, method, path, body=None, timeout=10):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data, method=method, headers={'Authorization': f"Bearer {self.token}", 'Content-Type': 'application/json'})
+        try:
+            return urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.loads(e.read()).get('error')
+            except ValueError:
+                error = None
+            raise RuntimeError(error or f"Daemon answered {e.code}")
+
+    def request(self, method, path, body=None, timeout=10):
+        with self.open(method, path, body, timeout) as response:
+            return json.loads(response.read())
+
+    def events(self):
+        # (event, data) from the event stream until the daemon closes it
+        with self.open('GET', '/events', timeout=KEEPALIVE_SECONDS * 2) as response:
+            event, data = None, []
+            for line in response:
+                line = line.decode('utf-8').rstrip('\r\n')
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:'):
+                    data.append(line[5:].strip())
+                elif not line and event:
+                    yield event, json.loads("\n".join(data))
+                    event, data = None, []
+
+class RemoteJob:
+    # A daemon's job with DownloadJob's attributes and controls
+    def __init__(self, client, request):
+        self.client = client
+        self.request = request  # POST /jobs body
+        self.id = None  # The daemon's id, once submitted
+        self.url = request['url']
+        self.title = request['title']
+        self.state = QUEUED
+        self.error = None
+        self.output = None
+        self.method = None
+        self.attempts = 0
+        self.retry_delay = None
+        self.progress = JobProgress()
+        self.listeners = []
+        self.finished = threading.Event()
+
+    def add_listener(self, callback):
+        # callback(job) runs on the event stream thread on every state change
+        self.listeners.append(callback)
+
+    def update(self, data):
+        self.state = data['state']
+        self.error = data['error']
+        self.output = data['output']
+        self.method = data['method']
+        self.attempts = data['attempts']
+        self.retry_delay = data['retry_delay']
+        self.progress.update(data['progress'])
+        if self.state in FINISHED_STATES:
+            self.finished.set()
+
+    def set_state(self, state, error=None):
+        # Only for jobs the daemon can no longer report on
+        self.state = state
+        self.error = error
+        self.finished.set()
+        self.notify()
+
+    def notify(self):
+        for callback in self.listeners:
+            callback(self)
+
+    def control(self, action):
+        if self.id is None:
+            if action == 'cancel':
+                self.set_state(CANCELLED)
+            return
+        try:
+            self.update(self.client.request('POST', f"/jobs/{self.id}/{action}"))
+        except (OSError, RuntimeError):
+            pass  # The event stream reports the daemon gone
+
+    def cancel(self):
+        self.control('cancel')
+
+    def pause(self):
+        self.control('pause')
+
+    def resume(self):
+        self.control('resume')
+
+class RemoteController:
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    @property
+    def running(self):
+        return self.scheduler.stats.get('auto', False)
+
+    def start(self):
+        self.scheduler.settings(auto=True)
+
+    def stop(self):
+        self.scheduler.settings(auto=False)
+
+class RemoteLimiter:
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    @property
+    def rate(self):
+        return self.scheduler.stats.get('max_rate')
+
+    def set_rate(self, rate):
+        self.scheduler.settings(max_rate=rate)
+
+class RemoteScheduler:
+    def __init__(self, client, stats):
+        self.client = client
+        self.stats = stats  # Last /stats, refreshed by "stages" events
+        self.limiter = RemoteLimiter(self)
+
+    @property
+    def workers(self):
+        return self.stats['workers']
+
+    def stage_stats(self):
+        return self.stats['stages']
+
+    def settings(self, **settings):
+        try:
+            self.stats = self.client.request('POST', '/settings', settings)
+        except (OSError, RuntimeError):
+            pass
+
+    def set_workers(self, count):
+        self.settings(workers=count)
+
+    def cancel_all(self):
+        try:
+            self.client.request('POST', '/cancel')
+        except (OSError, RuntimeError):
+            pass
+
+    def wait(self, jobs, timeout=None):
+        for job in jobs:
+            job.finished.wait(timeout)
+
+class RemoteEngine:
+    # Metadata is still extracted in this process, through the same per-machine cache
+    journal = None  # The daemon resumes its own unfinished jobs
+
+    def __init__(self, client, stats):
+        self.client = client
+        self.metadata_cache = MetadataCache()
+        self.scheduler = RemoteScheduler(client, stats)
+        self.controller = RemoteController(self.scheduler)
+        self.use_archive = True
+        self.jobs = {}  # Daemon job id -> RemoteJob submitted from here
+        self.lock = threading.Lock()
+        threading.Thread(target=self.listen, name="daemon-events", daemon=True).start()
+
+    def extract(self, url, force=False):
+        with metrics.span(EXTRACT, url=url):
+            return self.metadata_cache.extract(url, {'quiet': True, 'extract_flat': 'in_playlist'}, force)
+
+    def resolve_entry(self, url, force=False):
+        with metrics.span(RESOLVE, url=url):
+            return self.metadata_cache.extract(url, {'quiet': True, 'noplaylist': True}, force)
+
+    def create_job(self, url, title, save_path, quality, extension, audio_only=False, base_opts=None, copies=()):
+        return RemoteJob(self.client, {'url': url, 'title': title, 'save_path': save_path, 'quality': quality, 'extension': extension, 'audio_only': audio_only, 'copies': list(copies), 'use_archive': self.use_archive})
+
+    def submit(self, job):
+        # Held across the request, so the job's first events wait until it is registered here
+        with self.lock:
+            try:
+                data = self.client.request('POST', '/jobs', job.request)
+            except (OSError, RuntimeError) as e:
+                job.set_state(FAILED, f"Download daemon: {e}")
+                return job
+            job.id = data['id']
+            self.jobs[job.id] = job
+        job.update(data)
+        return job
+
+    def unfinished_jobs(self):
+        return []
+
+    def listen(self):
+        failures = 0
+        while True:
+            try:
+                for event, data in self.client.events():
+                    failures = 0
+                    self.dispatch(event, data)
+            except (OSError, ValueError, RuntimeError):
+                pass
+            failures += 1
+            if failures > 1:
+                self.fail_unfinished("Lost the connection to the download daemon")
+            time.sleep(min(30, 2 ** failures))
+
+    def dispatch(self, event, data):
+        if event == 'job':
+            with self.lock:
+                job = self.jobs.get(data['id'])
+            if job is not None:
+                job.update(data)
+                job.notify()
+                if job.finished.is_set():
+                    with self.lock:
+                        self.jobs.pop(job.id, None)
+        elif event == 'progress':
+            for job_data in data:
+                with self.lock:
+                    job = self.jobs.get(job_data['id'])
+                if job is not None:
+                    job.update(job_data)
+        elif event == 'stages':
+            self.scheduler.stats = data
+
+    def fail_unfinished(self, error):
+        # A restarted daemon has a new token and no longer knows these jobs either
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if not job.finished.is_set()]
+        for job in jobs:
+            job.set_state(FAILED, error)
+
+def connect_daemon(path=DAEMON_FILE):
+    # RemoteEngine attached to the daemon running on this machine, or None
+    info = read_daemon_file(path)
+    if not info:
+        return None
+    client = DaemonClient(info.get('port'), info.get('token'))
+    try:
+        stats = client.request('GET', '/stats', timeout=0.5)
+    except (OSError, ValueError, RuntimeError):
+        return None
+    return RemoteEngine(client, stats)
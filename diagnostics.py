@@ -0,0 +1,94 @@
+import time
+import customtkinter as ctk
+from tkinter import filedialog, messagebox
+from metrics import metrics, profile_report, STAGES, METRICS_DIR
+
+REFRESH_MS = 1000
+RECENT_LINES = 40
+
+class DiagnosticsWindow(ctk.CTkToplevel):
+    # Stage timings, counters and recent spans from the shared metrics, plus the cProfile
+    # capture toggle and export
+    def __init__(self, master, *args, **kwargs):
+        super().__init__(master, *args, **kwargs)
+        self.title("Diagnostics")
+        self.geometry("720x520")
+        self.configure(fg_color="black")
+        self.stage_labels = {}
+        self.create_widgets()
+        self.refresh()
+
+    def create_widgets(self):
+        headers = ["Stage", "Count", "Avg", "Max", "Last", "Total"]
+        for col, header in enumerate(headers):
+            ctk.CTkLabel(self, text=header, font=("Helvetica", 10), text_color="white").grid(row=0, column=col, padx=10, pady=(10, 2), sticky="w")
+        for row, stage in enumerate(STAGES, start=1):
+            ctk.CTkLabel(self, text=stage, font=("Helvetica", 11)).grid(row=row, column=0, padx=10, sticky="w")
+            cells = [ctk.CTkLabel(self, text="-", font=("Helvetica", 11)) for _ in headers[1:]]
+            for col, cell in enumerate(cells, start=1):
+                cell.grid(row=row, column=col, padx=10, sticky="w")
+            self.stage_labels[stage] = cells
+        next_row = len(STAGES) + 1
+
+        self.counters_label = ctk.CTkLabel(self, text="", font=("Helvetica", 10), text_color="green", justify="left", wraplength=680)
+        self.counters_label.grid(row=next_row, column=0, columnspan=6, padx=10, pady=5, sticky="w")
+
+        self.tabs = ctk.CTkTabview(self, fg_color="#101010")
+        self.tabs.grid(row=next_row + 1, column=0, columnspan=6, padx=10, pady=5, sticky="nsew")
+        self.recent_text = ctk.CTkTextbox(self.tabs.add("Recent"), font=("Courier", 11), wrap="none")
+        self.recent_text.pack(fill="both", expand=True)
+        self.profile_text = ctk.CTkTextbox(self.tabs.add("Profile"), font=("Courier", 11), wrap="none")
+        self.profile_text.pack(fill="both", expand=True)
+        self.profile_text.insert("end", "Start profiling, reproduce the slow step, then stop to see where the time went.")
+
+        self.profile_button = ctk.CTkButton(self, text="Start Profiling", command=self.toggle_profile, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
+        self.profile_button.grid(row=next_row + 2, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+        self.export_button = ctk.CTkButton(self, text="Export Metrics", command=self.export, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
+        self.export_button.grid(row=next_row + 2, column=2, columnspan=2, padx=10, pady=10, sticky="w")
+
+        self.rowconfigure(next_row + 1, weight=1)
+        self.columnconfigure(5, weight=1)
+
+    def refresh(self):
+        if not self.winfo_exists():
+            return
+        summary = metrics.summary()
+        for stage, cells in self.stage_labels.items():
+            values = summary.get(stage)
+            texts = [str(values['count']), f"{values['avg'] * 1000:.1f} ms", f"{values['max'] * 1000:.1f} ms", f"{values['last'] * 1000:.1f} ms", f"{values['total']:.2f} s"] if values else ["-"] * len(cells)
+            for cell, text in zip(cells, texts):
+                cell.configure(text=text)
+        counters = [f"{name}{'(' + ', '.join(f'{k}={v}' for k, v in labels.items()) + ')' if labels else ''}: {value}" for name, labels, value in metrics.counter_values()]
+        self.counters_label.configure(text="   ".join(counters))
+
+        lines = []
+        for span in reversed(metrics.recent(RECENT_LINES)):
+            labels = " ".join(f"{key}={value}" for key, value in span.items() if key not in ('stage', 'time', 'seconds'))
+            lines.append(f"{time.strftime('%H:%M:%S', time.localtime(span['time']))}  {span['stage']:<16} {span['seconds'] * 1000:9.1f} ms  {labels}")
+        self.recent_text.delete("1.0", "end")
+        self.recent_text.insert("end", "\n".join(lines))
+        self.after(REFRESH_MS, self.refresh)
+
+    def toggle_profile(self):
+        if not metrics.profiling:
+            metrics.start_profile()
+            self.profile_button.configure(text="Stop Profiling", fg_color="#F93131", hover_color="#F97A7A")
+            return
+        self.profile_button.configure(text="Start Profiling", fg_color="#3192F9", hover_color="lightblue")
+        path = filedialog.asksaveasfilename(parent=self, title="Save profile", initialdir=METRICS_DIR, initialfile="profile.prof", defaultextension=".prof", filetypes=[("cProfile data", "*.prof")])
+        stats = metrics.stop_profile(path or None)
+        if stats is None:
+            messagebox.showinfo("Profiling", "No instrumented stage ran during the capture.", parent=self)
+            return
+        self.profile_text.delete("1.0", "end")
+        self.profile_text.insert("end", profile_report(stats))
+        self.tabs.set("Profile")
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self, title="Export metrics", initialdir=METRICS_DIR, initialfile="metrics.jsonl", defaultextension=".jsonl", filetypes=[("JSON lines", "*.jsonl"), ("Prometheus text", "*.prom")])
+        if not path:
+            return
+        try:
+            metrics.export(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export metrics: {e}", parent=self)
@@ -0,0 +1,141 @@
+import os
+import re
+from functools import lru_cache
+from scheduler import DownloadScheduler, DownloadJob, DEFAULT_WORKERS
+from metadata_cache import MetadataCache
+from journal import JobJournal, DownloadArchive, ARCHIVE_PATH
+from controller import AdaptiveController
+from metrics import metrics, EXTRACT, RESOLVE
+from formats import FormatIndex, FormatTable, OutputPlan, output_extensions
+
+# Download logic shared by every front end (the Tk windows and the command line)
+
+def sanitize_filename(filename):
+    return re.sub(r'[<>:"/\\|?*]', '_', filename)
+
+def output_base(save_path, title):
+    return f'{save_path}/{sanitize_filename(title)}'
+
+def build_plan(save_path, title, quality, extension, audio_only=False, copies=()):
+    # Streams are picked by the plan (a yt-dlp format selector) to fit the target container,
+    # downloaded as separate files, then renamed or remuxed in the scheduler's merge stage
+    return OutputPlan(output_base(save_path, title), extension, quality, audio_only, copies)
+
+def build_ydl_opts(save_path, title, base_opts=None):
+    ydl_opts = dict(base_opts or {})
+    ydl_opts.setdefault('ffmpeg_location', ffmpeg_location())
+    ydl_opts.setdefault('noplaylist', True)
+    # Stream files are named per format id and end up as the plan's output file
+    ydl_opts['outtmpl'] = f"{output_base(save_path, title).replace('%', '%%')}.f%(format_id)s.%(ext)s"
+    return ydl_opts
+
+@lru_cache(maxsize=None)
+def ffmpeg_location():
+    # Resolved once per session; imageio_ffmpeg probes the filesystem on every call
+    import imageio_ffmpeg as ffmpeg
+    return ffmpeg.get_ffmpeg_exe()
+
+def warm_up():
+    # yt-dlp and its extractor table are the slowest imports; front ends call this from a
+    # background thread once their window is up, so the first fetch doesn't pay for them
+    from metadata_cache import cache_key
+    cache_key("https://www.youtube.com/watch?v=")  # Imports yt-dlp and compiles the url patterns up to YouTube's
+    ffmpeg_location()
+
+def create_playlist_dir(save_path, playlist_name):
+    playlist_path = os.path.join(save_path, sanitize_filename(playlist_name or 'Playlist'))
+    os.makedirs(playlist_path, exist_ok=True)
+    return playlist_path
+
+def entry_thumbnail(entry):
+    # Flat playlist entries only carry a 'thumbnails' list, resolved entries a 'thumbnail' url
+    thumbnails = entry.get('thumbnails') or [{}]
+    return entry.get('thumbnail') or thumbnails[-1].get('url')
+
+class VideoRecord:
+    # Row model for one video; list views and all batch actions work on these, never on widgets.
+    # Keeps only what they need from the info dict, formats packed in a FormatTable, so a large
+    # playlist holds no raw metadata once it is resolved.
+    __slots__ = ('id', 'title', 'url', 'thumbnail', 'format_index', 'quality', 'extension', 'playlists', 'selected', 'pending', 'failed', 'job')
+
+    def __init__(self, video_id, title, url, thumbnail=None):
+        self.id = video_id
+        self.title = title
+        self.url = url
+        self.thumbnail = thumbnail
+        self.playlists = ()  # Titles of the playlists listing it, None for a url of the video itself
+        self.selected = True
+        self.pending = False
+        self.failed = False
+        self.job = None
+        self.set_formats([])
+
+    def set_formats(self, formats, duration=None):
+        self.format_index = FormatIndex(FormatTable(formats), duration)
+        qualities = self.qualities
+        extensions = self.extensions
+        self.quality = str(next((q for q in qualities if q >= 1080), qualities[-1] if qualities else "N/A"))
+        self.extension = "mp4" if "mp4" in extensions else (extensions[0] if extensions else "N/A")
+
+    @property
+    def formats(self):
+        return self.format_index.formats
+
+    @property
+    def qualities(self):
+        return self.formats.qualities()
+
+    @property
+    def extensions(self):
+        return output_extensions(self.formats)
+
+def make_row(entry, title):
+    row = VideoRecord(entry.get('id'), title, entry.get('webpage_url') or entry.get('url'), entry_thumbnail(entry))
+    row.set_formats(entry.get('formats', []), entry.get('duration'))
+    return row
+
+class DownloadEngine:
+    def __init__(self, workers=DEFAULT_WORKERS, metadata_cache=None, journal=None, archive_path=ARCHIVE_PATH):
+        self.scheduler = DownloadScheduler(workers)
+        self.metadata_cache = metadata_cache or MetadataCache()
+        self.journal = journal or JobJournal()
+        self.archive = DownloadArchive(archive_path)
+        self.use_archive = True  # Skip videos yt-dlp has already recorded as downloaded
+        self.controller = AdaptiveController(self.scheduler)  # Off until started
+
+    def extract(self, url, force=False):
+        # Playlists come back as a flat listing (ids and titles); entries are resolved separately
+        with metrics.span(EXTRACT, url=url):
+            return self.metadata_cache.extract(url, {'quiet': True, 'extract_flat': 'in_playlist'}, force)
+
+    def resolve_entry(self, url, force=False):
+        with metrics.span(RESOLVE, url=url):
+            return self.metadata_cache.extract(url, {'quiet': True, 'noplaylist': True}, force)
+
+    def job_opts(self, base_opts=None):
+        # Interrupted downloads continue from their .part files; finished ones go in the archive
+        opts = {'continuedl': True}
+        if self.use_archive:
+            opts['download_archive'] = self.archive.path
+        opts.update(base_opts or {})
+        return opts
+
+    def create_job(self, url, title, save_path, quality, extension, audio_only=False, base_opts=None, copies=()):
+        return DownloadJob(url, build_ydl_opts(save_path, title, self.job_opts(base_opts)), title, build_plan(save_path, title, quality, extension, audio_only, copies))
+
+    def is_archived(self, info):
+        return self.use_archive and self.archive.contains(info)
+
+    def submit(self, job):
+        self.journal.record(job)
+        return self.scheduler.submit(job)
+
+    def unfinished_jobs(self):
+        # Jobs an earlier run left unfinished, rebuilt with the options they were queued with;
+        # submitting one again reuses its journal row.
+        jobs = []
+        for job_id, url, title, opts, plan in self.journal.unfinished():
+            if self.journal.claim(job_id):
+                opts['ffmpeg_location'] = ffmpeg_location()
+                jobs.append(DownloadJob(url, opts, title, plan and OutputPlan.from_dict(plan)))
+        return jobs
@@ -0,0 +1,150 @@
+import sys
+from array import array
+from containers import VIDEO_CONTAINERS, container_for, fits
+
+def is_video_only(f):
+    return f.get('vcodec') not in (None, 'none') and f.get('acodec') == 'none'
+
+def is_audio_only(f):
+    return f.get('acodec') not in (None, 'none') and f.get('vcodec') == 'none'
+
+def is_combined(f):
+    # Missing codec fields (e.g. direct links) count as a muxed file; 'none'/'none' is a storyboard
+    return f.get('vcodec') != 'none' and f.get('acodec') != 'none'
+
+def best_fitting(candidates, container, kinds):
+    # Last (best) candidate whose streams copy into container, else the best overall.
+    # yt-dlp sorts formats worst to best, so "best" of any subset is its last member.
+    fitting = [f for f in candidates if all(fits(container, kind, f.get(('vcodec', 'acodec')[kind])) for kind in kinds)]
+    return (fitting or candidates)[-1]
+
+def select_streams(formats, quality, extension, audio_only=False):
+    # Streams to download for a target: separate video and audio when both exist, else one muxed
+    # format. Within the best height allowed, streams that fit the container are preferred so
+    # the output can be stream-copied instead of re-encoded.
+    container = container_for(extension)
+    audios = [f for f in formats if is_audio_only(f)]
+    if audio_only:
+        chosen = audios[-1:] or [f for f in formats if is_combined(f)][-1:]
+        return chosen
+    max_height = int(quality) if str(quality).isdigit() else None
+    videos = [f for f in formats if is_video_only(f) and f.get('height') and (max_height is None or f['height'] <= max_height)]
+    if videos and audios:
+        top = max(f['height'] for f in videos)
+        video = best_fitting([f for f in videos if f['height'] == top], container, (0,))
+        return [video, best_fitting(audios, container, (1,))]
+    combined = [f for f in formats if is_combined(f)]
+    allowed = [f for f in combined if not f.get('height') or max_height is None or f['height'] <= max_height]
+    if allowed or combined:
+        return [best_fitting(allowed or combined, container, (0, 1))]
+    return formats[-1:]
+
+def output_extensions(formats):
+    # What the extension menus offer: containers the planner can produce, not the raw format exts
+    return list(VIDEO_CONTAINERS) if formats else []
+
+class OutputPlan:
+    # What a job turns into: the streams yt-dlp should fetch and the file they end up as.
+    # Instances are yt-dlp format selectors (the 'format' option takes a callable).
+    def __init__(self, base, extension, quality=None, audio_only=False, copies=()):
+        self.base = base  # Output path without extension
+        self.container = container_for(extension)
+        self.quality = quality
+        self.audio_only = audio_only
+        self.copies = list(copies)  # Other folders that get the finished file, e.g. playlists sharing the video
+
+    def __call__(self, ctx):
+        yield from select_streams(ctx['formats'], self.quality, self.container, self.audio_only)
+
+    def to_dict(self):
+        return {'base': self.base, 'extension': self.container, 'quality': self.quality, 'audio_only': self.audio_only, 'copies': self.copies}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d)
+
+_shared_columns = {}  # Identical string columns (same ladder, same codecs) are stored once
+
+class FormatTable:
+    # One video's formats packed into columns: interned strings for ids, extensions and codecs,
+    # typed arrays for the numbers with 0 for missing. A fraction of the memory of a list of
+    # format dicts; iterating yields the dicts again (only the fields the planner reads), which
+    # is done only while a selection is worked out.
+    __slots__ = ('format_ids', 'exts', 'vcodecs', 'acodecs', 'heights', 'filesizes', 'approx_sizes', 'tbrs')
+
+    def __init__(self, formats=()):
+        formats = list(formats)
+        self.format_ids = self.strings(formats, 'format_id')
+        self.exts = self.strings(formats, 'ext')
+        self.vcodecs = self.strings(formats, 'vcodec')
+        self.acodecs = self.strings(formats, 'acodec')
+        self.heights = array('I', (f.get('height') or 0 for f in formats))
+        self.filesizes = array('q', (f.get('filesize') or 0 for f in formats))
+        self.approx_sizes = array('q', (f.get('filesize_approx') or 0 for f in formats))
+        self.tbrs = array('d', (f.get('tbr') or 0 for f in formats))
+
+    @staticmethod
+    def strings(formats, field):
+        # None is kept apart from 'none': a missing codec means a muxed file, 'none' no stream
+        column = tuple(None if f.get(field) is None else sys.intern(str(f[field])) for f in formats)
+        if len(_shared_columns) > 10000:
+            _shared_columns.clear()
+        return _shared_columns.setdefault(column, column)
+
+    def __len__(self):
+        return len(self.format_ids)
+
+    def __iter__(self):
+        fields = zip(self.format_ids, self.exts, self.vcodecs, self.acodecs, self.heights, self.filesizes, self.approx_sizes, self.tbrs)
+        for format_id, ext, vcodec, acodec, height, filesize, approx_size, tbr in fields:
+            f = {'format_id': format_id, 'ext': ext, 'vcodec': vcodec, 'acodec': acodec, 'height': height or None, 'filesize': filesize or None, 'filesize_approx': approx_size or None, 'tbr': tbr or None}
+            yield {key: value for key, value in f.items() if value is not None}
+
+    def qualities(self):
+        # Distinct heights, best first
+        return sorted(set(height for height in self.heights if height), reverse=True)
+
+class FormatIndex:
+    # Selections and size estimates per (quality, extension, audio_only), worked out once per
+    # choice with the same planner the download uses, so batch totals are dictionary lookups
+    __slots__ = ('formats', 'duration', 'selections')
+
+    def __init__(self, formats, duration=None):
+        self.formats = formats
+        self.duration = duration
+        self.selections = {}
+
+    def select(self, quality, extension, audio_only=False):
+        key = (quality, extension, audio_only)
+        if key not in self.selections:
+            self.selections[key] = select_streams(list(self.formats), quality, extension, audio_only)
+        return self.selections[key]
+
+    def stream_size(self, f):
+        # (bytes, exact) from filesize, filesize_approx or bitrate times duration
+        if f.get('filesize'):
+            return f['filesize'], True
+        if f.get('filesize_approx'):
+            return f['filesize_approx'], False
+        if f.get('tbr') and self.duration:
+            return int(f['tbr'] * 1000 / 8 * self.duration), False
+        return None, False
+
+    def estimate(self, quality, extension, audio_only=False):
+        # Size of the selection as (bytes, exact); bytes is None when nothing is known
+        if quality == "N/A" or extension == "N/A":
+            return None, False
+        total, exact = 0, True
+        streams = self.select(quality, extension, audio_only)
+        for f in streams:
+            size, stream_exact = self.stream_size(f)
+            if size is None:
+                return None, False
+            total += size
+            exact = exact and stream_exact
+        return (total, exact) if streams else (None, False)
+
+def format_size(size, exact):
+    if size is None:
+        return "N/A"
+    return f"{'' if exact else '~'}{size / (1024 * 1024):.2f} MB"
@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from scheduler import QUEUED, CANCELLED, FINISHED_STATES
+
+JOURNAL_PATH = os.path.join(os.path.expanduser("~"), ".cache", "youtube-downloader", "jobs.sqlite3")
+ARCHIVE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "youtube-downloader", "archive.txt")
+KEEP_FINISHED = 30 * 24 * 60 * 60  # Seconds finished jobs stay in the journal
+HEARTBEAT_SECONDS = 10  # How often a running process marks its session alive
+STALE_SECONDS = 3 * HEARTBEAT_SECONDS  # A session not heard from for this long belongs to a dead process
+FINISHED = ", ".join("?" * len(FINISHED_STATES))  # Placeholders for FINISHED_STATES
+
+# Options that belong to this run rather than the job, and are set again on resume
+RUNTIME_OPTS = ('ffmpeg_location', 'progress_hooks', 'postprocessor_hooks')
+
+class JobJournal:
+    # Every submitted job with its resolved yt-dlp options and last state, so work left
+    # unfinished by a crash or a closed window can be picked up again on the next start.
+    # A job is keyed by url and output template: queuing the same download again reuses its row.
+    def __init__(self, path=JOURNAL_PATH):
+        self.session = uuid.uuid4().hex  # Rows this process owns; those of dead sessions are resumable
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, outtmpl TEXT NOT NULL, title TEXT, plan TEXT, output TEXT, opts TEXT NOT NULL, state TEXT NOT NULL, error TEXT, session TEXT, created REAL NOT NULL, updated REAL NOT NULL, UNIQUE (url, outtmpl))")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(jobs)")]
+        for column in ('plan', 'output'):  # Journals written before these columns existed
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+        self.db.execute("CREATE TABLE IF NOT EXISTS sessions (session TEXT PRIMARY KEY, pid INTEGER, heartbeat REAL NOT NULL)")
+        self.db.execute(f"DELETE FROM jobs WHERE state IN ({FINISHED}) AND updated < ?", (*FINISHED_STATES, time.time() - KEEP_FINISHED))
+        self.db.execute("DELETE FROM sessions WHERE heartbeat < ?", (time.time() - STALE_SECONDS,))
+        self.db.commit()
+        self.heartbeat()
+        threading.Thread(target=self.keep_alive, name="journal-heartbeat", daemon=True).start()
+
+    def heartbeat(self):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO sessions (session, pid, heartbeat) VALUES (?, ?, ?)", (self.session, os.getpid(), time.time()))
+            self.db.commit()
+
+    def keep_alive(self):
+        # Other processes sharing the journal (a second window, cli.py, the daemon) leave the jobs
+        # of a live session alone
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self.heartbeat()
+            except sqlite3.Error:
+                pass  # Locked by another process for now; the next beat is well inside STALE_SECONDS
+
+    def orphaned(self):
+        # SQL condition and parameters for rows no live session owns
+        return "COALESCE(session, '') NOT IN (SELECT session FROM sessions WHERE heartbeat >= ?)", (time.time() - STALE_SECONDS,)
+
+    def record(self, job):
+        opts = {key: value for key, value in job.ydl_opts.items() if key not in RUNTIME_OPTS}
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT INTO jobs (url, outtmpl, title, plan, opts, state, session, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url, outtmpl) DO UPDATE SET title = excluded.title, plan = excluded.plan, output = NULL, opts = excluded.opts, state = excluded.state, error = NULL, session = excluded.session, updated = excluded.updated", (job.url, opts.get('outtmpl', ''), job.title, job.plan and json.dumps(job.plan.to_dict()), json.dumps(opts), QUEUED, self.session, now, now))
+            job.journal_id = self.db.execute("SELECT id FROM jobs WHERE url = ? AND outtmpl = ?", (job.url, opts.get('outtmpl', ''))).fetchone()[0]
+            self.db.commit()
+        # Ahead of other listeners, so the state is on disk before anyone reacts to it (and maybe exits)
+        job.listeners.insert(0, self.update)
+
+    def update(self, job):
+        # Job listener; runs on the worker thread on every state change
+        with self.lock:
+            self.db.execute("UPDATE jobs SET state = ?, error = ?, output = ?, updated = ? WHERE id = ?", (job.state, job.error, job.output, time.time(), job.journal_id))
+            self.db.commit()
+
+    def unfinished(self):
+        # (id, url, title, opts, plan) of jobs a process that is no longer running queued but never finished
+        orphaned, params = self.orphaned()
+        with self.lock:
+            rows = self.db.execute(f"SELECT id, url, title, opts, plan FROM jobs WHERE state NOT IN ({FINISHED}) AND {orphaned} ORDER BY id", (*FINISHED_STATES, *params)).fetchall()
+        return [(job_id, url, title, json.loads(opts), plan and json.loads(plan)) for job_id, url, title, opts, plan in rows]
+
+    def claim(self, job_id):
+        # Takes over a row from a dead session; False if another process got to it first
+        orphaned, params = self.orphaned()
+        with self.lock:
+            claimed = self.db.execute(f"UPDATE jobs SET session = ? WHERE id = ? AND state NOT IN ({FINISHED}) AND {orphaned}", (self.session, job_id, *FINISHED_STATES, *params)).rowcount
+            self.db.commit()
+        return bool(claimed)
+
+    def discard_unfinished(self):
+        orphaned, params = self.orphaned()
+        with self.lock:
+            self.db.execute(f"UPDATE jobs SET state = ?, updated = ? WHERE state NOT IN ({FINISHED}) AND {orphaned}", (CANCELLED, time.time(), *FINISHED_STATES, *params))
+            self.db.commit()
+
+class DownloadArchive:
+    # Read side of yt-dlp's download_archive file ("<extractor> <id>" per line, appended by
+    # each job once its output is written), so playlist entries already downloaded can be
+    # dropped before a job is even created
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        self.ids = set()
+        self.mtime = None
+
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self.mtime:
+            with open(self.path, encoding='utf-8') as f:
+                self.ids = set(line.strip() for line in f if line.strip())
+            self.mtime = mtime
+
+    def contains(self, entry):
+        ie_key = entry.get('ie_key') or entry.get('extractor_key')
+        if not ie_key or not entry.get('id'):
+            return False
+        self.load()
+        return f"{ie_key.lower()} {entry['id']}" in self.ids
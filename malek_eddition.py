@@ -1,63 +1,76 @@
+from startup import StartupTimer, warm_up_in_background
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-from PIL import Image, ImageTk
-import yt_dlp as youtube_dl
-import imageio_ffmpeg as ffmpeg
-import os
-import re
-import requests
-from io import BytesIO
+import shutil
 import webbrowser
 import threading
-import queue  # Import the queue module
+from concurrent.futures import ThreadPoolExecutor
+from engine import DownloadEngine, warm_up
+from batch import parse_urls, extract_sources, merge_sources, record_folders
+from scheduler import DEFAULT_WORKERS, DONE, SKIPPED, FAILED, PAUSED, RUNNING, RETRYING
+from throttle import parse_rate
+from progress import format_bytes, format_eta
+from formats import format_size
+from thumbnails import ThumbnailService
+from virtual_list import VirtualList
+from animation import TitleTicker
+from metrics import metrics, WIDGET_BUILD
 
 # Set the theme
 ctk.set_appearance_mode("Dark")  # Set to dark mode
 ctk.set_default_color_theme("blue")  # Themes: "blue" (default), "green", "dark-blue"
 
+MAX_RESOLVE_WORKERS = 4  # Playlist entries resolved in parallel after the flat listing
+ROW_HEIGHT = 76  # Fixed row height the virtual list lays rows out with
+FRAME_MS = 100  # Progress is redrawn from the jobs' progress state at this interval
+AUTO_WORKERS = "Auto"  # Parallel downloads chosen by the adaptive controller
+SPEED_LIMITS = {"No limit": None, "500 KB/s": "500K", "1 MB/s": "1M", "2 MB/s": "2M", "5 MB/s": "5M", "10 MB/s": "10M"}
+
 class VideoComponent(ctk.CTkFrame):
-    def __init__(self, master, video_info, audio_only_var, sanitize_filename, *args, **kwargs):
+    # A recycled row widget: the virtual list rebinds it to whichever row model is in view
+    def __init__(self, master, app, *args, **kwargs):
         super().__init__(master, *args, **kwargs)
-        self.video_info = video_info
-        self.audio_only_var = audio_only_var
-        self.sanitize_filename = sanitize_filename
+        self.app = app
+        self.row = None
+        self.thumbnail_url = None
+        self.progress_version = None
         self.configure(fg_color="black", width=800)  # Set frame background color and fixed width
         self.create_widgets()
 
     def create_widgets(self):
         # Components
         self.download_var = ctk.BooleanVar(value=True)
-        self.download_check = ctk.CTkCheckBox(self, variable=self.download_var, text="")
+        self.download_check = ctk.CTkCheckBox(self, variable=self.download_var, text="", command=self.on_select)
         self.download_check.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
 
         self.quality_var = ctk.StringVar(self)
-        qualities = sorted(set(self.video_info['qualities']), reverse=True)
-        default_quality = next((q for q in qualities if q >= 1080), qualities[-1] if qualities else "N/A")
-        self.quality_var.set(default_quality)
-        quality_menu = ctk.CTkOptionMenu(self, variable=self.quality_var, values=[str(q) for q in qualities])
-        quality_menu.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
+        self.quality_menu = ctk.CTkOptionMenu(self, variable=self.quality_var, values=[], command=self.on_quality)
+        self.quality_menu.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
 
         self.extension_var = ctk.StringVar(self)
-        extensions = sorted(set(self.video_info['extensions']))
-        default_extension = "mp4" if "mp4" in extensions else (extensions[0] if extensions else "N/A")
-        self.extension_var.set(default_extension)
-        extension_menu = ctk.CTkOptionMenu(self, variable=self.extension_var, values=extensions)
-        extension_menu.grid(row=1, column=2, padx=10, pady=5, sticky="ew")
+        self.extension_menu = ctk.CTkOptionMenu(self, variable=self.extension_var, values=[], command=self.on_extension)
+        self.extension_menu.grid(row=1, column=2, padx=10, pady=5, sticky="ew")
 
         self.thumbnail_label = ctk.CTkLabel(self, text=None)
         self.thumbnail_label.grid(row=1, column=3, padx=10, pady=5, sticky="ew")
-        self.load_thumbnail()
 
         # Directly add the title Label to the grid
-        self.title_label = ctk.CTkLabel(self, text=str(self.video_info['title']).ljust(30), font=("Helvetica", 12), text_color="white")
+        self.title_label = ctk.CTkLabel(self, text="", font=("Helvetica", 12), text_color="white")
         self.title_label.grid(row=1, column=4, padx=10, pady=5, sticky="ew")
+        self.app.ticker.register(self.title_label)
 
-        self.size_label = ctk.CTkLabel(self, text=self.get_file_size(), font=("Helvetica", 10), text_color="green")
+        self.size_label = ctk.CTkLabel(self, text="", font=("Helvetica", 10), text_color="green")
         self.size_label.grid(row=1, column=5, padx=10, pady=5, sticky="ew")
 
-        self.download_button = ctk.CTkButton(self, text="Download", command=self.download_video, font=("Helvetica", 10), fg_color="#3192F9", hover_color="lightblue")
+        self.download_button = ctk.CTkButton(self, text="Download", command=self.on_download_button, font=("Helvetica", 10), fg_color="#3192F9", hover_color="lightblue")
         self.download_button.grid(row=1, column=6, padx=10, pady=5, sticky="ew")
 
+        self.status_label = ctk.CTkLabel(self, text="", font=("Helvetica", 10), text_color="white")
+        self.status_label.grid(row=1, column=7, padx=10, pady=5, sticky="ew")
+
+        self.cancel_button = ctk.CTkButton(self, text="Cancel", command=self.cancel_job, width=60, font=("Helvetica", 10), fg_color="#F93131", hover_color="#F97A7A", state="disabled")
+        self.cancel_button.grid(row=1, column=8, padx=10, pady=5, sticky="ew")
+
         # Configure column widths
         self.columnconfigure(0, weight=1, minsize=50)  # Select
         self.columnconfigure(1, weight=1, minsize=80)  # Quality
@@ -66,80 +79,184 @@ class VideoComponent(ctk.CTkFrame):
         self.columnconfigure(4, weight=3, minsize=200) # Title
         self.columnconfigure(5, weight=1, minsize=80)  # Size
         self.columnconfigure(6, weight=1, minsize=100) # Download
+        self.columnconfigure(7, weight=1, minsize=180) # Status
+        self.columnconfigure(8, weight=1, minsize=60)  # Cancel
 
-    def load_thumbnail(self):
-        thumbnail_url = self.video_info.get('thumbnail')
-        if thumbnail_url:
-            response = requests.get(thumbnail_url)
-            img_data = response.content
-            img = Image.open(BytesIO(img_data))
-            img.thumbnail((100, 100))
-            photo = ImageTk.PhotoImage(img)
-            self.thumbnail_label.configure(image=photo)
-            self.thumbnail_label.image = photo
-
-        self.after(0, self.animate_text)
-
-    def animate_text(self):
-        text = self.title_label.cget("text")
-        if len(text) > 30:  # Adjust the length as needed
-            def scroll_text():
-                current_text = self.title_label.cget("text")
-                new_text = current_text[1:] + current_text[0]
-                self.title_label.configure(text=new_text)
-                self.after(500, scroll_text)  # Adjust the speed as needed
-            scroll_text()
+    def bind_row(self, row):
+        self.row = row
+        self.load_thumbnail()
+        self.refresh()
+
+    def refresh(self):
+        row = self.row
+        self.download_var.set(row.selected)
+        self.quality_menu.configure(values=[str(q) for q in row.qualities])
+        self.quality_var.set(row.quality)
+        self.extension_menu.configure(values=row.extensions)
+        self.extension_var.set(row.extension)
+        self.app.ticker.set_text(self.title_label, str(row.title).ljust(30))
+        if row.pending:
+            self.size_label.configure(text="Resolving...", text_color="green")
+        elif row.failed:
+            self.size_label.configure(text="Unavailable", text_color="red")
+        else:
+            self.size_label.configure(text=self.get_file_size(), text_color="green")
+        self.update_job_status(row.job)
+        if row.thumbnail != self.thumbnail_url:
+            self.load_thumbnail()
 
-    def get_file_size(self):
-        selected_quality = int(self.quality_var.get())
-        selected_extension = self.extension_var.get()
-        formats = self.video_info.get('formats', [])
-
-        for f in formats:
-            if f.get('height') == selected_quality and f.get('ext') == selected_extension:
-                size = f.get('filesize', 0)
-                if size:
-                    return f"{size / (1024 * 1024):.2f} MB"
-        return "N/A"
-
-    def download_video(self):
-        url = self.video_info['webpage_url']
-        save_path = filedialog.askdirectory()
-        if not save_path:
-            messagebox.showwarning("Warning", "Please select a save location.")
+    def load_thumbnail(self):
+        row = self.row
+        self.thumbnail_url = row.thumbnail
+        self.show_thumbnail(row, self.app.thumbnails.placeholder)
+        if self.thumbnail_url:
+            self.app.thumbnails.get(row.id, self.thumbnail_url, lambda img: self.on_thumbnail_loaded(row, img))
+
+    def on_thumbnail_loaded(self, row, img):
+        # May run on a thumbnail worker thread; hand the image over to the UI thread
+        if img is not None:
+            self.after(0, self.show_thumbnail, row, img)
+
+    def show_thumbnail(self, row, img):
+        if not self.winfo_exists() or row is not self.row:  # Widget was recycled for another row meanwhile
             return
+        from PIL import ImageTk
+        photo = ImageTk.PhotoImage(img)
+        self.thumbnail_label.configure(image=photo)
+        self.thumbnail_label.image = photo
 
-        ffmpeg_path = ffmpeg.get_ffmpeg_exe()
-        ydl_opts = {'ffmpeg_location': ffmpeg_path, 'noplaylist': True}
-
-        quality = self.quality_var.get()
-        extension = self.extension_var.get()
-        title = self.video_info['title']
-        if quality == "N/A" or extension == "N/A":
-            messagebox.showwarning("Warning", f"Invalid quality or extension for {title}.")
+    def get_file_size(self):
+        return format_size(*self.app.estimate_row(self.row))
+
+    def on_select(self):
+        self.row.selected = self.download_var.get()
+        self.app.schedule_total_update()
+
+    def on_quality(self, value):
+        self.row.quality = value
+        self.size_label.configure(text=self.get_file_size())
+        self.app.schedule_total_update()
+
+    def on_extension(self, value):
+        self.row.extension = value
+        self.size_label.configure(text=self.get_file_size())
+        self.app.schedule_total_update()
+
+    def on_download_button(self):
+        job = self.row.job
+        if job and not job.finished.is_set():
+            if job.state == PAUSED:
+                job.resume()
+            else:
+                job.pause()
+        else:
+            self.app.download_row(self.row)
+
+    def update_job_status(self, job):
+        if job is None:
+            self.progress_version = None
+            self.status_label.configure(text="")
+            self.download_button.configure(text="Download")
+            self.cancel_button.configure(state="disabled")
             return
-        if self.audio_only_var.get():
-            ydl_opts['format'] = 'bestaudio/best'
+        self.progress_version = job.progress.version
+        self.status_label.configure(text=self.job_status_text(job))
+        if job.finished.is_set():
+            self.download_button.configure(text="Download")
+            self.cancel_button.configure(state="disabled")
         else:
-            ydl_opts['format'] = f'bestvideo[height<={quality}]+bestaudio/best[ext={extension}]'
-        ydl_opts['outtmpl'] = f'{save_path}/{self.sanitize_filename(title)}.{extension}'
-
-        try:
-            with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-            messagebox.showinfo("Success", "Download completed!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+            self.download_button.configure(text="Resume" if job.state == PAUSED else "Pause")
+            self.cancel_button.configure(state="normal")
+
+    def job_status_text(self, job):
+        progress = job.progress
+        if job.state == DONE and job.method:
+            return f"Done ({job.method})"
+        if job.state == RETRYING:
+            return f"Retry {job.attempts} in {job.retry_delay:.0f}s"
+        if job.state != RUNNING:
+            return job.state.capitalize()
+        if progress.stage:
+            return f"{progress.stage}..."
+        if progress.stalled():
+            return f"Stalled {progress.fraction():.0%}"
+        speed = f"{format_bytes(progress.speed)}/s" if progress.speed else "--"
+        return f"{progress.fraction():.0%} {speed} ETA {format_eta(progress.eta)}"
+
+    def cancel_job(self):
+        if self.row.job:
+            self.row.job.cancel()
 
 class YouTubeDownloader(ctk.CTk):
-    def __init__(self):
+    def __init__(self, startup_timer=None):
         super().__init__()
+        self.engine = DownloadEngine(DEFAULT_WORKERS)  # Until find_daemon() has looked for a daemon
         self.title("YouTube Video Downloader")
         self.geometry("1100x600")
         self.configure(fg_color="black")  # Set main window background color
-        self.progress_queue = queue.Queue()  # Initialize the progress_queue
+        self.batch_jobs = []  # Jobs the progress bar currently reports on
+        self.total_update_pending = False
+        self.fetch_generation = 0  # Bumped on every fetch so stale entry resolutions are dropped
+        self.scheduler = self.engine.scheduler
+        self.thumbnails = ThumbnailService()
+        self.fetched_urls = []  # What the rows came from; downloads never re-read the url field
+        self.url_queue = None
+        self.rows = []
+        self.ticker = TitleTicker(self)  # Shared scroller for long titles
+        self.diagnostics = None
+        self.startup_timer = startup_timer or StartupTimer("malek_eddition")
         self.create_widgets()
         self.process_queue()  # Start processing the queue
+        self.startup_timer.mark('window')
+        self.after_idle(self.on_first_paint)
+
+    def on_first_paint(self):
+        # Heavy modules (yt-dlp, requests, PIL) and ffmpeg discovery load only after the window is up
+        self.startup_timer.mark('first_paint')
+        warm_up_in_background(self.startup_timer, warm_up, self.thumbnails.warm_up)
+        threading.Thread(target=self.find_daemon, name="find-daemon", daemon=True).start()
+
+    def find_daemon(self):
+        # A download daemon running on this machine gets the jobs, so they outlive the window.
+        # Imported here: the client pulls in http.server and urllib.request, not needed to start.
+        from daemon_client import connect_daemon
+        engine = connect_daemon()
+        self.after(0, self.attach_daemon, engine)
+
+    def attach_daemon(self, engine):
+        # Downloads started before the daemon answered keep the local engine
+        if engine is not None and not self.scheduler.active_jobs():
+            engine.use_archive = self.engine.use_archive
+            self.engine = engine
+            self.scheduler = engine.scheduler
+            self.title("YouTube Video Downloader (daemon)")
+            self.workers_var.set(AUTO_WORKERS if engine.controller.running else str(self.scheduler.workers))
+        self.offer_resume()
+
+    def offer_resume(self):
+        if self.engine.journal is None:  # Attached to a daemon, which resumes its own jobs
+            return
+        unfinished = self.engine.journal.unfinished()
+        if not unfinished:
+            return
+        if messagebox.askyesno("Resume downloads", f"{len(unfinished)} download(s) from a previous session did not finish. Resume them?"):
+            threading.Thread(target=self.resume_downloads, daemon=True).start()
+        else:
+            self.engine.journal.discard_unfinished()
+
+    def resume_downloads(self):
+        jobs = self.engine.unfinished_jobs()
+        if not jobs:
+            return
+        self.batch_jobs = jobs
+        for job in jobs:
+            self.engine.submit(job)
+        self.scheduler.wait(jobs)
+
+        failed = [job for job in jobs if job.state == FAILED]
+        if failed:
+            messagebox.showerror("Error", "\n".join(f"{job.title}: {job.error}" for job in failed))
+        messagebox.showinfo("Success", "Resumed downloads completed!")
 
     def create_widgets(self):
         ctk.CTkLabel(self, text="YouTube URL:", font=("Helvetica", 12)).grid(row=0, column=0, padx=10, pady=10, sticky="w")
@@ -149,6 +266,12 @@ class YouTubeDownloader(ctk.CTk):
         self.fetch_button = ctk.CTkButton(self, text="Fetch Formats", command=self.start_fetch_formats_thread, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
         self.fetch_button.grid(row=0, column=2, padx=10, pady=10, sticky="w")
 
+        self.refresh_button = ctk.CTkButton(self, text="Refresh", command=lambda: self.start_fetch_formats_thread(force=True), font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
+        self.refresh_button.grid(row=0, column=3, padx=10, pady=10, sticky="w")
+
+        self.url_list_button = ctk.CTkButton(self, text="URL List...", command=self.open_url_queue, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
+        self.url_list_button.grid(row=0, column=4, padx=10, pady=10, sticky="w")
+
         self.toggle_all_var = ctk.BooleanVar(value=True)
         self.toggle_all_check = ctk.CTkCheckBox(self, text="Toggle All", variable=self.toggle_all_var, command=self.toggle_all_checkboxes, font=("Helvetica", 12))
         self.toggle_all_check.grid(row=1, column=0, padx=10, pady=10, sticky="w")
@@ -157,38 +280,57 @@ class YouTubeDownloader(ctk.CTk):
         self.reverse_selection_button.grid(row=1, column=1, padx=10, pady=10, sticky="w")
 
         self.audio_only_var = ctk.BooleanVar()
-        self.audio_only_check = ctk.CTkCheckBox(self, text="Download Audio Only", variable=self.audio_only_var, font=("Helvetica", 12))
+        self.audio_only_check = ctk.CTkCheckBox(self, text="Download Audio Only", variable=self.audio_only_var, command=self.on_audio_only, font=("Helvetica", 12))
         self.audio_only_check.grid(row=1, column=2, padx=10, pady=10, sticky="e")
 
         self.about_me_button = ctk.CTkButton(self, text="Prof-xed", command=self.open_github, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
         self.about_me_button.grid(row=1, column=3, padx=10, pady=10, sticky="e")
 
+        self.diagnostics_button = ctk.CTkButton(self, text="Diagnostics", command=self.open_diagnostics, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
+        self.diagnostics_button.grid(row=1, column=5, padx=10, pady=10, sticky="w")
+
         self.loading_label = ctk.CTkLabel(self, text="Loading...", text_color="red", font=("Helvetica", 12))
         self.loading_label.grid(row=1, column=1, padx=10, pady=10, sticky="w")
         self.loading_label.grid_remove()
 
         # Labels for each component
-        headers = ["Select", "Quality", "Extension", "Thumbnail", "Title", "Size", "Download"]
+        headers = ["Select", "Quality", "Extension", "Thumbnail", "Title", "Size", "Download", "Status"]
         for col, header in enumerate(headers):
             ctk.CTkLabel(self, text=header, font=("Helvetica", 10), text_color="white").grid(row=2, column=col, padx=10, pady=5, sticky="w")
+        self.total_label = ctk.CTkLabel(self, text="", font=("Helvetica", 10), text_color="green")
+        self.total_label.grid(row=2, column=8, columnspan=2, padx=10, pady=5, sticky="e")
 
-        self.canvas = ctk.CTkCanvas(self, bg="black")  # Set canvas background color
-        self.scrollbar = ctk.CTkScrollbar(self, command=self.canvas.yview)
-        self.scrollable_frame = ctk.CTkFrame(self.canvas, fg_color="black")  # Set scrollable frame background color
-        self.scrollable_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        self.canvas.bind_all("<MouseWheel>", self.on_mousewheel)
-
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-
-        self.canvas.grid(row=3, column=0, columnspan=7, sticky="nsew")
-        self.scrollbar.grid(row=3, column=7, sticky="ns")
+        self.video_list = VirtualList(self, lambda parent: VideoComponent(parent, self), ROW_HEIGHT, fg_color="black")
+        self.video_list.grid(row=3, column=0, columnspan=10, sticky="nsew")
+        self.bind_all("<MouseWheel>", self.on_mousewheel)
 
         self.download_button = ctk.CTkButton(self, text="Download All", command=self.start_download_thread, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
         self.download_button.grid(row=4, column=3, pady=20, padx=10, sticky="ew")
+
+        ctk.CTkLabel(self, text="Parallel downloads:", font=("Helvetica", 12)).grid(row=4, column=1, padx=10, pady=20, sticky="e")
+        self.workers_var = ctk.StringVar(value=AUTO_WORKERS if self.engine.controller.running else str(self.scheduler.workers))
+        self.workers_menu = ctk.CTkOptionMenu(self, variable=self.workers_var, values=[AUTO_WORKERS] + [str(n) for n in range(1, 9)], command=self.set_workers, width=70)
+        self.workers_menu.grid(row=4, column=2, padx=10, pady=20, sticky="w")
+
+        self.cancel_all_button = ctk.CTkButton(self, text="Cancel All", command=lambda: self.scheduler.cancel_all(), font=("Helvetica", 12), fg_color="#F93131", hover_color="#F97A7A")
+        self.cancel_all_button.grid(row=4, column=4, pady=20, padx=10, sticky="w")
+
+        self.scroll_titles_var = ctk.BooleanVar(value=True)
+        self.scroll_titles_check = ctk.CTkCheckBox(self, text="Scroll Titles", variable=self.scroll_titles_var, command=lambda: self.ticker.set_enabled(self.scroll_titles_var.get()), font=("Helvetica", 12))
+        self.scroll_titles_check.grid(row=4, column=5, padx=10, pady=20, sticky="w")
+
+        self.skip_downloaded_var = ctk.BooleanVar(value=True)
+        self.skip_downloaded_check = ctk.CTkCheckBox(self, text="Skip Downloaded", variable=self.skip_downloaded_var, command=lambda: setattr(self.engine, 'use_archive', self.skip_downloaded_var.get()), font=("Helvetica", 12))
+        self.skip_downloaded_check.grid(row=4, column=6, padx=10, pady=20, sticky="w")
+
+        self.speed_limit_var = ctk.StringVar(value="No limit")
+        self.speed_limit_menu = ctk.CTkOptionMenu(self, variable=self.speed_limit_var, values=list(SPEED_LIMITS), command=lambda value: self.scheduler.limiter.set_rate(parse_rate(SPEED_LIMITS[value])), width=90)
+        self.speed_limit_menu.grid(row=4, column=7, padx=10, pady=20, sticky="w")
         self.progress = ctk.CTkProgressBar(self, orientation="horizontal", mode="determinate")
-        self.progress.grid(row=5, column=0, columnspan=7, pady=10, padx=10, sticky="ew")
+        self.progress.grid(row=5, column=0, columnspan=9, pady=10, padx=10, sticky="ew")
         self.progress.set(0)
+        self.progress_label = ctk.CTkLabel(self, text="", font=("Helvetica", 10), text_color="white")
+        self.progress_label.grid(row=6, column=0, columnspan=9, padx=10, sticky="w")
 
         self.columnconfigure(0, weight=1, minsize=50)  # Select
         self.columnconfigure(1, weight=1, minsize=80)  # Quality
@@ -197,65 +339,134 @@ class YouTubeDownloader(ctk.CTk):
         self.columnconfigure(4, weight=3, minsize=200) # Title
         self.columnconfigure(5, weight=1, minsize=80)  # Size
         self.columnconfigure(6, weight=1, minsize=100) # Download
+        self.rowconfigure(3, weight=1)
 
-        self.process_queue()  # Start processing the queue
-
-    def start_fetch_formats_thread(self, event=None):
+    def start_fetch_formats_thread(self, event=None, force=False, urls=None):
+        # The url field takes one or more urls; the URL List window passes its own
+        urls = urls or parse_urls(self.url_entry.get())
+        if not urls:
+            messagebox.showwarning("Warning", "Please enter a URL.")
+            return
         self.loading_label.grid()
-        fetch_thread = threading.Thread(target=self.update_dropdowns)
+        fetch_thread = threading.Thread(target=self.update_dropdowns, args=(urls, force))
         fetch_thread.start()
 
-    def fetch_formats(self, url):
-        ydl_opts = {'quiet': True}
-        try:
-            with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                info_dict = ydl.extract_info(url, download=False)
-                formats = info_dict.get('formats', [])
-                video_qualities = sorted(set(f['height'] for f in formats if f.get('height')), reverse=True)
-                extensions = sorted(set(f['ext'] for f in formats if f.get('ext')))
-                return video_qualities, extensions, info_dict
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to fetch formats: {e}")
-            return [], [], {}
-
-    def update_dropdowns(self, event=None):
-        url = self.url_entry.get()
-        if url:
-            video_qualities, extensions, info_dict = self.fetch_formats(url)
-            self.after(0, self.update_dropdowns_ui, video_qualities, extensions, info_dict)
-
-    def update_dropdowns_ui(self, video_qualities, extensions, info_dict):
+    def fetch_formats(self, urls, force=False):
+        # All urls at once; playlists come back as flat listings (ids and titles), their entries
+        # are resolved afterwards
+        sources = extract_sources(self.engine, urls, force)
+        failed = [f"{url}: {error}" for url, info, error in sources if error is not None]
+        if failed:
+            messagebox.showerror("Error", "Failed to fetch formats:\n" + "\n".join(failed))
+        return sources
+
+    def update_dropdowns(self, urls, force=False):
+        sources = self.fetch_formats(urls, force)
+        self.after(0, self.update_dropdowns_ui, urls, sources, force)
+
+    def update_dropdowns_ui(self, urls, sources, force=False):
         self.loading_label.grid_remove()
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        if 'entries' in info_dict:  # It's a playlist
-            for index, entry in enumerate(info_dict['entries']):
-                entry_formats = entry.get('formats', [])
-                video_qualities = sorted(set(f['height'] for f in entry_formats if f.get('height')), reverse=True)
-                extensions = sorted(set(f['ext'] for f in entry_formats if f.get('ext')))
-                video_info = { 'title': entry.get('title', f'Video {index + 1}'), 'qualities': video_qualities, 'extensions': extensions, 'thumbnail': entry.get('thumbnail'), 'webpage_url': entry.get('webpage_url'), 'formats': entry_formats }
-                video_component = VideoComponent(self.scrollable_frame, video_info, self.audio_only_var, self.sanitize_filename)
-                video_component.grid(row=index + 1, column=0, padx=10, pady=5, sticky="ew")
-        else:  # It's a single video
-            video_info = { 'title': info_dict.get('title', 'Video'), 'qualities': video_qualities, 'extensions': extensions, 'thumbnail': info_dict.get('thumbnail'), 'webpage_url': info_dict.get('webpage_url'), 'formats': info_dict.get('formats', []) }
-            video_component = VideoComponent(self.scrollable_frame, video_info, self.audio_only_var, self.sanitize_filename)
-            video_component.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
-
-    def sanitize_filename(self, filename):
-        return re.sub(r'[<>:"/\\|?*]', '_', filename)
+        self.fetched_urls = urls
+        self.fetch_generation += 1
+        with metrics.span(WIDGET_BUILD, urls=len(urls), entries=sum(len(info.get('entries', [info])) for url, info, error in sources if info)):
+            self.build_rows(sources, force)
+        self.schedule_total_update()
+
+    def build_rows(self, sources, force=False):
+        # One row per unique video; one listed by several playlists or urls shows up once
+        self.rows = merge_sources(sources)[0]
+        for row in self.rows:
+            row.pending = not row.formats
+        pending = [row for row in self.rows if row.pending]
+        if pending:
+            resolve_thread = threading.Thread(target=self.resolve_entries, args=(pending, self.fetch_generation, force), daemon=True)
+            resolve_thread.start()
+        self.video_list.set_rows(self.rows)
+
+    def resolve_entries(self, rows, generation, force=False):
+        with ThreadPoolExecutor(max_workers=MAX_RESOLVE_WORKERS) as executor:
+            for row in rows:
+                executor.submit(self.resolve_entry, row, generation, force)
+
+    def resolve_entry(self, row, generation, force=False):
+        if generation != self.fetch_generation:  # A newer fetch replaced these rows
+            return
+        try:
+            entry = self.engine.resolve_entry(row.url, force)
+        except Exception:
+            entry = None
+        if generation == self.fetch_generation:
+            self.after(0, self.apply_resolved_entry, row, entry)
+
+    def apply_resolved_entry(self, row, entry):
+        # Called on the UI thread once a flat playlist entry has been resolved
+        row.pending = False
+        if entry is None:
+            row.failed = True
+        else:
+            row.set_formats(entry.get('formats', []), entry.get('duration'))
+            row.thumbnail = row.thumbnail or entry.get('thumbnail')
+            row.url = entry.get('webpage_url') or row.url
+        self.video_list.refresh_row(row)
+        self.schedule_total_update()
+
+    def estimate_row(self, row):
+        return row.format_index.estimate(row.quality, row.extension, self.audio_only_var.get())
+
+    def selection_size(self):
+        # (bytes, exact, rows without any size information) over the selected rows
+        total, exact, unknown = 0, True, 0
+        for row in self.rows:
+            if not row.selected:
+                continue
+            size, row_exact = self.estimate_row(row)
+            if size is None:
+                unknown += 1
+            else:
+                total += size
+                exact = exact and row_exact
+        return total, exact, unknown
+
+    def schedule_total_update(self):
+        # Coalesce bursts (select all, many resolutions at once) into one recount
+        if not self.total_update_pending:
+            self.total_update_pending = True
+            self.after_idle(self.update_total)
+
+    def update_total(self):
+        self.total_update_pending = False
+        selected = sum(1 for row in self.rows if row.selected)
+        total, exact, unknown = self.selection_size()
+        text = f"Selected: {selected}, {'' if exact else '~'}{format_bytes(total)}"
+        if unknown:
+            text += f" ({unknown} unknown)"
+        self.total_label.configure(text=text)
+
+    def on_audio_only(self):
+        self.video_list.refresh()
+        self.schedule_total_update()
+
+    def set_workers(self, value):
+        if value == AUTO_WORKERS:
+            self.engine.controller.start()
+            return
+        self.engine.controller.stop()
+        self.scheduler.set_workers(int(value))
 
     def toggle_all_checkboxes(self):
-        for widget in self.scrollable_frame.winfo_children():
-            if isinstance(widget, VideoComponent):
-                widget.download_var.set(self.toggle_all_var.get())
+        for row in self.rows:
+            row.selected = self.toggle_all_var.get()
+        self.video_list.refresh()
+        self.schedule_total_update()
 
     def reverse_selection(self):
-        for widget in self.scrollable_frame.winfo_children():
-            if isinstance(widget, VideoComponent):
-                widget.download_var.set(not widget.download_var.get())
+        for row in self.rows:
+            row.selected = not row.selected
+        self.video_list.refresh()
+        self.schedule_total_update()
 
     def start_download_thread(self):
-        selected_videos = [widget for widget in self.scrollable_frame.winfo_children() if isinstance(widget, VideoComponent) and widget.download_var.get()]
+        selected_videos = [row for row in self.rows if row.selected]
         total_videos = len(selected_videos)
 
         if total_videos == 0:
@@ -265,89 +476,100 @@ class YouTubeDownloader(ctk.CTk):
         download_thread = threading.Thread(target=self.download_all_videos)
         download_thread.start()
 
-    def download_all_videos(self, event=None):
-        url = self.url_entry.get()
-        if not url:
-            messagebox.showwarning("Warning", "Please enter a URL.")
-            return
-
+    def download_row(self, row):
         save_path = filedialog.askdirectory()
         if not save_path:
             messagebox.showwarning("Warning", "Please select a save location.")
             return
 
-        ffmpeg_path = ffmpeg.get_ffmpeg_exe()
-        ydl_opts = { 'ffmpeg_location': ffmpeg_path, 'noplaylist': False }
-
-        with youtube_dl.YoutubeDL({'quiet': True}) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
+        job = self.create_job(row, save_path)
+        if job:
+            job.add_listener(self.report_single_download)
+            self.batch_jobs = [active for active in self.batch_jobs if not active.finished.is_set()] + [job]
+            self.engine.submit(job)
 
-            if 'entries' in info_dict:  # It's a playlist
-                self.download_playlist(info_dict, save_path, ydl_opts)
-            else:  # It's a single video
-                self.download_single_video(info_dict, save_path, ydl_opts)
-
-    def download_single_video(self, info_dict, save_path, ydl_opts):
-        video_info = { 'title': info_dict.get('title', 'Video'), 'qualities': sorted(set(str(f['height']) for f in info_dict['formats'] if f.get('height')), reverse=True), 'extensions': sorted(set(f['ext'] for f in info_dict['formats'] if f.get('ext'))) }
-        quality = video_info['qualities'][0] if video_info['qualities'] else "N/A"
-        extension = video_info['extensions'][0] if video_info['extensions'] else "N/A"
-        title = video_info['title']
+    def create_job(self, row, save_path, copies=()):
+        quality = row.quality
+        extension = row.extension
+        title = row.title
         if quality == "N/A" or extension == "N/A":
             messagebox.showwarning("Warning", f"Invalid quality or extension for {title}.")
+            return None
+        job = self.engine.create_job(row.url, title, save_path, quality, extension, self.audio_only_var.get(), copies=copies)
+        job.add_listener(lambda job: self.after(0, self.video_list.refresh_row, row))
+        # Download All creates its jobs on a worker thread; widgets are only touched on the UI thread
+        self.after(0, self.attach_job, row, job)
+        return job
+
+    def attach_job(self, row, job):
+        row.job = job
+        self.video_list.refresh_row(row)
+
+    def report_single_download(self, job):
+        if job.state == DONE:
+            messagebox.showinfo("Success", "Download completed!")
+        elif job.state == SKIPPED:
+            messagebox.showinfo("Skipped", job.error)
+        elif job.state == FAILED:
+            messagebox.showerror("Error", job.error)
+
+    def download_all_videos(self, event=None):
+        # Downloads the rows of the last fetch, whatever the url field says by now
+        save_path = filedialog.askdirectory()
+        if not save_path:
+            messagebox.showwarning("Warning", "Please select a save location.")
             return
-        if self.audio_only_var.get():
-            ydl_opts['format'] = 'bestaudio/best'
-        else:
-            ydl_opts['format'] = f'bestvideo[height<={quality}]+bestaudio/best[ext={extension}]'
-        ydl_opts['outtmpl'] = f'{save_path}/{self.sanitize_filename(title)}.{extension}'
 
-        try:
-            with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([info_dict['webpage_url']])
-            messagebox.showinfo("Success", "Download completed!")
-            self.progress_queue.put(1)  # Put progress update in the queue
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        total, exact, unknown = self.selection_size()
+        free = shutil.disk_usage(save_path).free
+        if total > free and not messagebox.askyesno("Low disk space", f"The selection needs {'' if exact else 'about '}{format_bytes(total)} but only {format_bytes(free)} is free on the target drive. Download anyway?"):
+            return
 
-    def download_playlist(self, info_dict, save_path, ydl_opts):
-        playlist_name = info_dict.get('title', 'Playlist')
-        sanitized_playlist_name = self.sanitize_filename(playlist_name)
-        playlist_path = os.path.join(save_path, sanitized_playlist_name)
-        os.makedirs(playlist_path, exist_ok=True)
+        self.download_rows(save_path)
 
-        selected_videos = [widget for widget in self.scrollable_frame.winfo_children() if isinstance(widget, VideoComponent) and widget.download_var.get()]
+    def download_rows(self, save_path):
+        # Each playlist gets its own folder; a video several of them list is downloaded once
+        # and linked into the others' folders when it is done
+        selected_videos = [row for row in self.rows if row.selected]
         total_videos = len(selected_videos)
         self.progress["maximum"] = total_videos
         self.progress.set(0)
 
-        for i, widget in enumerate(selected_videos):
-            quality = widget.quality_var.get()
-            extension = widget.extension_var.get()
-            title = widget.video_info['title']
-            if quality == "N/A" or extension == "N/A":
-                messagebox.showwarning("Warning", f"Invalid quality or extension for {title}.")
-                continue
-            if self.audio_only_var.get():
-                ydl_opts['format'] = 'bestaudio/best'
-            else:
-                ydl_opts['format'] = f'bestvideo[height<={quality}]+bestaudio/best[ext={extension}]'
-            ydl_opts['outtmpl'] = f'{playlist_path}/{self.sanitize_filename(title)}.{extension}'
+        jobs = []
+        for row in selected_videos:
+            folder, copies = record_folders(row, save_path)
+            job = self.create_job(row, folder, copies)
+            if job:
+                jobs.append(job)
+        self.batch_jobs = jobs
+        for job in jobs:
+            self.engine.submit(job)
+        self.scheduler.wait(jobs)
+
+        failed = [job for job in jobs if job.state == FAILED]
+        if failed:
+            messagebox.showerror("Error", "\n".join(f"{job.title}: {job.error}" for job in failed))
+        messagebox.showinfo("Success", "Download completed!")
 
-            try:
-                with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([info_dict['entries'][i]['webpage_url']])
-                self.progress_queue.put(1 / total_videos)  # Put progress update in the queue
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
-                self.progress_queue.put(1 / total_videos)  # Put progress update in the queue
+    def open_url_queue(self):
+        if self.url_queue is not None and self.url_queue.winfo_exists():
+            self.url_queue.focus()
+            return
+        from url_queue import UrlQueueWindow
+        self.url_queue = UrlQueueWindow(self, lambda urls: self.start_fetch_formats_thread(urls=urls), self.fetched_urls)
 
-        messagebox.showinfo("Success", "Download completed!")
+    def open_diagnostics(self):
+        if self.diagnostics is not None and self.diagnostics.winfo_exists():
+            self.diagnostics.focus()
+            return
+        from diagnostics import DiagnosticsWindow
+        self.diagnostics = DiagnosticsWindow(self)
 
     def open_github(self):
         webbrowser.open("https://github.com/prof-xed")
 
     def on_mousewheel(self, event):
-        self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+        self.video_list.yview_scroll(int(-1*(event.delta/120)), "units")
 
     def unfocus_text(self, event):
         if event.widget != self.url_entry:
@@ -355,15 +577,30 @@ class YouTubeDownloader(ctk.CTk):
             self.focus()
 
     def process_queue(self):
-        try:
-            while True:
-                progress_update = self.progress_queue.get_nowait()
-                self.progress.set(self.progress.get() + progress_update)
-                self.update_idletasks()
-        except queue.Empty:
-            pass
-        self.after(100, self.process_queue)  # Check the queue every 100 ms
+        # Redraw from the latest job progress once per frame, however many hook calls came in
+        jobs = self.batch_jobs
+        if jobs:
+            fractions = [1.0 if job.finished.is_set() else job.progress.fraction() for job in jobs]
+            self.progress.set(sum(fractions) / len(jobs))
+            running = [job for job in jobs if job.state == RUNNING]
+            speed = sum(job.progress.speed or 0 for job in running)
+            done = sum(job.progress.downloaded for job in jobs)
+            finished = sum(1 for job in jobs if job.finished.is_set())
+            stalled = sum(1 for job in running if job.progress.stalled())
+            retrying = sum(1 for job in jobs if job.state == RETRYING)
+            auto = f" of {self.scheduler.workers} auto" if self.engine.controller.running else ""
+            stages = self.scheduler.stage_stats()
+            merge = stages['merge']
+            merge_time = f", {merge['avg_seconds']:.1f}s avg" if merge['avg_seconds'] is not None else ""
+            self.progress_label.configure(text=f"{finished}/{len(jobs)} done, {len(running)} running{auto}, {stalled} stalled, {retrying} retrying, {format_bytes(done)} at {format_bytes(speed)}/s | merging {merge['active']} ({merge['queued']} waiting{merge_time})")
+        for widget in self.video_list.visible_widgets():
+            job = widget.row.job
+            if job is not None and job.state == RUNNING and (job.progress.version != widget.progress_version or job.progress.stalled()):
+                widget.update_job_status(job)
+        self.after(FRAME_MS, self.process_queue)
 
 if __name__ == "__main__":
-    app = YouTubeDownloader()
+    startup_timer = StartupTimer("malek_eddition")
+    startup_timer.mark('imports')
+    app = YouTubeDownloader(startup_timer)
     app.mainloop()
@@ -0,0 +1,108 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+from metrics import metrics
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "youtube-downloader", "metadata.sqlite3")
+CACHE_TTL = 6 * 60 * 60  # Seconds before a cached extraction is considered stale
+CACHE_MAX_BYTES = 64 * 1024 * 1024  # Compressed size cap, least recently used entries go first
+
+# The only fields the app reads back from an extraction
+INFO_FIELDS = ('id', 'title', 'webpage_url', 'url', 'thumbnail', 'duration', 'extractor_key', 'ie_key')
+FORMAT_FIELDS = ('format_id', 'ext', 'height', 'vcodec', 'acodec', 'filesize', 'filesize_approx', 'tbr')
+
+def trim_info(info):
+    trimmed = {field: info[field] for field in INFO_FIELDS if info.get(field) is not None}
+    if not trimmed.get('thumbnail') and info.get('thumbnails'):
+        trimmed['thumbnail'] = info['thumbnails'][-1].get('url')
+    if 'formats' in info:
+        trimmed['formats'] = [{field: f[field] for field in FORMAT_FIELDS if f.get(field) is not None} for f in info['formats']]
+    if 'entries' in info:
+        trimmed['entries'] = [trim_info(entry) for entry in info['entries'] if entry]
+    return trimmed
+
+@lru_cache(maxsize=4096)
+def cache_key(url):
+    # Key by extractor and video/playlist id when the url carries nothing but that id, so
+    # youtu.be and youtube.com links for the same video share one entry. Anything more (a
+    # channel tab like /@X/shorts, a playlist next to the video, a start time) may change
+    # what yt-dlp returns, so those are keyed by the normalised url instead. Memoized: finding
+    # the extractor tries the url against every extractor's pattern, ~8 ms for a generic url.
+    from yt_dlp.extractor import gen_extractor_classes
+    parts = urlsplit(url)
+    for ie in gen_extractor_classes():
+        if ie.suitable(url):
+            temp_id = ie.get_temp_id(url)
+            if temp_id and ie.ie_key() != 'Generic' and only_id(parts, temp_id):
+                return f"{ie.ie_key()}:{temp_id}"
+            break
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), parts.query, ''))
+
+def only_id(parts, temp_id):
+    # True for urls like youtu.be/<id>, /shorts/<id>, /@handle, watch?v=<id> or playlist?list=<id>
+    query = parse_qsl(parts.query)
+    if query:
+        return len(query) == 1 and query[0][1] == temp_id
+    segments = [segment for segment in parts.path.split('/') if segment]
+    return bool(segments) and segments[-1] == temp_id
+
+class MetadataCache:
+    def __init__(self, path=CACHE_PATH):
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        self.db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT data, created FROM info WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > CACHE_TTL:
+                self.db.execute("DELETE FROM info WHERE key = ?", (key,))
+                self.db.commit()
+                return None
+            self.db.execute("UPDATE info SET accessed = ? WHERE key = ?", (now, key))
+            self.db.commit()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, info):
+        trimmed = trim_info(info)
+        data = zlib.compress(json.dumps(trimmed, separators=(',', ':')).encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO info (key, data, size, created, accessed) VALUES (?, ?, ?, ?, ?)", (key, data, len(data), now, now))
+            self.evict()
+            self.db.commit()
+        return trimmed
+
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM info").fetchone()[0]
+        if total <= CACHE_MAX_BYTES:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM info ORDER BY accessed").fetchall():
+            self.db.execute("DELETE FROM info WHERE key = ?", (key,))
+            total -= size
+            if total <= CACHE_MAX_BYTES:
+                break
+
+    def extract(self, url, ydl_opts, force=False):
+        # Cached counterpart of extract_info(url, download=False); returns the trimmed info
+        key = cache_key(url)
+        if not force:
+            info = self.get(key)
+            if info is not None:
+                metrics.count('metadata_cache', result='hit')
+                return info
+        metrics.count('metadata_cache', result='miss')
+        import yt_dlp as youtube_dl
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+        return self.put(key, info)
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_DIR = os.path.join(os.path.expanduser("~"), ".cache", "youtube-downloader")
+RECENT_SPANS = 200  # Spans kept for the diagnostics panel and exports
+
+# Stages spans are recorded under
+EXTRACT = "extract"  # Playlist or video metadata, cache hits included
+RESOLVE = "resolve"  # One flat playlist entry resolved to its formats
+THUMBNAIL_FETCH = "thumbnail_fetch"
+THUMBNAIL_DECODE = "thumbnail_decode"
+WIDGET_BUILD = "widget_build"  # Row models and the list view after a fetch
+DOWNLOAD = "download"
+MERGE = "merge"
+STAGES = (EXTRACT, RESOLVE, THUMBNAIL_FETCH, THUMBNAIL_DECODE, WIDGET_BUILD, DOWNLOAD, MERGE)
+
+class Metrics:
+    # Timing spans per stage and named counters for the whole process. Cheap enough to stay on:
+    # a span is two perf_counter calls and a lock. Set YTD_METRICS=<path> to append every span
+    # to a JSON lines file as it finishes.
+    # While a profile capture runs, the code inside spans is also run under cProfile, on
+    # whichever thread it runs.
+    def __init__(self, log_path=None):
+        self.lock = threading.Lock()
+        self.spans = deque(maxlen=RECENT_SPANS)  # {'stage', 'time', 'seconds', **labels}
+        self.stages = {}  # stage -> [count, total seconds, max seconds, last seconds]
+        self.counters = {}  # (name, ((label, value), ...)) -> value
+        self.log_path = log_path
+        self.profiles = None  # cProfile.Profile per thread while a capture runs
+        self.local = threading.local()
+
+    @contextmanager
+    def span(self, stage, **labels):
+        # Times the block; the dict it yields holds 'seconds' once the block is done
+        timing = {}
+        profile = self._enter_profile()
+        started = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing['seconds'] = time.perf_counter() - started
+            if profile:
+                self._exit_profile(profile)
+            self.record(stage, timing['seconds'], **labels)
+
+    def record(self, stage, seconds, **labels):
+        entry = {'stage': stage, 'time': round(time.time(), 3), 'seconds': round(seconds, 6), **labels}
+        with self.lock:
+            self.spans.append(entry)
+            totals = self.stages.setdefault(stage, [0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+            totals[3] = seconds
+        if self.log_path:
+            self.append(self.log_path, [entry])
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def recent(self, limit=RECENT_SPANS):
+        with self.lock:
+            return list(self.spans)[-limit:]
+
+    def summary(self):
+        # stage -> {'count', 'total', 'avg', 'max', 'last'} in seconds
+        with self.lock:
+            return {stage: {'count': count, 'total': round(total, 4), 'avg': round(total / count, 4), 'max': round(peak, 4), 'last': round(last, 4)} for stage, (count, total, peak, last) in self.stages.items()}
+
+    def counter_values(self):
+        with self.lock:
+            return [(name, dict(labels), value) for (name, labels), value in sorted(self.counters.items())]
+
+    def append(self, path, entries):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in entries)
+        except OSError:
+            pass
+
+    def export_jsonl(self, path):
+        # Recent spans, then one line per stage summary and per counter
+        entries = [{'type': 'span', **span} for span in self.recent()]
+        entries += [{'type': 'stage', 'stage': stage, **values} for stage, values in self.summary().items()]
+        entries += [{'type': 'counter', 'name': name, 'value': value, **labels} for name, labels, value in self.counter_values()]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+
+    def prometheus(self):
+        # Text exposition format, e.g. for node_exporter's textfile collector
+        lines = ["# TYPE ytd_stage_seconds summary"]
+        for stage, values in self.summary().items():
+            lines.append(f'ytd_stage_seconds_sum{{stage="{stage}"}} {values["total"]}')
+            lines.append(f'ytd_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+        lines.append("# TYPE ytd_stage_seconds_max gauge")
+        lines += [f'ytd_stage_seconds_max{{stage="{stage}"}} {values["max"]}' for stage, values in self.summary().items()]
+        typed = set()
+        for name, labels, value in self.counter_values():
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE ytd_{name}_total counter")
+            label_text = ",".join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+            lines.append(f"ytd_{name}_total{{{label_text}}} {value}" if label_text else f"ytd_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+
+    def export(self, path):
+        # Format by extension: .prom or .txt for Prometheus text, anything else JSON lines
+        if os.path.splitext(path)[1].lower() in ('.prom', '.txt'):
+            self.export_prometheus(path)
+        else:
+            self.export_jsonl(path)
+
+    @property
+    def profiling(self):
+        return self.profiles is not None
+
+    def start_profile(self):
+        with self.lock:
+            if self.profiles is None:
+                self.profiles = []
+
+    def stop_profile(self, path=None):
+        # Ends the capture; returns pstats.Stats over every profiled span (None if none ran)
+        # and dumps them to path, which snakeviz or `python -m pstats` can open
+        with self.lock:
+            profiles, self.profiles = self.profiles or [], None
+        import pstats
+        profiles = [profile for profile in profiles if profile.getstats()]
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        if path:
+            stats.dump_stats(path)
+        return stats
+
+    def _enter_profile(self):
+        # Only the outermost span on a thread profiles, nested ones are inside its capture
+        if self.profiles is None or getattr(self.local, 'profile', None):
+            return None
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler owns this thread (or the interpreter, on 3.12+)
+            return None
+        self.local.profile = profile
+        return profile
+
+    def _exit_profile(self, profile):
+        profile.disable()
+        self.local.profile = None
+        with self.lock:
+            if self.profiles is not None:
+                self.profiles.append(profile)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def profile_report(stats, limit=25):
+    # Top functions by cumulative time as text
+    from io import StringIO
+    out = StringIO()
+    stats.stream = out
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+metrics = Metrics(os.environ.get('YTD_METRICS') or None)  # Shared by every module of the app
@@ -0,0 +1,74 @@
+import time
+
+STALL_SECONDS = 15  # A running job with no progress callback for this long is shown as stalled
+
+class JobProgress:
+    # Written only by the job's own worker thread through yt-dlp hooks; readers just
+    # take whatever values are there, so no lock is needed per update
+    __slots__ = ('streams', 'speed', 'eta', 'stage', 'updated', 'version')
+
+    def __init__(self):
+        self.streams = {}  # filename -> (downloaded bytes, total bytes)
+        self.speed = None
+        self.eta = None
+        self.stage = None  # Running postprocessor, e.g. 'Merger'
+        self.updated = time.monotonic()
+        self.version = 0
+
+    def record_download(self, d):
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        if d.get('status') == 'finished':
+            total = downloaded = total or downloaded
+        self.streams[d.get('filename')] = (downloaded, total)
+        self.speed = d.get('speed') if d.get('status') == 'downloading' else None
+        self.eta = d.get('eta') if d.get('status') == 'downloading' else None
+        self.updated = time.monotonic()
+        self.version += 1
+
+    def record_postprocess(self, d):
+        self.stage = d.get('postprocessor') if d.get('status') == 'started' else None
+        self.updated = time.monotonic()
+        self.version += 1
+
+    @property
+    def downloaded(self):
+        return sum(done for done, total in list(self.streams.values()))
+
+    @property
+    def total(self):
+        return sum(total for done, total in list(self.streams.values()))
+
+    def fraction(self):
+        total = self.total
+        return min(1.0, self.downloaded / total) if total else 0.0
+
+    def stalled(self, now=None):
+        return (now or time.monotonic()) - self.updated > STALL_SECONDS
+
+    def to_dict(self):
+        return {'downloaded': self.downloaded, 'total': self.total, 'speed': self.speed, 'eta': self.eta, 'stage': self.stage, 'idle': round(time.monotonic() - self.updated, 1)}
+
+    def update(self, d):
+        # Takes over a to_dict() from another process, e.g. a daemon's job shown in a client
+        self.streams = {None: (d['downloaded'], d['total'])}
+        self.speed = d['speed']
+        self.eta = d['eta']
+        self.stage = d['stage']
+        self.updated = time.monotonic() - d['idle']
+        self.version += 1
+
+def format_bytes(size):
+    if not size:
+        return "0 B"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
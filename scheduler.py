@@ -0,0 +1,472 @@
+import itertools
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from progress import JobProgress
+from containers import remux
+from throttle import BandwidthLimiter, RetryPolicy
+from metrics import metrics, DOWNLOAD, MERGE
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+RETRYING = "retrying"  # Failed transiently, waiting out its backoff before going back in the queue
+DOWNLOADED = "downloaded"  # Streams are down, waiting for a merge worker
+MERGING = "merging"
+DONE = "done"
+SKIPPED = "skipped"  # yt-dlp downloaded nothing, e.g. the video is in the download archive
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, SKIPPED, FAILED, CANCELLED)
+
+DEFAULT_WORKERS = 3
+DEFAULT_MERGE_WORKERS = os.cpu_count() or 2
+DEFAULT_FRAGMENTS = 1  # yt-dlp's concurrent_fragment_downloads for fragmented (DASH/HLS) streams
+DEFAULT_CONNECTIONS = 4  # Byte ranges fetched at once from a progressive stream (segmented.py), 1 for a single connection
+
+_job_ids = itertools.count(1)
+
+class DownloadJob:
+    def __init__(self, url, ydl_opts, title=None, plan=None):
+        self.id = next(_job_ids)
+        self.url = url
+        self.title = title or url
+        # Every job owns its options, hooks included, so jobs never share a mutated dict
+        self.ydl_opts = dict(ydl_opts)
+        # With an OutputPlan, the plan picks the streams, yt-dlp downloads them as separate files
+        # and the job remuxes them into the planned container in the scheduler's merge stage
+        self.plan = plan
+        self.files = []  # {'filename', 'vcodec', 'acodec', 'ext'} per finished download, in order
+        self.output = None  # Final file, once known
+        self.method = None  # How it was produced: 'rename', 'copy' or a 'transcode ...' variant
+        self.archive_ids = []  # Download archive lines yt-dlp would have written, written once the output exists
+        self.state = QUEUED
+        self.error = None
+        self.paused_from = None  # QUEUED or RUNNING, while paused
+        self.parked = False  # Paused while queued and taken off the queue, until resumed
+        self.requeue = None  # Set by the scheduler on submit: puts the job back in the download queue
+        self.journal_id = None  # Row in the job journal, once submitted through the engine
+        self.attempts = 0  # Retries so far
+        self.retry_delay = None
+        self.limiter = None  # Set by the scheduler on submit
+        self.retry_policy = None
+        self.download_seconds = 0.0  # Time in each stage, over all attempts
+        self.merge_seconds = 0.0
+        self.progress = JobProgress()
+        self.listeners = []
+        self.finished = threading.Event()
+        self._cancel_event = threading.Event()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._lock = threading.Lock()  # Held over every check-then-set of state, so cancel(), pause() and run() can't interleave
+
+    def add_listener(self, callback):
+        # callback(job) runs on the worker thread on every state change
+        self.listeners.append(callback)
+
+    def to_dict(self):
+        return {'id': self.id, 'url': self.url, 'title': self.title, 'state': self.state, 'error': self.error, 'output': self.output, 'method': self.method, 'attempts': self.attempts, 'retry_delay': self.retry_delay, 'copies': self.plan.copies if self.plan else [], 'download_seconds': round(self.download_seconds, 3), 'merge_seconds': round(self.merge_seconds, 3), 'progress': self.progress.to_dict()}
+
+    def set_state(self, state, error=None, expect=None):
+        # Returns whether the state changed: a finished job keeps its final state, and with
+        # expect, only a job in one of those states changes
+        with self._lock:
+            if state == DOWNLOADED and self.cancelled:  # Cancelled as the download finished
+                state, error = CANCELLED, None
+            changed = self._change(state, error, expect)
+        if changed:
+            self._changed(state)
+        return changed
+
+    def _change(self, state, error=None, expect=None):
+        # Called with self._lock held; set_state() without the listeners
+        if self.finished.is_set() or (expect is not None and self.state not in expect):
+            return False
+        self.state = state
+        self.error = error
+        if state in FINISHED_STATES:
+            self.finished.set()
+        return True
+
+    def _changed(self, state):
+        # Called without the lock, after _change(), so listeners can call back into the job
+        if state in FINISHED_STATES:
+            metrics.count('jobs', state=state)
+            if state == DONE:
+                metrics.count('downloaded_bytes', self.progress.downloaded)
+        for callback in self.listeners:
+            callback(self)
+
+    def cancel(self):
+        with self._lock:
+            self._cancel_event.set()
+            self._resume_event.set()
+            changed = self._change(CANCELLED, expect=(QUEUED, PAUSED, RETRYING, DOWNLOADED))
+        if changed:
+            self._changed(CANCELLED)
+
+    def pause(self):
+        with self._lock:
+            paused_from = self.state
+            if not self._change(PAUSED, expect=(QUEUED, RUNNING)):
+                return
+            self.paused_from = paused_from
+            self._resume_event.clear()
+        self._changed(PAUSED)
+
+    def resume(self):
+        with self._lock:
+            state = self.paused_from
+            if not self._change(state, expect=(PAUSED,)):
+                return
+            self._resume_event.set()
+            requeue, self.parked = self.parked, False
+        self._changed(state)
+        if requeue:
+            self.requeue(self)
+
+    @property
+    def paused(self):
+        return not self._resume_event.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def build_opts(self, extra_opts=None):
+        opts = dict(self.ydl_opts, **(extra_opts or {}))
+        opts['progress_hooks'] = list(opts.get('progress_hooks', [])) + [self.progress_hook]
+        opts['postprocessor_hooks'] = list(opts.get('postprocessor_hooks', [])) + [self.postprocessor_hook]
+        if self.plan:
+            opts['format'] = self.plan
+        if isinstance(opts.get('download_archive'), str):
+            # yt-dlp archives a video as soon as its streams are down, before they are merged; it
+            # checks and adds to a copy instead, and record_archive() writes the file
+            opts['download_archive'] = read_archive(opts['download_archive'])
+        return opts
+
+    def record_archive(self):
+        path = self.ydl_opts.get('download_archive')
+        if self.archive_ids and isinstance(path, str):
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write("".join(f"{archive_id}\n" for archive_id in self.archive_ids))
+            self.archive_ids = []
+
+    def checkpoint(self):
+        # Blocks while paused, raises once cancelled; called from yt-dlp's hooks
+        self._resume_event.wait()
+        if self._cancel_event.is_set():
+            from yt_dlp.utils import DownloadCancelled
+            raise DownloadCancelled(f"Cancelled {self.title}")
+
+    def progress_hook(self, d):
+        before = self.progress.downloaded
+        self.progress.record_download(d)
+        if self.limiter:
+            self.limiter.consume(self.progress.downloaded - before)
+        if d.get('status') == 'finished' and all(f['filename'] != d.get('filename') for f in self.files):
+            info = d.get('info_dict') or {}
+            self.files.append({'filename': d.get('filename'), 'vcodec': info.get('vcodec'), 'acodec': info.get('acodec'), 'ext': info.get('ext')})
+        self.checkpoint()
+
+    def postprocessor_hook(self, d):
+        self.progress.record_postprocess(d)
+        if d.get('postprocessor') == 'Merger' and d.get('status') == 'started':
+            self.set_state(MERGING)
+
+    def run(self, extra_opts=None):
+        # Download stage; returns the (state, error) it ends in, DOWNLOADED when the streams still
+        # have to be merged, for the scheduler to set once the worker is free; None if it didn't run
+        with self._lock:
+            if self.paused:
+                # Paused while queued: left off the queue so it doesn't hold a worker; resume() puts it back
+                self.parked = True
+                return None
+            # A cancel that got in first has already set CANCELLED under the lock
+            if self.cancelled or not self._change(RUNNING, expect=(QUEUED,)):
+                return None
+        self.progress.updated = time.monotonic()  # Time spent queued doesn't count as a stall
+        self._changed(RUNNING)
+        from segmented import SegmentedYoutubeDL
+        timing = {}
+        try:
+            opts = self.build_opts(extra_opts)
+            archive = opts.get('download_archive')
+            known = set(archive or ())
+            with metrics.span(DOWNLOAD, job=self.id, attempt=self.attempts) as timing:
+                with SegmentedYoutubeDL(opts) as ydl:
+                    ydl.download([self.url])
+            if self.cancelled:
+                return CANCELLED, None
+            if not self.files:
+                return SKIPPED, "Already in the download archive" if known else "Nothing to download"
+            self.archive_ids = sorted(set(archive or ()) - known)
+            if self.plan and self.files:
+                self.output, args, self.method = remux(self.files, self.plan.base, self.plan.container, self.plan.audio_only)
+                if args is not None:
+                    return DOWNLOADED, None
+                os.replace(self.files[0]['filename'], self.output)
+                self.place_copies()
+            self.record_archive()
+        except Exception as e:
+            return self.failure(str(e))
+        finally:
+            self.download_seconds += timing.get('seconds', 0)
+        return DONE, None
+
+    def failure(self, error):
+        # (state, error) after a failed attempt: RETRYING while the retry policy allows another
+        if self.cancelled:
+            return CANCELLED, error
+        self.retry_delay = self.retry_policy.delay(self.attempts, error) if self.retry_policy else None
+        if self.retry_delay is None:
+            return FAILED, error
+        self.attempts += 1
+        metrics.count('retries')
+        return RETRYING, error
+
+    def merge(self):
+        # Merge stage: remuxes the downloaded streams into the planned container, copying every
+        # stream that fits and encoding only those that don't. Returns the (state, error) it ends
+        # in like run(), or None if it didn't run.
+        if not self.set_state(MERGING, expect=(DOWNLOADED,)):  # Cancelled while waiting for a merge worker
+            return None
+        error = None
+        with metrics.span(MERGE, job=self.id) as timing:
+            try:
+                error = self.remux_files()
+            except Exception as e:
+                error = str(e)
+        self.merge_seconds += timing['seconds']
+        if self.cancelled:
+            return CANCELLED, None
+        if error is not None:
+            return FAILED, error
+        metrics.count('merges', method=self.method)
+        return DONE, None
+
+    def remux_files(self):
+        # Returns None once the output is written and the inputs removed, else the error
+        self.output, args, self.method = remux(self.files, self.plan.base, self.plan.container, self.plan.audio_only)
+        error = self.run_ffmpeg(args)
+        if error is not None and not self.cancelled:
+            # Streams with unrecognised codecs were copied optimistically; encode them instead
+            output, args, method = remux(self.files, self.plan.base, self.plan.container, self.plan.audio_only, transcode=True)
+            if method != self.method:
+                self.output, self.method = output, method
+                error = self.run_ffmpeg(args)
+        if error is not None or self.cancelled:
+            return error
+        for f in self.files:
+            os.remove(f['filename'])
+        self.place_copies()
+        self.record_archive()
+        return None
+
+    def place_copies(self):
+        # The finished file is hardlinked into the plan's other folders, or copied where the
+        # filesystem can't link (another drive, FAT)
+        for folder in self.plan.copies:
+            target = os.path.join(folder, os.path.basename(self.output))
+            if os.path.exists(target):
+                continue
+            os.makedirs(folder, exist_ok=True)
+            try:
+                os.link(self.output, target)
+            except OSError:
+                shutil.copy2(self.output, target)
+
+    def run_ffmpeg(self, args):
+        # Writes self.output through a temp file; returns None on success, else ffmpeg's error
+        root, ext = os.path.splitext(self.output)
+        temp = f"{root}.temp{ext}"
+        command = [self.ydl_opts.get('ffmpeg_location') or 'ffmpeg', '-y', '-loglevel', 'error'] + args + [temp]
+        # No console window flashing up from the windowed exe on Windows
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        while True:
+            try:
+                process.wait(timeout=0.5)
+                break
+            except subprocess.TimeoutExpired:
+                if self.cancelled:
+                    process.kill()
+                    process.wait()
+                    break
+        error = process.stderr.read().decode(errors='replace').strip()
+        process.stderr.close()
+        if process.returncode or self.cancelled:
+            if os.path.exists(temp):
+                os.remove(temp)
+            return error or f"ffmpeg exited with code {process.returncode}"
+        os.replace(temp, self.output)
+        return None
+
+def read_archive(path):
+    # The lines of a yt-dlp download archive file, as yt-dlp loads them
+    try:
+        with open(path, encoding='utf-8') as f:
+            return set(line.strip() for line in f if line.strip())
+    except FileNotFoundError:
+        return set()
+
+class StageStats:
+    # Queue depth and timing of one pipeline stage, for tuning the pool sizes
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.done = 0
+        self.busy = 0.0  # Seconds spent working on items
+        self.waited = 0.0  # Seconds items spent in the queue
+
+    def snapshot(self):
+        with self.lock:
+            return {'queued': self.queued, 'active': self.active, 'done': self.done, 'avg_seconds': round(self.busy / self.done, 3) if self.done else None, 'avg_wait': round(self.waited / self.done, 3) if self.done else None}
+
+class WorkerPool:
+    # Threads pulling items off one queue into handler(item); resizable while running. Then
+    # finish(item, result) gets what the handler returned, once the item counts as done in the
+    # stats, so whoever its final state wakes sees them settled.
+    def __init__(self, name, workers, handler, finish=None):
+        self.name = name
+        self.handler = handler
+        self.finish = finish
+        self.stats = StageStats()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = 0
+        self._retire = 0
+        self.set_workers(workers)
+
+    @property
+    def workers(self):
+        return self._workers - self._retire
+
+    def set_workers(self, count):
+        count = max(1, int(count))
+        with self._lock:
+            target = self._workers - self._retire
+            if count < target:
+                self._retire += target - count
+                return
+            reuse = min(self._retire, count - target)
+            self._retire -= reuse
+            for _ in range(count - target - reuse):
+                self._workers += 1
+                threading.Thread(target=self._work, name=f"{self.name}-worker", daemon=True).start()
+
+    def put(self, item):
+        with self.stats.lock:
+            self.stats.queued += 1
+        self._queue.put((item, time.monotonic()))
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if self._retire:
+                    self._retire -= 1
+                    self._workers -= 1
+                    return
+            try:
+                item, queued_at = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            started = time.monotonic()
+            with self.stats.lock:
+                self.stats.queued -= 1
+                self.stats.active += 1
+                self.stats.waited += started - queued_at
+            try:
+                result = self.handler(item)
+            finally:
+                with self.stats.lock:
+                    self.stats.active -= 1
+                    self.stats.done += 1
+                    self.stats.busy += time.monotonic() - started
+                self._queue.task_done()
+            if self.finish is not None:
+                self.finish(item, result)
+
+class DownloadScheduler:
+    # Two-stage pipeline: download workers hand jobs whose streams still need merging to a
+    # separate merge pool, so ffmpeg on one video overlaps the download of the next
+    def __init__(self, workers=DEFAULT_WORKERS, merge_workers=DEFAULT_MERGE_WORKERS, limiter=None, retry_policy=None):
+        self.jobs = {}  # id -> submitted job, until it finishes
+        self.lock = threading.Lock()
+        self.limiter = limiter or BandwidthLimiter()  # Global bandwidth cap over all jobs
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.fragments = DEFAULT_FRAGMENTS  # Applies to jobs as they start downloading
+        self.connections = DEFAULT_CONNECTIONS  # Likewise
+        self.job_listeners = []  # Added to every submitted job, e.g. the adaptive controller's
+        self.downloads = WorkerPool("download", workers, self._download, self._downloaded)
+        self.merges = WorkerPool("merge", merge_workers, self._merge, self._settle)
+
+    @property
+    def workers(self):
+        return self.downloads.workers
+
+    def set_workers(self, count):
+        self.downloads.set_workers(count)
+
+    def set_merge_workers(self, count):
+        self.merges.set_workers(count)
+
+    def stage_stats(self):
+        return {'download': self.downloads.stats.snapshot(), 'merge': self.merges.stats.snapshot()}
+
+    def submit(self, job):
+        job.limiter = self.limiter
+        job.retry_policy = self.retry_policy
+        job.requeue = self.downloads.put
+        for callback in self.job_listeners:
+            job.add_listener(callback)
+        job.add_listener(self._forget)
+        with self.lock:
+            self.jobs[job.id] = job
+        self.downloads.put(job)
+        return job
+
+    def _forget(self, job):
+        if job.state in FINISHED_STATES:
+            with self.lock:
+                self.jobs.pop(job.id, None)
+
+    def wait(self, jobs, timeout=None):
+        for job in jobs:
+            job.finished.wait(timeout)
+
+    def active_jobs(self):
+        with self.lock:
+            return [job for job in self.jobs.values() if not job.finished.is_set()]
+
+    def cancel_all(self):
+        for job in self.active_jobs():
+            job.cancel()
+
+    def _download(self, job):
+        return job.run({'concurrent_fragment_downloads': self.fragments, 'concurrent_range_downloads': self.connections})
+
+    def _downloaded(self, job, outcome):
+        self._settle(job, outcome)
+        if job.state == DOWNLOADED:
+            self.merges.put(job)
+        elif job.state == RETRYING:
+            timer = threading.Timer(job.retry_delay, self._retry, (job,))
+            timer.daemon = True
+            timer.start()
+
+    def _settle(self, job, outcome):
+        if outcome is not None:
+            job.set_state(*outcome)
+
+    def _retry(self, job):
+        if job.set_state(QUEUED, expect=(RETRYING,)):  # Not cancelled during the backoff
+            self.downloads.put(job)
+
+    def _merge(self, job):
+        return job.merge()
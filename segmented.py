@@ -0,0 +1,237 @@
+import json
+import os
+import queue
+import threading
+import time
+import yt_dlp
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import HTTPError, RequestError
+from yt_dlp.utils import ContentTooShortError, DownloadError, parse_http_range
+from yt_dlp.utils.networking import HTTPHeaderDict
+
+MIN_RANGE_SIZE = 1024 * 1024  # Files under two of these go over a single connection
+RANGES_PER_CONNECTION = 4  # More ranges than connections, so a slow connection holds up less of the file
+BLOCK_SIZE = 64 * 1024
+PROGRESS_INTERVAL = 0.25  # Seconds between progress hooks
+RETRY_STATUSES = (408, 429)  # Plus every 5xx
+
+# Progressive (single url, non-fragmented) formats are fetched as byte ranges over several pooled
+# connections at once, since CDNs throttle each connection rather than the client. The ranges are
+# written into a preallocated .part file; "<file>.part.segments" records how far each range got,
+# so an interrupted download resumes every range where it stopped. Servers that don't answer a
+# range probe with 206 get yt-dlp's plain HTTP downloader.
+
+class SegmentedYoutubeDL(yt_dlp.YoutubeDL):
+    # YoutubeDL whose plain HTTP downloads go through SegmentedFD, with the param
+    # 'concurrent_range_downloads' connections per file; without it, or at 1, it is plain yt-dlp
+    def dl(self, name, info, subtitle=False, test=False):
+        if test or subtitle or not self.segmentable(name, info):
+            return super().dl(name, info, subtitle, test)
+        fd = SegmentedFD(self, self.params)
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        self.write_debug(f'Invoking {fd.FD_NAME} downloader on "{info["url"]}"')
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None:
+            new_info['http_headers'] = self._calc_headers(new_info)
+        return fd.download(name, new_info, subtitle)
+
+    def segmentable(self, name, info):
+        if (self.params.get('concurrent_range_downloads') or 1) < 2 or name == '-':
+            return False
+        if info.get('fragments') or info.get('is_live') or info.get('request_data') or not str(info.get('url', '')).startswith(('http://', 'https://')):
+            return False
+        # Whatever yt-dlp would not hand to its own HTTP downloader (external downloaders, ffmpeg
+        # for live or dash protocols) stays with it
+        return get_suitable_downloader(info, self.params) is HttpFD
+
+class SegmentedFD(FileDownloader):
+    def real_download(self, filename, info_dict):
+        headers = HTTPHeaderDict({'Accept-Encoding': 'identity'}, info_dict.get('http_headers'))
+        extensions = {}
+        impersonate = self._get_impersonate_target(info_dict)
+        if impersonate is not None:
+            extensions['impersonate'] = impersonate
+        size, last_modified = (None, None) if 'Range' in headers else self.probe(info_dict['url'], headers, extensions)
+        if size is None or size < 2 * MIN_RANGE_SIZE:
+            return self.single_download(filename, info_dict)
+
+        tmpfilename = self.temp_name(filename)
+        state_file = tmpfilename + '.segments'
+        ranges = self.load_state(tmpfilename, state_file, size)
+        if ranges is None:
+            ranges = self.split(size, info_dict)
+            with open(tmpfilename, 'wb') as f:
+                f.truncate(size)  # Preallocated, so every range writes at its own offset
+        resumed = sum(done for start, end, done in ranges)
+        if resumed:
+            self.report_resuming_byte(resumed)
+        self.report_destination(filename)
+
+        connections = self.params['concurrent_range_downloads']
+        ctx = RangeContext(info_dict['url'], headers, extensions, tmpfilename, ranges)
+        for piece in ranges:
+            if piece[2] < piece[1] - piece[0] + 1:
+                ctx.pending.put(piece)
+        threads = [threading.Thread(target=self.fetch_ranges, args=(ctx,), name=f"range-{index}", daemon=True) for index in range(min(connections, ctx.pending.qsize()))]
+        ctx.running = len(threads)
+        if not threads:
+            ctx.done.set()
+        for thread in threads:
+            thread.start()
+        start = time.time()
+        try:
+            while not ctx.done.wait(PROGRESS_INTERVAL):
+                self.save_state(state_file, size, ctx)
+                downloaded = ctx.downloaded()
+                # Hooks may block (pause, the bandwidth cap) or raise (cancel); the connections
+                # wait for them instead of running on unthrottled
+                ctx.gate.clear()
+                try:
+                    self._hook_progress({'status': 'downloading', 'downloaded_bytes': downloaded, 'total_bytes': size, 'tmpfilename': tmpfilename, 'filename': filename, 'eta': self.calc_eta(start, time.time(), size - resumed, downloaded - resumed), 'speed': self.calc_speed(start, time.time(), downloaded - resumed), 'elapsed': time.time() - start}, info_dict)
+                finally:
+                    ctx.gate.set()
+        finally:
+            ctx.stop.set()
+            ctx.gate.set()
+            for thread in threads:
+                thread.join()
+            self.save_state(state_file, size, ctx)
+        if ctx.error is not None:
+            raise ctx.error
+        downloaded = ctx.downloaded()
+        if downloaded != size:
+            raise ContentTooShortError(downloaded, size)
+
+        os.remove(state_file)
+        self.try_rename(tmpfilename, filename)
+        if self.params.get('updatetime') and last_modified:
+            info_dict['filetime'] = self.try_utime(filename, last_modified)
+        self._hook_progress({'downloaded_bytes': size, 'total_bytes': size, 'filename': filename, 'status': 'finished', 'elapsed': time.time() - start}, info_dict)
+        return True
+
+    def single_download(self, filename, info_dict):
+        fd = HttpFD(self.ydl, self.params)
+        fd._progress_hooks = self._progress_hooks
+        return fd.real_download(filename, info_dict)
+
+    def probe(self, url, headers, extensions):
+        # (size, Last-Modified) when the server serves byte ranges, else (None, None)
+        request = Request(url, None, HTTPHeaderDict(headers, {'Range': 'bytes=0-0'}), extensions=extensions)
+        try:
+            with self.ydl.urlopen(request) as response:
+                start, end, size = parse_http_range(response.headers.get('Content-Range'))
+                if response.status != 206 or start != 0 or not size:
+                    return None, None
+                response.read()
+                return size, response.headers.get('Last-Modified')
+        except RequestError:
+            return None, None  # Left to HttpFD and its retries
+
+    def split(self, size, info_dict):
+        # [start, end, bytes done] per range, end inclusive
+        chunk_size = self.params.get('http_chunk_size') or info_dict.get('downloader_options', {}).get('http_chunk_size')
+        connections = self.params['concurrent_range_downloads']
+        length = max(MIN_RANGE_SIZE, -(-size // (connections * RANGES_PER_CONNECTION)))
+        if chunk_size:
+            length = min(length, max(MIN_RANGE_SIZE, chunk_size))  # Sites like YouTube throttle longer requests
+        return [[start, min(start + length, size) - 1, 0] for start in range(0, size, length)]
+
+    def load_state(self, tmpfilename, state_file, size):
+        # The ranges of an earlier attempt at this file, if it can be continued
+        if not self.params.get('continuedl', True) or not os.path.isfile(tmpfilename) or os.path.getsize(tmpfilename) != size:
+            return None
+        try:
+            with open(state_file, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        ranges = state.get('ranges') if state.get('size') == size else None
+        if not ranges or ranges[0][0] != 0 or ranges[-1][1] != size - 1 or any(not 0 <= done <= end - start + 1 for start, end, done in ranges):
+            return None
+        return [list(piece) for piece in ranges]
+
+    def save_state(self, state_file, size, ctx):
+        with ctx.lock:
+            state = {'size': size, 'ranges': [list(piece) for piece in ctx.ranges]}
+        temp = state_file + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp, state_file)
+
+    def fetch_ranges(self, ctx):
+        # Connection thread: takes ranges off the queue until none are left or the download stops
+        try:
+            with open(ctx.tmpfilename, 'r+b', buffering=0) as f:
+                while not ctx.stop.is_set():
+                    try:
+                        piece = ctx.pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    self.fetch_range(ctx, piece, f)
+        except Exception as e:
+            with ctx.lock:
+                if ctx.error is None:
+                    ctx.error = e
+            ctx.stop.set()
+        finally:
+            with ctx.lock:
+                ctx.running -= 1
+                if not ctx.running:
+                    ctx.done.set()
+
+    def fetch_range(self, ctx, piece, f):
+        start, end = piece[0], piece[1]
+        retries = self.params.get('retries', 10)
+        attempt = 0
+        while piece[2] < end - start + 1 and not ctx.stop.is_set():
+            position = start + piece[2]
+            request = Request(ctx.url, None, HTTPHeaderDict(ctx.headers, {'Range': f'bytes={position}-{end}'}), extensions=ctx.extensions)
+            try:
+                with self.ydl.urlopen(request) as response:
+                    if response.status != 206 or parse_http_range(response.headers.get('Content-Range'))[0] != position:
+                        raise DownloadError(f"Server ignored the range request for bytes {position}-{end}")
+                    f.seek(position)
+                    while not ctx.stop.is_set():
+                        ctx.gate.wait()
+                        block = response.read(min(BLOCK_SIZE, end - start + 1 - piece[2]))
+                        if not block:
+                            break
+                        f.write(block)  # Unbuffered, so the saved state never runs ahead of the file
+                        with ctx.lock:
+                            piece[2] += len(block)
+                        attempt = 0
+                if piece[2] < end - start + 1 and not ctx.stop.is_set():
+                    raise ContentTooShortError(start + piece[2], end + 1)
+            except (RequestError, ContentTooShortError) as e:
+                if isinstance(e, HTTPError) and e.status < 500 and e.status not in RETRY_STATUSES:
+                    raise
+                attempt += 1
+                if attempt > retries:
+                    raise
+                self.to_screen(f"[download] Got error: {e}. Retrying bytes {start + piece[2]}-{end} ({attempt}/{retries})...")
+                ctx.stop.wait(min(2 ** (attempt - 1), 10))
+
+class RangeContext:
+    # State shared by one file's connection threads; piece[2] is only changed under lock
+    def __init__(self, url, headers, extensions, tmpfilename, ranges):
+        self.url = url
+        self.headers = headers
+        self.extensions = extensions
+        self.tmpfilename = tmpfilename
+        self.ranges = ranges
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.gate = threading.Event()  # Cleared while the progress hooks run
+        self.gate.set()
+        self.stop = threading.Event()
+        self.done = threading.Event()  # Set when the last connection thread exits
+        self.running = 0
+        self.error = None
+
+    def downloaded(self):
+        with self.lock:
+            return sum(piece[2] for piece in self.ranges)
@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Imported first by each front end, so marks count from the interpreter reaching the app code
+START = time.perf_counter()
+LOG_PATH = os.path.join(os.path.expanduser("~"), ".cache", "youtube-downloader", "startup.jsonl")
+
+class StartupTimer:
+    # Records milliseconds since START for named steps (imports, window, first_paint, warm_up)
+    # and appends one JSON line per launch to LOG_PATH once every expected step is in.
+    # Set YTD_STARTUP_TIMING=1 to also print the report to stderr.
+    def __init__(self, app, expected=('imports', 'window', 'first_paint', 'warm_up')):
+        self.app = app
+        self.expected = expected
+        self.marks = {}
+        self.lock = threading.Lock()
+        self.reported = False
+
+    def mark(self, step):
+        with self.lock:
+            self.marks.setdefault(step, round((time.perf_counter() - START) * 1000, 1))
+            if self.reported or not all(name in self.marks for name in self.expected):
+                return
+            self.reported = True
+        self.report()
+
+    def report(self, path=LOG_PATH):
+        entry = {'app': self.app, 'time': round(time.time()), 'frozen': getattr(sys, 'frozen', False), 'ms': self.marks}
+        line = json.dumps(entry)
+        if os.environ.get('YTD_STARTUP_TIMING') and sys.stderr:  # No stderr in the windowed exe
+            print(line, file=sys.stderr)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+def warm_up_in_background(timer, *steps):
+    # Runs the given warm-up callables off the UI thread, then marks 'warm_up'
+    def run():
+        for step in steps:
+            try:
+                step()
+            except Exception:
+                pass
+        timer.mark('warm_up')
+    threading.Thread(target=run, daemon=True).start()
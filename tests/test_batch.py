@@ -0,0 +1,32 @@
+from batch import merge_sources, parse_urls
+
+def test_parse_urls():
+    text = "https://a/1 https://a/2\n# https://a/skipped\n\n  https://a/3\nhttps://a/1\n"
+    assert parse_urls(text) == ['https://a/1', 'https://a/2', 'https://a/3']
+
+def entry(video_id, title):
+    return {'id': video_id, 'title': title, 'ie_key': 'Youtube', 'url': f"https://www.youtube.com/watch?v={video_id}"}
+
+def test_videos_shared_by_playlists_are_one_record():
+    sources = [
+        ('https://p/1', {'title': 'One', 'entries': [entry('a', 'A'), entry('b', 'B')]}, None),
+        ('https://p/2', {'title': 'Two', 'entries': [entry('b', 'B'), entry('c', 'C')]}, None),
+        ('https://p/3', None, "HTTP Error 404"),
+    ]
+    records, skipped = merge_sources(sources)
+    assert [(record.id, record.playlists) for record in records] == [('a', ('One',)), ('b', ('One', 'Two')), ('c', ('Two',))]
+    assert skipped == []
+
+def test_video_url_next_to_its_playlist():
+    formats = [{'format_id': '18', 'ext': 'mp4', 'height': 360, 'vcodec': 'avc1', 'acodec': 'mp4a'}]
+    video = dict(entry('b', 'B'), formats=formats, extractor_key='Youtube')
+    records, skipped = merge_sources([('https://p/1', {'title': 'One', 'entries': [entry('b', 'B')]}, None), ('https://v/b', video, None)])
+    assert len(records) == 1
+    assert records[0].playlists == ('One', None)
+    assert records[0].qualities == [360]
+
+def test_skipped_entries():
+    sources = [('https://p/1', {'title': 'One', 'entries': [entry('a', 'A'), entry('b', 'B')]}, None)]
+    records, skipped = merge_sources(sources, lambda e: e['id'] == 'a')
+    assert [record.id for record in records] == ['b']
+    assert skipped == [('https://p/1', 'A')]
@@ -0,0 +1,44 @@
+from containers import codec_family, remux
+
+def stream(filename, vcodec, acodec):
+    return {'filename': filename, 'vcodec': vcodec, 'acodec': acodec, 'ext': filename.rsplit('.', 1)[1]}
+
+def test_codec_families():
+    assert codec_family('avc1.640028') == 'h264'
+    assert codec_family('mp4a.40.2') == 'aac'
+    assert codec_family('none') == 'none'
+    assert codec_family('prores') is None
+    assert codec_family(None) is None
+
+def test_single_fitting_file_is_renamed():
+    assert remux([stream('a.f18.mp4', 'avc1.42001E', 'mp4a.40.2')], 'out', 'mp4') == ('out.mp4', None, 'rename')
+
+def test_single_file_in_another_container_is_copied():
+    output, args, method = remux([stream('a.f18.mp4', 'avc1.42001E', 'mp4a.40.2')], 'out', 'mkv')
+    assert (output, method) == ('out.mkv', 'copy')
+    assert args[-4:] == ['-c:v', 'copy', '-c:a', 'copy']
+
+def test_separate_streams_are_merged_by_copy():
+    output, args, method = remux([stream('a.f137.mp4', 'avc1.640028', 'none'), stream('a.f251.webm', 'none', 'opus')], 'out', 'mp4')
+    assert (output, method) == ('out.mp4', 'copy')
+    assert args == ['-i', 'a.f137.mp4', '-i', 'a.f251.webm', '-map', '0:v?', '-map', '0:a?', '-map', '1:v?', '-map', '1:a?', '-c:v', 'copy', '-c:a', 'copy']
+
+def test_only_the_stream_that_does_not_fit_is_encoded():
+    video, audio = stream('a.f137.mp4', 'avc1.640028', 'none'), stream('a.f140.m4a', 'none', 'mp4a.40.2')
+    assert remux([video, audio], 'out', 'webm')[1:] == (['-i', 'a.f137.mp4', '-i', 'a.f140.m4a', '-map', '0:v?', '-map', '0:a?', '-map', '1:v?', '-map', '1:a?', '-c:v', 'libvpx-vp9', '-c:a', 'libopus'], 'transcode')
+    assert remux([stream('a.f248.webm', 'vp9', 'none'), audio], 'out', 'webm')[2] == 'transcode audio'
+    assert remux([stream('a.f43.webm', 'vp8', 'none'), audio], 'out', 'mp4')[2] == 'transcode video'
+
+def test_unknown_codecs_are_copied_until_transcode_is_asked_for():
+    streams = [stream('a.f1.mov', 'prores', 'none'), stream('a.f2.m4a', 'none', 'mp4a.40.2')]
+    assert remux(streams, 'out', 'mp4')[2] == 'copy'
+    assert remux(streams, 'out', 'mp4', transcode=True)[2] == 'transcode video'
+    assert remux(streams, 'out', 'mkv', transcode=True)[2] == 'copy'  # mkv takes anything
+
+def test_audio_only():
+    assert remux([stream('a.f140.m4a', 'none', 'mp4a.40.2')], 'out', 'mp4', audio_only=True) == ('out.m4a', None, 'rename')
+    output, args, method = remux([stream('a.f251.webm', 'none', 'opus')], 'out', 'mp4', audio_only=True)
+    assert (output, method) == ('out.opus', 'copy')
+    assert args == ['-i', 'a.f251.webm', '-map', '0:a:0', '-vn', '-c:a', 'copy']
+    assert remux([stream('a.f18.mp4', 'avc1.42001E', 'mp4a.40.2')], 'out', 'mp4', audio_only=True)[::2] == ('out.m4a', 'copy')
+    assert remux([stream('a.f9.mka', 'none', 'pcm_s16le')], 'out', 'mp4', audio_only=True, transcode=True)[::2] == ('out.m4a', 'transcode audio')
@@ -0,0 +1,54 @@
+from formats import OutputPlan, select_streams
+
+FORMATS = [
+    {'format_id': '18', 'ext': 'mp4', 'height': 360, 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2'},
+    {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2'},
+    {'format_id': '251', 'ext': 'webm', 'vcodec': 'none', 'acodec': 'opus'},
+    {'format_id': '136', 'ext': 'mp4', 'height': 720, 'vcodec': 'avc1.4d401f', 'acodec': 'none'},
+    {'format_id': '247', 'ext': 'webm', 'height': 720, 'vcodec': 'vp9', 'acodec': 'none'},
+    {'format_id': '137', 'ext': 'mp4', 'height': 1080, 'vcodec': 'avc1.640028', 'acodec': 'none'},
+    {'format_id': '248', 'ext': 'webm', 'height': 1080, 'vcodec': 'vp9', 'acodec': 'none'},
+]
+
+def ids(streams):
+    return [f['format_id'] for f in streams]
+
+def test_best_height_within_quality():
+    assert ids(select_streams(FORMATS, '720', 'mkv')) == ['247', '251']
+    assert ids(select_streams(FORMATS, '1080', 'mkv')) == ['248', '251']
+    assert ids(select_streams(FORMATS, 'N/A', 'mkv')) == ['248', '251']
+
+def test_prefers_streams_that_copy_into_the_container():
+    formats = [
+        {'format_id': 'opus', 'ext': 'webm', 'vcodec': 'none', 'acodec': 'opus'},
+        {'format_id': 'aac', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2'},
+        {'format_id': 'vp9', 'ext': 'webm', 'height': 1080, 'vcodec': 'vp9', 'acodec': 'none'},
+        {'format_id': 'avc', 'ext': 'mp4', 'height': 1080, 'vcodec': 'avc1.640028', 'acodec': 'none'},
+    ]
+    assert ids(select_streams(formats, '1080', 'webm')) == ['vp9', 'opus']
+    assert ids(select_streams(formats, '1080', 'mp4')) == ['avc', 'aac']
+    assert ids(select_streams(formats, '1080', 'mkv')) == ['avc', 'aac']
+
+def test_audio_only_takes_the_best_audio():
+    assert ids(select_streams(FORMATS, '1080', 'mp4', audio_only=True)) == ['251']
+    assert ids(select_streams(FORMATS[:1], '1080', 'mp4', audio_only=True)) == ['18']
+
+def test_muxed_formats_without_separate_streams():
+    formats = [{'format_id': 'low', 'ext': 'mp4', 'height': 360}, {'format_id': 'high', 'ext': 'mp4', 'height': 1080}]
+    assert ids(select_streams(formats, '720', 'mp4')) == ['low']
+    assert ids(select_streams(formats, '240', 'mp4')) == ['high']  # Nothing is low enough: the best there is
+    assert ids(select_streams([{'format_id': 'direct', 'ext': 'mp4'}], '720', 'mp4')) == ['direct']
+
+def test_video_only_formats_without_audio():
+    formats = [f for f in FORMATS if f['format_id'] in ('136', '137')]
+    assert ids(select_streams(formats, '1080', 'mp4')) == ['137']
+
+def test_plan_is_a_format_selector():
+    plan = OutputPlan('/videos/Title', 'webm', '720')
+    assert ids(plan({'formats': FORMATS})) == ['247', '251']
+
+def test_plan_container_and_round_trip():
+    assert OutputPlan('/videos/Title', '3gp').container == 'mkv'
+    plan = OutputPlan('/videos/Title', 'mp4', '1080', True, ['/playlists/A'])
+    copy = OutputPlan.from_dict(plan.to_dict())
+    assert copy.to_dict() == plan.to_dict() == {'base': '/videos/Title', 'extension': 'mp4', 'quality': '1080', 'audio_only': True, 'copies': ['/playlists/A']}
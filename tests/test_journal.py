@@ -0,0 +1,42 @@
+from journal import JobJournal
+from scheduler import DownloadJob, DONE
+
+def submit(journal, url):
+    job = DownloadJob(url, {'outtmpl': f"/videos/{url.rsplit('/', 1)[1]}.%(ext)s"})
+    journal.record(job)
+    return job
+
+def stop(journal):
+    # As if the process died: its heartbeat is long past
+    with journal.lock:
+        journal.db.execute("UPDATE sessions SET heartbeat = 0 WHERE session = ?", (journal.session,))
+        journal.db.commit()
+
+def test_live_sessions_keep_their_jobs(tmp_path):
+    first = JobJournal(str(tmp_path / "jobs.sqlite3"))
+    job = submit(first, "https://v/a")
+    second = JobJournal(str(tmp_path / "jobs.sqlite3"))
+    assert second.unfinished() == []
+    assert not second.claim(job.journal_id)
+    second.discard_unfinished()
+    stop(first)
+    assert [row[:3] for row in second.unfinished()] == [(job.journal_id, "https://v/a", "https://v/a")]
+
+def test_dead_session_jobs_are_claimed_once(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = JobJournal(path)
+    job = submit(first, "https://v/a")
+    stop(first)
+    second, third = JobJournal(path), JobJournal(path)
+    assert second.claim(job.journal_id)
+    assert not third.claim(job.journal_id)  # Owned by a live session again
+    assert third.unfinished() == []
+
+def test_finished_jobs_are_not_resumed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = JobJournal(path)
+    done = submit(first, "https://v/a")
+    left = submit(first, "https://v/b")
+    done.set_state(DONE)
+    stop(first)
+    assert [row[0] for row in JobJournal(path).unfinished()] == [left.journal_id]
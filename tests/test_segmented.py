@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from segmented import MIN_RANGE_SIZE, RangeContext, SegmentedFD, SegmentedYoutubeDL
+
+MiB = 1024 * 1024
+
+def downloader(**params):
+    ydl = SegmentedYoutubeDL(dict({'quiet': True, 'noprogress': True, 'concurrent_range_downloads': 4}, **params))
+    return SegmentedFD(ydl, ydl.params)
+
+def test_split_covers_the_file():
+    ranges = downloader().split(40 * MiB + 3, {})
+    assert len(ranges) == 16  # 4 per connection
+    assert ranges[-1][1] - ranges[-1][0] < ranges[0][1] - ranges[0][0]  # The odd bytes come off the last one
+    assert ranges[0][0] == 0 and ranges[-1][1] == 40 * MiB + 2
+    assert all(a[1] + 1 == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert all(done == 0 for start, end, done in ranges)
+
+def test_split_sizes():
+    assert len(downloader().split(3 * MiB, {})) == 3  # Ranges are at least MIN_RANGE_SIZE
+    ranges = downloader().split(40 * MiB, {'downloader_options': {'http_chunk_size': 2 * MiB}})
+    assert {end - start + 1 for start, end, done in ranges} == {2 * MiB}
+    assert downloader(http_chunk_size=1024).split(4 * MiB, {})[0][1] == MIN_RANGE_SIZE - 1
+
+def save(fd, tmp_path, size, ranges):
+    part = str(tmp_path / "video.mp4.part")
+    with open(part, 'wb') as f:
+        f.truncate(size)
+    ctx = RangeContext('http://x', {}, {}, part, ranges)
+    fd.save_state(part + '.segments', size, ctx)
+    return part
+
+def test_state_round_trip(tmp_path):
+    fd = downloader()
+    ranges = [[0, MiB - 1, MiB], [MiB, 2 * MiB - 1, 1000], [2 * MiB, 3 * MiB - 1, 0]]
+    part = save(fd, tmp_path, 3 * MiB, ranges)
+    assert fd.load_state(part, part + '.segments', 3 * MiB) == ranges
+    assert downloader(continuedl=False).load_state(part, part + '.segments', 3 * MiB) is None
+    assert fd.load_state(part, part + '.segments', 4 * MiB) is None  # The file changed on the server
+
+@pytest.mark.parametrize('ranges', [
+    [[0, MiB - 1, 0], [MiB, 3 * MiB - 2, 0]],  # Doesn't reach the end
+    [[1, 3 * MiB - 1, 0]],  # Doesn't start at 0
+    [[0, 3 * MiB - 1, 3 * MiB + 1]],  # More done than the range holds
+])
+def test_unusable_state(tmp_path, ranges):
+    fd = downloader()
+    part = save(fd, tmp_path, 3 * MiB, ranges)
+    assert fd.load_state(part, part + '.segments', 3 * MiB) is None
+
+def test_corrupt_state(tmp_path):
+    fd = downloader()
+    part = save(fd, tmp_path, 3 * MiB, [[0, 3 * MiB - 1, 0]])
+    with open(part + '.segments', 'w') as f:
+        f.write('{"size": ')
+    assert fd.load_state(part, part + '.segments', 3 * MiB) is None
+
+class RangeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, data):
+        super().__init__(('127.0.0.1', 0), RangeHandler)
+        self.data = data
+        self.served = 0
+        self.lock = threading.Lock()
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        data = self.server.data
+        start, end = self.headers['Range'][6:].split('-')
+        start, end = int(start), min(int(end or len(data) - 1), len(data) - 1)
+        with self.server.lock:
+            self.server.served += end - start + 1
+        self.send_response(206)
+        self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start:end + 1])
+
+@pytest.fixture
+def server():
+    server = RangeServer(os.urandom(8 * MiB))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def download(server, filename):
+    info = {'id': 'x', 'url': f"http://127.0.0.1:{server.server_address[1]}/video.mp4", 'ext': 'mp4', 'protocol': 'http', 'http_headers': {}}
+    with SegmentedYoutubeDL({'quiet': True, 'noprogress': True, 'concurrent_range_downloads': 4}) as ydl:
+        assert ydl.segmentable(filename, info)
+        return ydl.dl(filename, info)
+
+def test_download(server, tmp_path):
+    filename = str(tmp_path / "video.mp4")
+    assert download(server, filename)
+    with open(filename, 'rb') as f:
+        assert hashlib.md5(f.read()).digest() == hashlib.md5(server.data).digest()
+    assert not os.path.exists(filename + '.part.segments')
+    assert server.served == len(server.data) + 1  # Plus the probe's first byte
+
+def test_resume_fetches_only_what_is_missing(server, tmp_path):
+    filename = str(tmp_path / "video.mp4")
+    size = len(server.data)
+    half = size // 2
+    # An earlier attempt got the first half of the file, and a quarter of the second
+    ranges = [[0, half - 1, half], [half, size - 1, half // 2]]
+    part = filename + '.part'
+    with open(part, 'wb') as f:
+        f.truncate(size)
+        f.write(server.data[:half])
+        f.seek(half)
+        f.write(server.data[half:half + half // 2])
+    with open(part + '.segments', 'w') as f:
+        json.dump({'size': size, 'ranges': ranges}, f)
+    assert download(server, filename)
+    with open(filename, 'rb') as f:
+        assert f.read() == server.data
+    assert server.served == size - half - half // 2 + 1
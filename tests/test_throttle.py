@@ -0,0 +1,27 @@
+import pytest
+from throttle import RetryPolicy, is_throttled, is_transient, parse_rate
+
+def test_parse_rate():
+    assert parse_rate("500K") == 500 * 1024
+    assert parse_rate("2.5M") == int(2.5 * 1024 * 1024)
+    assert parse_rate("1GiB") == 1024 ** 3
+    assert parse_rate("4096") == 4096
+    assert parse_rate("") is None
+    assert parse_rate("0") is None
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+def test_transient_errors():
+    assert is_transient("ERROR: unable to download video data: HTTP Error 429: Too Many Requests")
+    assert is_transient("The read operation timed out")
+    assert not is_transient("ERROR: Video unavailable")
+    assert is_throttled("HTTP Error 403: Forbidden")
+    assert not is_throttled("HTTP Error 503: Service Unavailable")
+
+def test_retry_policy():
+    policy = RetryPolicy(attempts=3, base=2.0, cap=5.0)
+    error = "HTTP Error 503: Service Unavailable"
+    for attempt, full in ((0, 2.0), (1, 4.0), (2, 5.0)):
+        assert full * 0.5 <= policy.delay(attempt, error) <= full * 1.5
+    assert policy.delay(3, error) is None
+    assert policy.delay(0, "ERROR: Video unavailable") is None
@@ -0,0 +1,66 @@
+import random
+import re
+import threading
+import time
+
+# Failures worth another attempt: throttling, server errors and dropped connections
+TRANSIENT_ERRORS = re.compile(r"HTTP Error (403|408|429|5\d\d)|timed out|timeout|Connection (reset|aborted|refused)|Remote end closed|IncompleteRead|Temporary failure|EOF occurred", re.I)
+# The server telling us to slow down
+THROTTLE_ERRORS = re.compile(r"HTTP Error (403|429)", re.I)
+
+def is_transient(error):
+    return bool(error and TRANSIENT_ERRORS.search(error))
+
+def is_throttled(error):
+    return bool(error and THROTTLE_ERRORS.search(error))
+
+class RetryPolicy:
+    # Exponential backoff with full jitter on top of yt-dlp's own per-request retries
+    def __init__(self, attempts=4, base=2.0, cap=60.0):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt, error):
+        # Seconds to wait before retry number attempt + 1, or None to give up
+        if attempt >= self.attempts or not is_transient(error):
+            return None
+        return min(self.cap, self.base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+class BandwidthLimiter:
+    # Token bucket shared by every job; jobs feed it the bytes each progress hook call reports
+    # and sleep in the hook when over budget, which holds back yt-dlp's read loop
+    def __init__(self, rate=None):
+        self.lock = threading.Lock()
+        self.rate = None
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        # Bytes per second, None or 0 for no limit; up to one second's worth may burst
+        with self.lock:
+            self.rate = rate or None
+            self.tokens = float(rate or 0)
+            self.updated = time.monotonic()
+
+    def consume(self, size):
+        if not self.rate or size <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate) - size
+            self.updated = now
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+def parse_rate(text):
+    # "500K", "2.5M", "1G" or plain bytes per second; None for empty or "0"
+    if not text:
+        return None
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?)i?B?\s*", text, re.I)
+    if not match:
+        raise ValueError(f"Invalid rate: {text}")
+    rate = float(match.group(1)) * {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[match.group(2).upper()]
+    return int(rate) or None
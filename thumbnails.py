@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from metrics import metrics, THUMBNAIL_FETCH, THUMBNAIL_DECODE
+
+THUMBNAIL_SIZE = (100, 100)
+THUMBNAIL_WORKERS = 6
+MEMORY_CACHE_SIZE = 300  # Decoded 100x100 images kept ready for display
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "youtube-downloader", "thumbnails")
+
+class ThumbnailService:
+    def __init__(self, cache_dir=CACHE_DIR, workers=THUMBNAIL_WORKERS, memory_size=MEMORY_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.pending = {}  # key -> callbacks waiting on the same thumbnail
+        self.lock = threading.Lock()
+        self._placeholder = None
+        self._session = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def placeholder(self):
+        if self._placeholder is None:
+            from PIL import Image
+            self._placeholder = Image.new("RGB", (THUMBNAIL_SIZE[0], THUMBNAIL_SIZE[0] * 9 // 16), "#1f1f1f")
+        return self._placeholder
+
+    @property
+    def session(self):
+        # One pooled session shared by all workers so connections to the image host are reused;
+        # requests is only imported once the first thumbnail has to be downloaded
+        with self.lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            return self._session
+
+    def warm_up(self):
+        self.placeholder
+        self.session
+
+    def cache_key(self, video_id, url):
+        if video_id:
+            return re.sub(r'[^\w-]', '_', video_id)
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def get(self, video_id, url, callback):
+        # callback(image) gets a ready 100x100 PIL image, or None on failure.
+        # It runs on the calling thread for memory hits and on a worker thread otherwise.
+        key = self.cache_key(video_id, url)
+        with self.lock:
+            image = self.memory.get(key)
+            if image is not None:
+                self.memory.move_to_end(key)
+                metrics.count('thumbnails', source='memory')
+            elif key in self.pending:
+                self.pending[key].append(callback)
+                return
+            else:
+                self.pending[key] = [callback]
+                self.executor.submit(self._load, key, url)
+                return
+        callback(image)
+
+    def _load(self, key, url):
+        try:
+            image = self._read_disk(key) or self._fetch(key, url)
+        except Exception:
+            image = None
+        with self.lock:
+            callbacks = self.pending.pop(key, [])
+            if image is not None:
+                self.memory[key] = image
+                while len(self.memory) > self.memory_size:
+                    self.memory.popitem(last=False)
+        for callback in callbacks:
+            callback(image)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            image = self.decode(path)
+        except Exception:
+            # Unreadable (e.g. left truncated by an older version); dropped so it is fetched again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        metrics.count('thumbnails', source='disk')
+        return image
+
+    def _fetch(self, key, url):
+        with metrics.span(THUMBNAIL_FETCH):
+            response = self.session.get(url, timeout=10)
+            response.raise_for_status()
+        metrics.count('thumbnails', source='network')
+        metrics.count('thumbnail_bytes', len(response.content))
+        image = self.decode(BytesIO(response.content))
+        # Cache the already-shrunk image, so later runs skip both the download and the full decode.
+        # It is written under a temp name and renamed, so a reader never sees half a file.
+        path = self._disk_path(key)
+        temp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            image.save(temp, "JPEG", quality=85)
+            os.replace(temp, path)
+        except OSError:
+            if os.path.exists(temp):
+                os.remove(temp)
+        return image
+
+    def decode(self, source):
+        from PIL import Image
+        with metrics.span(THUMBNAIL_DECODE):
+            image = Image.open(source)
+            # For JPEGs draft mode lets libjpeg scale down while decoding instead of after
+            image.draft("RGB", THUMBNAIL_SIZE)
+            image = image.convert("RGB")
+            image.thumbnail(THUMBNAIL_SIZE)
+        return image
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._session is not None:
+            self._session.close()
@@ -0,0 +1,102 @@
+import os
+import tkinter as tk
+import customtkinter as ctk
+from tkinter import filedialog, messagebox
+from batch import parse_urls, read_url_file
+
+class UrlQueueWindow(ctk.CTkToplevel):
+    # Many video and playlist urls for one fetch: pasted, loaded from text files or, with the
+    # optional tkinterdnd2 package, dropped onto the window as files or links
+    def __init__(self, master, on_fetch, urls=(), *args, **kwargs):
+        super().__init__(master, *args, **kwargs)
+        self.title("URL List")
+        self.geometry("640x420")
+        self.configure(fg_color="black")
+        self.on_fetch = on_fetch
+        self.create_widgets()
+        self.add_urls(urls)
+        self.enable_drop()
+
+    def create_widgets(self):
+        self.hint_label = ctk.CTkLabel(self, text="One video or playlist url per line, '#' lines are skipped.", font=("Helvetica", 12))
+        self.hint_label.grid(row=0, column=0, columnspan=4, padx=10, pady=(10, 2), sticky="w")
+        self.urls_text = ctk.CTkTextbox(self, font=("Courier", 11), wrap="none")
+        self.urls_text.grid(row=1, column=0, columnspan=4, padx=10, pady=5, sticky="nsew")
+        self.urls_text.bind("<KeyRelease>", lambda event: self.update_count())
+
+        self.load_button = ctk.CTkButton(self, text="Load File...", command=self.load_file, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
+        self.load_button.grid(row=2, column=0, padx=10, pady=10, sticky="w")
+        self.clear_button = ctk.CTkButton(self, text="Clear", command=self.clear, font=("Helvetica", 12), fg_color="#F93131", hover_color="#F97A7A")
+        self.clear_button.grid(row=2, column=1, padx=10, pady=10, sticky="w")
+        self.count_label = ctk.CTkLabel(self, text="", font=("Helvetica", 10), text_color="green")
+        self.count_label.grid(row=2, column=2, padx=10, pady=10, sticky="w")
+        self.fetch_button = ctk.CTkButton(self, text="Fetch Formats", command=self.fetch, font=("Helvetica", 12), fg_color="#3192F9", hover_color="lightblue")
+        self.fetch_button.grid(row=2, column=3, padx=10, pady=10, sticky="e")
+
+        self.rowconfigure(1, weight=1)
+        self.columnconfigure(2, weight=1)
+
+    def enable_drop(self):
+        try:
+            from tkinterdnd2 import TkinterDnD, DND_FILES, DND_TEXT
+            TkinterDnD._require(self)  # Loads tkdnd into the running Tk; also adds the dnd methods to every widget
+        except (ImportError, RuntimeError, tk.TclError):
+            return
+        self.drop_target_register(DND_FILES, DND_TEXT)
+        self.dnd_bind('<<Drop>>', self.on_drop)
+        self.hint_label.configure(text="One video or playlist url per line, or drop url files and links here.")
+
+    def on_drop(self, event):
+        # Files are read as url lists; anything else is taken as dropped link text
+        try:
+            items = self.tk.splitlist(event.data)
+        except tk.TclError:
+            items = []
+        if items and all(os.path.isfile(item) for item in items):
+            urls = []
+            for path in items:
+                urls += self.read_file(path)
+        else:
+            urls = parse_urls(event.data)
+        self.add_urls(urls)
+        return event.action
+
+    def read_file(self, path):
+        try:
+            return read_url_file(path)
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Error", f"Failed to read {path}: {e}", parent=self)
+            return []
+
+    def load_file(self):
+        paths = filedialog.askopenfilenames(parent=self, title="Load urls", filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        for path in paths:
+            self.add_urls(self.read_file(path))
+
+    def urls(self):
+        return parse_urls(self.urls_text.get("1.0", "end"))
+
+    def add_urls(self, urls):
+        # Appends the urls not in the list yet
+        known = set(self.urls())
+        new = [url for url in dict.fromkeys(urls) if url not in known]
+        if new:
+            text = self.urls_text.get("1.0", "end-1c")
+            self.urls_text.insert("end", ("\n" if text and not text.endswith("\n") else "") + "\n".join(new) + "\n")
+        self.update_count()
+
+    def update_count(self):
+        count = len(self.urls())
+        self.count_label.configure(text=f"{count} url{'' if count == 1 else 's'}")
+
+    def clear(self):
+        self.urls_text.delete("1.0", "end")
+        self.update_count()
+
+    def fetch(self):
+        urls = self.urls()
+        if not urls:
+            messagebox.showwarning("Warning", "Please enter a URL.", parent=self)
+            return
+        self.on_fetch(urls)
+        self.destroy()
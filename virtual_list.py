@@ -0,0 +1,80 @@
+import customtkinter as ctk
+
+class VirtualList(ctk.CTkFrame):
+    # Scrollable list over a plain list of row models. Only enough row widgets to
+    # cover the viewport are ever created; they are rebound as the view scrolls.
+    def __init__(self, master, row_factory, row_height, *args, **kwargs):
+        super().__init__(master, *args, **kwargs)
+        self.row_factory = row_factory  # row_factory(parent) -> widget with .row and .bind_row(row)
+        self.row_height = row_height
+        self.rows = []
+        self.pool = []  # (widget, canvas window id)
+
+        self.canvas = ctk.CTkCanvas(self, bg="black", highlightthickness=0, yscrollincrement=row_height // 4)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview)
+        self.canvas.configure(yscrollcommand=self.on_view_changed)
+        self.canvas.bind("<Configure>", lambda e: self.layout())
+
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+
+    def set_rows(self, rows):
+        self.rows = rows
+        for widget, item in self.pool:
+            widget.row = None
+        self.canvas.configure(scrollregion=(0, 0, 0, len(rows) * self.row_height))
+        self.canvas.yview_moveto(0)
+        self.layout()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+
+    def yview_scroll(self, number, what):
+        self.canvas.yview_scroll(number, what)
+
+    def on_view_changed(self, first, last):
+        self.scrollbar.set(first, last)
+        self.layout()
+
+    def visible_range(self):
+        top = int(self.canvas.canvasy(0))
+        first = max(0, top // self.row_height)
+        count = self.canvas.winfo_height() // self.row_height + 2
+        return first, min(len(self.rows), first + count)
+
+    def layout(self):
+        first, last = self.visible_range()
+        width = self.canvas.winfo_width()
+        while len(self.pool) < last - first:
+            widget = self.row_factory(self.canvas)
+            item = self.canvas.create_window(0, 0, window=widget, anchor="nw", height=self.row_height, state="hidden")
+            self.pool.append((widget, item))
+            widget.row = None
+
+        # Row i always lands in pool slot i % len(pool), so scrolling by one row rebinds one widget
+        used = set()
+        for index in range(first, last):
+            slot = index % len(self.pool)
+            widget, item = self.pool[slot]
+            used.add(slot)
+            self.canvas.coords(item, 0, index * self.row_height)
+            self.canvas.itemconfigure(item, width=width, state="normal")
+            if widget.row is not self.rows[index]:
+                widget.bind_row(self.rows[index])
+        for slot, (widget, item) in enumerate(self.pool):
+            if slot not in used:
+                self.canvas.itemconfigure(item, state="hidden")
+
+    def visible_widgets(self):
+        return [widget for widget, item in self.pool if widget.row is not None and self.canvas.itemcget(item, "state") != "hidden"]
+
+    def refresh(self):
+        for widget in self.visible_widgets():
+            widget.refresh()
+
+    def refresh_row(self, row):
+        for widget in self.visible_widgets():
+            if widget.row is row:
+                widget.refresh()
@@ -1,8 +1,10 @@
+from startup import StartupTimer, warm_up_in_background
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
-import yt_dlp as youtube_dl
-import imageio_ffmpeg as ffmpeg
+from engine import DownloadEngine, warm_up
+from formats import output_extensions
+from scheduler import DEFAULT_WORKERS, FAILED
 
 class VideoComponent(tk.Frame):
     def __init__(self, master, video_info, *args, **kwargs):
@@ -28,11 +30,19 @@ class VideoComponent(tk.Frame):
         tk.Label(self, text=self.video_info['title']).grid(row=0, column=2, padx=10, pady=5)
 
 class YouTubeDownloader(tk.Tk):
-    def __init__(self):
+    def __init__(self, startup_timer=None):
         super().__init__()
         self.title("YouTube Video Downloader")
         self.geometry("800x600")  # Make the window wider
+        self.engine = DownloadEngine(DEFAULT_WORKERS)
+        self.startup_timer = startup_timer or StartupTimer("youtube_dl")
         self.create_widgets()
+        self.startup_timer.mark('window')
+        self.after_idle(self.on_first_paint)
+
+    def on_first_paint(self):
+        self.startup_timer.mark('first_paint')
+        warm_up_in_background(self.startup_timer, warm_up)
 
     def create_widgets(self):
         tk.Label(self, text="YouTube URL:").grid(row=0, column=0, padx=10, pady=10)
@@ -67,17 +77,19 @@ class YouTubeDownloader(tk.Tk):
         self.progress.grid(row=4, column=0, columnspan=2, pady=10)
 
     def fetch_formats(self, url):
+        import yt_dlp as youtube_dl
         ydl_opts = {'quiet': True}
         with youtube_dl.YoutubeDL(ydl_opts) as ydl:
             info_dict = ydl.extract_info(url, download=False)
             formats = info_dict.get('formats', [])
             video_qualities = sorted(set(f['height'] for f in formats if f.get('height')), reverse=True)
-            extensions = sorted(set(f['ext'] for f in formats if f.get('ext')))
+            extensions = output_extensions(formats)
             return video_qualities, extensions, info_dict
 
     def update_dropdowns(self, event=None):
         url = self.url_entry.get()
         if url:
+            import yt_dlp as youtube_dl
             ydl_opts = {'quiet': True}
             with youtube_dl.YoutubeDL(ydl_opts) as ydl:
                 info_dict = ydl.extract_info(url, download=False)
@@ -87,22 +99,24 @@ class YouTubeDownloader(tk.Tk):
                     for index, entry in enumerate(info_dict['entries']):
                         entry_formats = entry.get('formats', [])
                         video_qualities = sorted(set(f['height'] for f in entry_formats if f.get('height')), reverse=True)
-                        extensions = sorted(set(f['ext'] for f in entry_formats if f.get('ext')))
+                        extensions = output_extensions(entry_formats)
                         video_info = {
                             'title': entry.get('title', f'Video {index + 1}'),
                             'qualities': video_qualities,
-                            'extensions': extensions
+                            'extensions': extensions,
+                            'webpage_url': entry.get('webpage_url')
                         }
                         video_component = VideoComponent(self.scrollable_frame, video_info)
                         video_component.grid(row=index, column=0, padx=10, pady=5)
                 else:  # It's a single video
                     formats = info_dict.get('formats', [])
                     video_qualities = sorted(set(f['height'] for f in formats if f.get('height')), reverse=True)
-                    extensions = sorted(set(f['ext'] for f in formats if f.get('ext')))
+                    extensions = output_extensions(formats)
                     video_info = {
                         'title': info_dict.get('title', 'Video'),
                         'qualities': video_qualities,
-                        'extensions': extensions
+                        'extensions': extensions,
+                        'webpage_url': info_dict.get('webpage_url')
                     }
                     video_component = VideoComponent(self.scrollable_frame, video_info)
                     video_component.grid(row=0, column=0, padx=10, pady=5)
@@ -118,16 +132,11 @@ class YouTubeDownloader(tk.Tk):
             messagebox.showwarning("Warning", "Please select a save location.")
             return
 
-        ffmpeg_path = ffmpeg.get_ffmpeg_exe()
-        ydl_opts = {
-            'ffmpeg_location': ffmpeg_path,
-            'noplaylist': False  # Set to False to download the entire playlist
-        }
-
         total_videos = len(self.scrollable_frame.winfo_children())
         self.progress["maximum"] = total_videos
         self.progress["value"] = 0
 
+        jobs = []
         for widget in self.scrollable_frame.winfo_children():
             if isinstance(widget, VideoComponent):
                 quality = widget.quality_var.get()
@@ -136,19 +145,26 @@ class YouTubeDownloader(tk.Tk):
                 if quality == "N/A" or extension == "N/A":
                     messagebox.showwarning("Warning", f"Invalid quality or extension for {title}.")
                     continue
-                ydl_opts['format'] = f'bestvideo[height<={quality}]+bestaudio/best[ext={extension}]'
-                ydl_opts['outtmpl'] = f'{save_path}/{title}.%(ext)s'
-                try:
-                    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                        ydl.download([url])
-                    self.progress["value"] += 1
-                    self.update_idletasks()
-                except Exception as e:
-                    messagebox.showerror("Error", str(e))
-                    return
-
-        messagebox.showinfo("Success", "Download completed!")
+                job = self.engine.create_job(widget.video_info['webpage_url'] or url, title, save_path, quality, extension)
+                jobs.append(self.engine.submit(job))
+
+        self.watch_jobs(jobs)
+
+    def watch_jobs(self, jobs):
+        # Poll from the event loop instead of blocking it while the workers download
+        finished = [job for job in jobs if job.finished.is_set()]
+        self.progress["value"] = sum(1.0 if job.finished.is_set() else job.progress.fraction() for job in jobs)
+        if len(finished) < len(jobs):
+            self.after(200, self.watch_jobs, jobs)
+            return
+        failed = [job for job in jobs if job.state == FAILED]
+        if failed:
+            messagebox.showerror("Error", "\n".join(f"{job.title}: {job.error}" for job in failed))
+        else:
+            messagebox.showinfo("Success", "Download completed!")
 
 if __name__ == "__main__":
-    app = YouTubeDownloader()
+    startup_timer = StartupTimer("youtube_dl")
+    startup_timer.mark('imports')
+    app = YouTubeDownloader(startup_timer)
     app.mainloop()
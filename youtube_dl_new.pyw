@@ -1,16 +1,14 @@
+from startup import StartupTimer, warm_up_in_background
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
-from PIL import Image, ImageTk
-import yt_dlp as youtube_dl
-import imageio_ffmpeg as ffmpeg
-import os
 import sys
-import re
-import requests
 from io import BytesIO
 import webbrowser
 import threading
+from engine import DownloadEngine, warm_up, create_playlist_dir
+from scheduler import DEFAULT_WORKERS, DONE, SKIPPED, FAILED
+from formats import output_extensions
 
 class VideoComponent(tk.Frame):
     def __init__(self, master, video_info, *args, **kwargs):
@@ -47,6 +45,8 @@ class VideoComponent(tk.Frame):
     def load_thumbnail(self):
         thumbnail_url = self.video_info.get('thumbnail')
         if thumbnail_url:
+            import requests
+            from PIL import Image, ImageTk
             response = requests.get(thumbnail_url)
             img_data = response.content
             img = Image.open(BytesIO(img_data))
@@ -68,16 +68,26 @@ class VideoComponent(tk.Frame):
             scroll_text()
 
 class YouTubeDownloader(tk.Tk):
-    def __init__(self):
+    def __init__(self, startup_timer=None):
         super().__init__()
         self.title("YouTube Video Downloader")
         self.geometry("800x600")
+        self.engine = DownloadEngine(DEFAULT_WORKERS)
+        self.fetched = (None, None)  # (url, info dict) of the last fetch, reused by the download
+        self.startup_timer = startup_timer or StartupTimer("youtube_dl_new")
         self.create_widgets()
 
         # # Add the icon
         # self.icon_image = tk.PhotoImage(file=f"{os.path.dirname(os.path.abspath(__file__))}\icon.ico")
         # self.iconphoto(False, self.icon_image)
 
+        self.startup_timer.mark('window')
+        self.after_idle(self.on_first_paint)
+
+    def on_first_paint(self):
+        self.startup_timer.mark('first_paint')
+        warm_up_in_background(self.startup_timer, warm_up)
+
     def create_widgets(self):
         tk.Label(self, text="YouTube URL:").grid(row=0, column=0, padx=10, pady=10, sticky="w")
         self.url_entry = tk.Entry(self, width=50)
@@ -135,13 +145,14 @@ class YouTubeDownloader(tk.Tk):
         fetch_thread.start()
 
     def fetch_formats(self, url):
+        import yt_dlp as youtube_dl
         ydl_opts = {'quiet': True}
         try:
             with youtube_dl.YoutubeDL(ydl_opts) as ydl:
                 info_dict = ydl.extract_info(url, download=False)
                 formats = info_dict.get('formats', [])
                 video_qualities = sorted(set(f['height'] for f in formats if f.get('height')), reverse=True)
-                extensions = sorted(set(f['ext'] for f in formats if f.get('ext')))
+                extensions = output_extensions(formats)
                 return video_qualities, extensions, info_dict
         except Exception as e:
             messagebox.showerror("Error", f"Failed to fetch formats: {e}")
@@ -151,6 +162,8 @@ class YouTubeDownloader(tk.Tk):
         url = self.url_entry.get()
         if url:
             video_qualities, extensions, info_dict = self.fetch_formats(url)
+            if info_dict:
+                self.fetched = (url, info_dict)
             self.after(0, self.update_dropdowns_ui, video_qualities, extensions, info_dict)
 
     def update_dropdowns_ui(self, video_qualities, extensions, info_dict):
@@ -161,8 +174,8 @@ class YouTubeDownloader(tk.Tk):
             for index, entry in enumerate(info_dict['entries']):
                 entry_formats = entry.get('formats', [])
                 video_qualities = sorted(set(f['height'] for f in entry_formats if f.get('height')), reverse=True)
-                extensions = sorted(set(f['ext'] for f in entry_formats if f.get('ext')))
-                video_info = { 'title': entry.get('title', f'Video {index + 1}'), 'qualities': video_qualities, 'extensions': extensions, 'thumbnail': entry.get('thumbnail') }
+                extensions = output_extensions(entry_formats)
+                video_info = { 'title': entry.get('title', f'Video {index + 1}'), 'qualities': video_qualities, 'extensions': extensions, 'thumbnail': entry.get('thumbnail'), 'webpage_url': entry.get('webpage_url') }
                 video_component = VideoComponent(self.scrollable_frame, video_info)
                 video_component.grid(row=index, column=0, padx=10, pady=5, sticky="w")
         else:  # It's a single video
@@ -170,9 +183,6 @@ class YouTubeDownloader(tk.Tk):
             video_component = VideoComponent(self.scrollable_frame, video_info)
             video_component.grid(row=0, column=0, padx=10, pady=5, sticky="w")
 
-    def sanitize_filename(self, filename):
-        return re.sub(r'[<>:"/\\|?*]', '_', filename)
-
     def toggle_all_checkboxes(self):
         for widget in self.scrollable_frame.winfo_children():
             if isinstance(widget, VideoComponent):
@@ -198,72 +208,58 @@ class YouTubeDownloader(tk.Tk):
             messagebox.showwarning("Warning", "Please select a save location.")
             return
 
-        ffmpeg_path = ffmpeg.get_ffmpeg_exe()
-        ydl_opts = { 'ffmpeg_location': ffmpeg_path, 'noplaylist': False }
-
-        with youtube_dl.YoutubeDL({'quiet': True}) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            
-            if 'entries' in info_dict:  # It's a playlist
-                self.download_playlist(info_dict, save_path, ydl_opts)
-            else:  # It's a single video
-                self.download_single_video(info_dict, save_path, ydl_opts)
+        fetched_url, info_dict = self.fetched
+        if url != fetched_url:
+            info_dict = self.engine.extract(url)
+        if 'entries' in info_dict:  # It's a playlist
+            self.download_playlist(info_dict, save_path)
+        else:  # It's a single video
+            self.download_single_video(info_dict, save_path)
 
-    def download_single_video(self, info_dict, save_path, ydl_opts):
-        video_info = { 'title': info_dict.get('title', 'Video'), 'qualities': sorted(set(f['height'] for f in info_dict['formats'] if f.get('height')), reverse=True), 'extensions': sorted(set(f['ext'] for f in info_dict['formats'] if f.get('ext')))}
+    def download_single_video(self, info_dict, save_path):
+        video_info = { 'title': info_dict.get('title', 'Video'), 'qualities': sorted(set(f['height'] for f in info_dict['formats'] if f.get('height')), reverse=True), 'extensions': output_extensions(info_dict['formats'])}
         quality = video_info['qualities'][0] if video_info['qualities'] else "N/A"
         extension = video_info['extensions'][0] if video_info['extensions'] else "N/A"
         title = video_info['title']
         if quality == "N/A" or extension == "N/A":
             messagebox.showwarning("Warning", f"Invalid quality or extension for {title}.")
             return
-        if self.audio_only_var.get():
-            ydl_opts['format'] = 'bestaudio/best'
-        else:
-            ydl_opts['format'] = f'bestvideo[height<={quality}]+bestaudio/best[ext={extension}]'
-        ydl_opts['outtmpl'] = f'{save_path}/{self.sanitize_filename(title)}.{extension}'
-
-        try:
-            with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([info_dict['webpage_url']])
+        job = self.engine.submit(self.engine.create_job(info_dict['webpage_url'], title, save_path, quality, extension, self.audio_only_var.get()))
+        job.finished.wait()
+        if job.state == DONE:
             messagebox.showinfo("Success", "Download completed!")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        elif job.state == SKIPPED:
+            messagebox.showinfo("Skipped", job.error)
+        elif job.state == FAILED:
+            messagebox.showerror("Error", job.error)
 
-    def download_playlist(self, info_dict, save_path, ydl_opts):
-        playlist_name = info_dict.get('title', 'Playlist')
-        sanitized_playlist_name = self.sanitize_filename(playlist_name)
-        playlist_path = os.path.join(save_path, sanitized_playlist_name)
-        os.makedirs(playlist_path, exist_ok=True)
+    def download_playlist(self, info_dict, save_path):
+        playlist_path = create_playlist_dir(save_path, info_dict.get('title', 'Playlist'))
 
         selected_videos = [widget for widget in self.scrollable_frame.winfo_children() if isinstance(widget, VideoComponent) and widget.download_var.get()]
         total_videos = len(selected_videos)
         self.progress["maximum"] = total_videos
         self.progress["value"] = 0
 
-        for i, widget in enumerate(selected_videos):
+        jobs = []
+        for widget in selected_videos:
             quality = widget.quality_var.get()
             extension = widget.extension_var.get()
             title = widget.video_info['title']
             if quality == "N/A" or extension == "N/A":
                 messagebox.showwarning("Warning", f"Invalid quality or extension for {title}.")
                 continue
-            if self.audio_only_var.get():
-                ydl_opts['format'] = 'bestaudio/best'
-            else:
-                ydl_opts['format'] = f'bestvideo[height<={quality}]+bestaudio/best[ext={extension}]'
-            ydl_opts['outtmpl'] = f'{playlist_path}/{self.sanitize_filename(title)}.{extension}'
-
-            try:
-                with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([info_dict['entries'][i]['webpage_url']])
-
-                self.progress["value"] += 1
-                self.update_idletasks()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
-                return
+            jobs.append(self.engine.submit(self.engine.create_job(widget.video_info['webpage_url'], title, playlist_path, quality, extension, self.audio_only_var.get())))
+
+        for job in jobs:
+            job.finished.wait()
+            self.progress["value"] += 1
+            self.update_idletasks()
 
+        failed = [job for job in jobs if job.state == FAILED]
+        if failed:
+            messagebox.showerror("Error", "\n".join(f"{job.title}: {job.error}" for job in failed))
+            return
         messagebox.showinfo("Success", "Download completed!")
 
     def open_github(self):
@@ -278,6 +274,8 @@ class YouTubeDownloader(tk.Tk):
             self.focus()
 
 if __name__ == "__main__":
-    app = YouTubeDownloader()
+    startup_timer = StartupTimer("youtube_dl_new")
+    startup_timer.mark('imports')
+    app = YouTubeDownloader(startup_timer)
 
     app.mainloop()